@@ -1,5 +1,3 @@
-import time
-import requests
 import asyncio
 import pandas as pd
 import numpy as np
@@ -11,13 +9,12 @@ sp500_constituents = pd.read_csv('rus2k_tic.csv')
 tickers = sp500_constituents[~sp500_constituents['x'].isna()]['x'].unique()
 
 def run_downloader():
-    try:
-        download(tickers)
-    except requests.exceptions.RequestException:
-        #wait 2 min
-        print('encounter 503, wait 2 min to re run')
-        time.sleep(120)
-        run_downloader()
+    # Failed requests are retried with backoff by the downloader. Tickers
+    # that still failed are retried the next time this runs.
+    result = download(tickers)
+    if result['failed']:
+        print('failed to download {0} tickers: {1}'.format(
+            len(result['failed']), ', '.join(result['failed'])))
 
 run_downloader()
 
@@ -1,8 +1,11 @@
-"""This module generates a dataset for the LightTag platform
+"""This module generates a dataset for the LightTag platform. Pass "jsonl" as
+the first argument to write one JSON object per line instead of a JSON array.
 """
+import sys
 import asyncio
 
 from ucla_topic_analysis.data.coroutines.light_tag import LightTagDataSetPipeline
 
 if __name__ == "__main__":
-    asyncio.run(LightTagDataSetPipeline.generate_dataset())
\ No newline at end of file
+    file_format = sys.argv[1] if len(sys.argv) > 1 else "json"
+    asyncio.run(LightTagDataSetPipeline.generate_dataset(file_format))
\ No newline at end of file
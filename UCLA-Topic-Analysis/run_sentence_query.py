@@ -0,0 +1,23 @@
+"""Find the sentences and filings most similar to a query. The sentence index
+is built with the tf-idf model the first time this is run.
+
+Usage: python run_sentence_query.py "cybersecurity breach" [k]
+"""
+import asyncio
+import sys
+
+import pandas as pd
+
+from ucla_topic_analysis.analysis.sentence_index import SentenceIndex
+from ucla_topic_analysis.analysis.tfidf_score import TFIDFScorePipeline
+
+if __name__ == "__main__":
+    if not SentenceIndex.exists(TFIDFScorePipeline.get_index_path()):
+        print('building the sentence index')
+        asyncio.run(TFIDFScorePipeline().build_index())
+    index = TFIDFScorePipeline.load_index()
+    query = sys.argv[1]
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with pd.option_context('display.max_colwidth', 100):
+        print(index.query(query, k))
+        print(index.query_filings(query, k))
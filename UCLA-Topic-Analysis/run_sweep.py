@@ -0,0 +1,35 @@
+"""Train and score LDA models for several numbers of topics. The numbers of
+topics are read from the SWEEP section of the config unless they are given on
+the command line. Run it again to carry on with a sweep that stopped.
+
+Usage: python run_sweep.py [num_topics ...]
+"""
+import asyncio
+import sys
+
+from ucla_topic_analysis.data import get_training_file_path
+from ucla_topic_analysis.data.coroutines.dictionary import DictionaryPipeline
+from ucla_topic_analysis.data.coroutines.lda_corpus import LdaCorpusPipeline
+from ucla_topic_analysis.validation.sweep import LdaSweep
+from ucla_topic_analysis.validation.sweep import get_binary_corpus
+
+
+async def prepare():
+    """Prepares the corpus and then loads the dictionary, which preparing the
+    corpus adds the words of new files to
+
+    Returns:
+        :obj:`gensim.corpora.Dictionary`: The dictionary
+    """
+    await LdaCorpusPipeline.prepare_data()
+    return await DictionaryPipeline().get_dictionary()
+
+if __name__ == "__main__":
+    dictionary = asyncio.run(prepare())
+    labels = list(LdaCorpusPipeline.SCHEMA)
+    folder = get_binary_corpus(LdaCorpusPipeline.get_corpus_file(), labels,
+                               get_training_file_path("lda-sweep-corpus"))
+    sweep = LdaSweep.from_config(dictionary, folder, labels)
+    if len(sys.argv) > 1:
+        sweep.num_topics = [int(value) for value in sys.argv[1:]]
+    print(sweep.run())
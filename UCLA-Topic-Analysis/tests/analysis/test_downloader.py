@@ -0,0 +1,236 @@
+"""Tests the filing downloader against a local stub server
+"""
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+from unittest import main
+from unittest.mock import patch
+
+from ucla_topic_analysis.analysis.downloader import FilingDownloader
+from ucla_topic_analysis.analysis.downloader import Fetcher
+from ucla_topic_analysis.analysis.downloader import TokenBucket
+from ucla_topic_analysis.analysis.downloader import UrlFetcher
+from ucla_topic_analysis.analysis.downloader import run_throttled
+from ucla_topic_analysis.analysis.downloader import throttle_requests
+from ucla_topic_analysis.analysis.downloader import use_session
+from tests.utils import async_test
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves filings for /TICKER. MISSING does not exist and FLAKY fails
+    twice before it succeeds.
+    """
+
+    requests = []
+
+    def do_GET(self):
+        """Handles a request
+        """
+        ticker = self.path.strip("/")
+        self.requests.append(ticker)
+        if ticker == "MISSING":
+            self.send_error(404)
+            return
+        if ticker == "FLAKY" and self.requests.count(ticker) <= 2:
+            self.send_error(503)
+            return
+        body = json.dumps({"2019-01-01.txt": "Filing for " + ticker})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        """Keeps the test output quiet
+        """
+
+
+class DownloaderTestCase(TestCase):
+    """Tests the FilingDownloader class
+    """
+
+    def setUp(self):
+        """Starts the stub server
+        """
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(data_dir, "filings")
+        StubHandler.requests = []
+        self.server = HTTPServer(("127.0.0.1", 0), StubHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        url = "http://127.0.0.1:{0}/{{ticker}}".format(self.server.server_port)
+        self.fetcher = UrlFetcher(self.folder, url)
+
+    def tearDown(self):
+        """Stops the stub server and cleans up
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def get_downloader(self):
+        """
+        Returns:
+            :obj:`FilingDownloader`: A downloader with short backoff
+        """
+        return FilingDownloader(self.fetcher, concurrency=3, rate=1000,
+                                retries=3, backoff=0.01)
+
+    @async_test
+    async def test_download(self):
+        """Tests downloading, retrying and skipping tickers
+        """
+        result = await self.get_downloader().download(
+            ["AAPL", "FLAKY", "MISSING", "MSFT"])
+        self.assertEqual(["AAPL", "FLAKY", "MSFT"],
+                         sorted(result["downloaded"]))
+        self.assertEqual(["MISSING"], result["failed"])
+        self.assertEqual(3, StubHandler.requests.count("FLAKY"))
+        # A missing ticker is not retried
+        self.assertEqual(1, StubHandler.requests.count("MISSING"))
+        file_path = os.path.join(self.folder, "sec_edgar_filings", "AAPL",
+                                 "10-K", "2019-01-01.txt")
+        with open(file_path, "r", encoding="utf-8") as data_file:
+            self.assertEqual("Filing for AAPL", data_file.read())
+
+        # Done tickers are skipped, failed tickers are tried again
+        StubHandler.requests = []
+        result = await self.get_downloader().download(
+            ["AAPL", "MISSING", "MSFT"])
+        self.assertEqual(["AAPL", "MSFT"], sorted(result["skipped"]))
+        self.assertEqual(["MISSING"], StubHandler.requests)
+
+    @async_test
+    async def test_token_bucket(self):
+        """Tests that the token bucket limits the rate
+        """
+        bucket = TokenBucket(50, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    @async_test
+    async def test_throttle_requests(self):
+        """Tests that each request made by a throttled function takes a token
+        and that other sessions do not wait
+        """
+        class Session:
+            """A stand in for requests.Session"""
+            count = 0
+
+            def request(self, method, url):
+                """Counts the request"""
+                Session.count += 1
+                return method, url
+
+        session = Session()
+        throttle_requests(session)
+        throttle_requests(session)
+
+        def download(session):
+            return [session.request("GET", str(i)) for i in range(11)]
+
+        bucket = TokenBucket(50, capacity=1)
+        start = time.monotonic()
+        responses = await run_throttled(bucket, download, session)
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertEqual(("GET", "10"), responses[-1])
+
+        # Other sessions are not throttled
+        start = time.monotonic()
+        await run_throttled(bucket, download, Session())
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertFalse(hasattr(Session.request, "throttled"))
+
+        # Requests made outside run_throttled do not wait
+        start = time.monotonic()
+        download(session)
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(33, Session.count)
+
+    def test_use_session(self):
+        """Tests that a library's calls to the requests module are sent
+        through the session
+        """
+        requests = types.ModuleType("requests")
+        requests.get = lambda url, **kwargs: ("module", url)
+        requests.HTTPError = type("HTTPError", (IOError,), {})
+        library = types.ModuleType("library")
+        library.requests = requests
+        submodule = types.ModuleType("library.submodule")
+        submodule.requests = requests
+        other = types.ModuleType("library_other")
+        other.requests = requests
+
+        class Session:
+            """A stand in for requests.Session"""
+
+            def __init__(self, name):
+                self.name = name
+
+            def get(self, url, **kwargs):
+                """Returns the session that made the request"""
+                return self.name, url
+
+        modules = {"library": library, "library.submodule": submodule,
+                   "library_other": other}
+        with patch.dict(sys.modules, modules):
+            use_session("library", Session("first"))
+            use_session("library", Session("second"))
+        self.assertEqual(("second", "url"), library.requests.get("url"))
+        self.assertEqual(("second", "url"), submodule.requests.get("url"))
+        self.assertIs(requests.HTTPError, submodule.requests.HTTPError)
+        self.assertEqual(("module", "url"), other.requests.get("url"))
+
+    def test_is_retryable(self):
+        """Tests that only connection errors, timeouts, too many requests and
+        server errors are retried
+        """
+        def http_error(status):
+            return urllib.error.HTTPError("url", status, "", {}, None)
+
+        self.assertFalse(Fetcher.is_retryable(http_error(404)))
+        self.assertTrue(Fetcher.is_retryable(http_error(429)))
+        self.assertTrue(Fetcher.is_retryable(http_error(503)))
+        self.assertTrue(Fetcher.is_retryable(
+            urllib.error.URLError("refused")))
+        self.assertTrue(Fetcher.is_retryable(ConnectionResetError()))
+        self.assertTrue(Fetcher.is_retryable(TimeoutError()))
+        self.assertFalse(Fetcher.is_retryable(PermissionError()))
+        self.assertFalse(Fetcher.is_retryable(ValueError()))
+
+        # The exceptions of requests, which are all IOErrors
+        requests = types.ModuleType("requests")
+        requests.RequestException = type("RequestException", (IOError,), {})
+        for name in ("HTTPError", "ConnectionError", "Timeout",
+                     "TooManyRedirects"):
+            setattr(requests, name,
+                    type(name, (requests.RequestException,), {}))
+
+        def requests_error(status):
+            error = requests.HTTPError()
+            error.response = types.SimpleNamespace(status_code=status)
+            return error
+
+        with patch.dict(sys.modules, {"requests": requests}):
+            self.assertFalse(Fetcher.is_retryable(requests_error(404)))
+            self.assertTrue(Fetcher.is_retryable(requests_error(429)))
+            self.assertTrue(Fetcher.is_retryable(requests_error(500)))
+            self.assertTrue(Fetcher.is_retryable(requests.ConnectionError()))
+            self.assertTrue(Fetcher.is_retryable(requests.Timeout()))
+            self.assertFalse(Fetcher.is_retryable(
+                requests.TooManyRedirects()))
+            self.assertFalse(Fetcher.is_retryable(requests.HTTPError()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""Tests inferring the topics of many sentences at once and scoring filings in
+worker processes
+"""
+import os
+import asyncio
+import shutil
+import weakref
+import configparser
+import multiprocessing
+from unittest import TestCase
+from unittest import main
+from unittest import skipUnless
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from gensim.corpora import Dictionary
+from gensim.models import LdaModel
+
+import ucla_topic_analysis
+import ucla_topic_analysis.analysis
+import ucla_topic_analysis.data
+from ucla_topic_analysis.analysis.token_classifier import TokenClassifier
+from ucla_topic_analysis.data.lemma_cache import LemmaCache
+
+try:
+    from ucla_topic_analysis.analysis.risk_score import RiskScorePipeline
+    from ucla_topic_analysis.analysis.risk_score import get_topic_distributions
+    from ucla_topic_analysis.analysis.risk_score import get_topic_ranks
+    from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
+    from ucla_topic_analysis.data.coroutines.word_lemmatise import morphy
+except LookupError:
+    # The NLTK data used by the preprocessing is not installed
+    RiskScorePipeline = get_topic_distributions = get_topic_ranks = None
+
+# The worker processes only see the patched config and paths if they are forked
+FORK = multiprocessing.get_start_method() == "fork"
+
+
+class Tokens(list):
+    """The words of a sentence. Unlike a list it can be weakly referenced."""
+
+
+@skipUnless(get_topic_ranks, "requires the NLTK data")
+class TopicTestCase(TestCase):
+    """Tests the batched topic functions against a tiny model used one
+    document at a time
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        documents = [
+            ["market", "risk", "interest", "rate"],
+            ["interest", "rate", "swap", "market", "market"],
+            ["product", "liability", "claim"],
+            ["supplier", "product", "revenue", "customer", "risk"],
+            ["risk", "factor", "operation", "operation"],
+            ["debt", "cash", "market"]
+        ]
+        self.documents = documents
+        dictionary = self.dictionary = Dictionary(documents)
+        # The empty document has the same probability for every topic
+        self.bows = [dictionary.doc2bow(document)
+                     for document in documents] + [[]]
+        self.model = LdaModel(self.bows * 3, num_topics=4, id2word=dictionary,
+                              passes=5, random_state=1)
+
+    @staticmethod
+    def get_rank(topics, topic_id):
+        """Ranks a topic by sorting the topics of a document like scoring one
+        sentence at a time did
+
+        Args:
+            topics (:obj:`list` of :obj:`(int, float)`): The topics of the
+                document like `model[bow]` gives
+            topic_id (int): The topic to rank
+
+        Returns:
+            int: The rank of the topic starting at 1 or 0 if it is missing
+        """
+        ordered = sorted(topics, key=lambda topic: -1 * topic[1])
+        for index, (other_id, _probability) in enumerate(ordered):
+            if other_id == topic_id:
+                return index + 1
+        return 0
+
+    def test_distributions(self):
+        """Tests that the batched distributions match get_document_topics
+        """
+        distributions = get_topic_distributions(self.model, self.bows)
+        expected = np.zeros((len(self.bows), self.model.num_topics))
+        for row, bow in enumerate(self.bows):
+            for topic_id, probability in self.model.get_document_topics(
+                    bow, minimum_probability=0):
+                expected[row, topic_id] = probability
+        np.testing.assert_allclose(expected, distributions, atol=1e-3)
+        self.assertEqual((0, self.model.num_topics),
+                         get_topic_distributions(self.model, []).shape)
+
+    def test_ranks(self):
+        """Tests that the ranks match sorting the topics of each document,
+        including topics with the same probability and topics below the
+        minimum probability
+        """
+        distributions = np.vstack([
+            get_topic_distributions(self.model, self.bows),
+            [[0.4, 0.2, 0.2, 0.2],
+             [0.5, 0.495, 0.004, 0.001],
+             [0.25, 0.25, 0.25, 0.25]]
+        ])
+        for minimum_probability in (1e-8, 0.01, 0.3):
+            for topic_id in range(self.model.num_topics):
+                expected = [
+                    self.get_rank(
+                        [(other_id, probability)
+                         for other_id, probability in enumerate(row)
+                         if probability >= minimum_probability],
+                        topic_id)
+                    for row in distributions
+                ]
+                self.assertEqual(
+                    expected,
+                    list(get_topic_ranks(distributions, topic_id,
+                                         minimum_probability)))
+
+    def test_score_filing_chunks(self):
+        """Tests that a filing is scored one chunk at a time without keeping
+        the sentences of earlier chunks, and that the totals match scoring it
+        as one chunk
+        """
+        path = "sec_edgar_filings/AAPL/10-K/2018-11-05.txt"
+        classifier = TokenClassifier(self.dictionary)
+        references = []
+        most_alive = []
+
+        def iter_chunks():
+            for _ in range(20):
+                most_alive.append(sum(reference() is not None
+                                      for reference in references))
+                chunk = [Tokens(document) for document in self.documents]
+                references.extend(weakref.ref(tokens) for tokens in chunk)
+                yield chunk
+
+        # The tiny model only has 4 topics
+        with patch.object(RiskScorePipeline, "RISK_TOPIC", 2):
+            chunked = RiskScorePipeline.score_filing(
+                path, iter_chunks(), self.dictionary, self.model, classifier)
+            whole = RiskScorePipeline.score_filing(
+                path, [self.documents * 20], self.dictionary, self.model,
+                classifier)
+        # Only the sentences of the chunk before are still referenced
+        self.assertLessEqual(max(most_alive), len(self.documents))
+        self.assertGreater(chunked["total number of risk sentences"], 0)
+        self.assertEqual("AAPL", chunked["ticker"])
+        self.assertEqual("2018-11-05", chunked["filing dates"])
+        self.assertEqual(len(self.documents) * 20,
+                         chunked["total number of sentences"])
+        for column in RiskScorePipeline.COLUMNS:
+            if column.startswith("average"):
+                self.assertAlmostEqual(whole[column], chunked[column],
+                                       places=2)
+            else:
+                self.assertEqual(whole[column], chunked[column])
+
+
+@skipUnless(RiskScorePipeline, "requires the NLTK data")
+@skipUnless(FORK, "requires worker processes that are forked")
+class CalcRiskTestCase(TestCase):
+    """Tests scoring every filing with `RiskScorePipeline.calc_risk` on a few
+    small filings and a tiny model
+    """
+
+    SENTENCES = [
+        "The market risk of interest rates is high.",
+        "A product liability claim was made.",
+        "The supplier and customer revenue may fall.",
+        "Debt and cash are at risk.",
+        "Interest rate swaps in the market."
+    ]
+
+    def setUp(self):
+        """Writes the filings and the model and points the config, training
+        folder and score folder at them
+        """
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(test_dir, "risk-score")
+        data_folder = os.path.join(self.folder, "data")
+        training_folder = os.path.join(self.folder, "training")
+        os.makedirs(training_folder)
+        self.file_paths = []
+        for index, ticker in enumerate(["AAPL", "AAPL", "IBM", "MSFT",
+                                        "MSFT", "MSFT", "ORCL"]):
+            folder = os.path.join(data_folder, "sec_edgar_filings", ticker,
+                                  "10-K")
+            os.makedirs(folder, exist_ok=True)
+            file_path = os.path.join(folder, "201{0}-02-01.txt".format(index))
+            self.write_filing(file_path, index)
+            self.file_paths.append(file_path)
+
+        documents = [sentence.lower().strip(".").split()
+                     for sentence in self.SENTENCES]
+        dictionary = Dictionary(documents)
+        model = LdaModel([dictionary.doc2bow(document)
+                          for document in documents] * 3,
+                         num_topics=4, id2word=dictionary, passes=5,
+                         random_state=1)
+        dictionary_path = os.path.join(training_folder, "dictionary.gensim")
+        model_path = os.path.join(training_folder, "lda-4.model")
+        dictionary.save(dictionary_path)
+        model.save(model_path)
+
+        self.config = configparser.ConfigParser()
+        self.config["DATA"] = {"path": data_folder}
+        self.config["TRAINING"] = {"workers": "1"}
+        patches = [
+            patch.object(ucla_topic_analysis, "get_config",
+                         lambda: self.config),
+            patch.object(ucla_topic_analysis.data, "TRAINING_FOLDER_PATH",
+                         training_folder),
+            patch.object(ucla_topic_analysis.analysis, "SCORE_FOLDER_PATH",
+                         self.folder),
+            patch("ucla_topic_analysis.analysis.risk_score.get_file_list",
+                  lambda: list(self.file_paths)),
+            # Keeps the lemmas out of the real training folder
+            patch.object(LemmaPipeline, "LEMMA_CACHE", LemmaCache(morphy)),
+            patch.object(RiskScorePipeline, "DICTIONARY_PATH",
+                         dictionary_path),
+            patch.object(RiskScorePipeline, "MODEL_PATH", model_path),
+            # The tiny model only has 4 topics
+            patch.object(RiskScorePipeline, "RISK_TOPIC", 2),
+            patch.object(RiskScorePipeline, "CHUNK_SIZE", 2)
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_filing(self, file_path, index):
+        """Writes a filing made of some of the sentences
+
+        Args:
+            file_path (str): The path to the filing
+            index (int): Picks the sentences
+        """
+        with open(file_path, "w", encoding="utf-8") as data_file:
+            data_file.write(" ".join(
+                self.SENTENCES[(index + offset) % len(self.SENTENCES)]
+                for offset in range(index % 3 + 2)))
+
+    def calc_risk(self, workers):
+        """Scores the filings
+
+        Args:
+            workers (int): The number of worker processes
+
+        Returns:
+            :obj:`pandas.DataFrame`: The scores
+        """
+        self.config["TRAINING"]["workers"] = str(workers)
+        asyncio.run(RiskScorePipeline().calc_risk())
+        return pd.read_csv(os.path.join(self.folder, "risk_score.csv"),
+                           index_col=0)
+
+    def test_parallel_matches_serial(self):
+        """Tests that scoring with several workers gives the same rows in the
+        same order as scoring with one
+        """
+        serial = self.calc_risk(1)
+        self.assertEqual(len(self.file_paths), len(serial))
+        self.assertEqual(["AAPL", "AAPL", "IBM", "MSFT", "MSFT", "MSFT",
+                          "ORCL"], list(serial["ticker"]))
+        self.assertEqual(["201{0}-02-01".format(index)
+                          for index in range(len(self.file_paths))],
+                         list(serial["filing dates"]))
+        self.assertTrue((serial["total number of sentences"] > 0).all())
+        self.assertFalse(os.path.exists(
+            os.path.join(self.folder, "risk_score.parts")))
+        pd.testing.assert_frame_equal(serial, self.calc_risk(3))
+
+    def test_reuses_parts(self):
+        """Tests that a rerun reuses the chunks that were saved and scores the
+        chunks that are missing or out of date
+        """
+        parts_folder = os.path.join(self.folder, "risk_score.parts")
+        # Keeps the saved chunks as if the run stopped before merging them
+        with patch("ucla_topic_analysis.analysis.risk_score.shutil.rmtree"):
+            first = self.calc_risk(2)
+        part_paths = sorted(os.listdir(parts_folder))
+        self.assertEqual(4, len(part_paths))
+
+        # The second chunk was never saved and a filing of the third changed
+        os.remove(os.path.join(parts_folder, part_paths[1]))
+        self.write_filing(self.file_paths[4], 0)
+        stat = os.stat(self.file_paths[4])
+        os.utime(self.file_paths[4], (stat.st_atime, stat.st_mtime + 10))
+        with patch.object(RiskScorePipeline, "save_part",
+                          wraps=RiskScorePipeline.save_part) as save_part:
+            scores = self.calc_risk(2)
+        saved = sorted(os.path.basename(call[0][1])
+                       for call in save_part.call_args_list)
+        self.assertEqual(2, len(saved))
+        self.assertEqual(part_paths[1], saved[0])
+        self.assertTrue(saved[1].startswith("000002-"))
+        self.assertNotIn(saved[1], part_paths)
+        self.assertNotEqual(first["total number of sentences"][4],
+                            scores["total number of sentences"][4])
+
+        # The scores match scoring every filing again
+        pd.testing.assert_frame_equal(self.calc_risk(1), scores)
+
+
+if __name__ == "__main__":
+    main()
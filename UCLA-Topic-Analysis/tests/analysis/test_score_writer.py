@@ -0,0 +1,146 @@
+"""Tests the score writers
+"""
+import os
+import shutil
+from unittest import TestCase
+from unittest import main
+from unittest import skipUnless
+
+import numpy as np
+import pandas as pd
+
+from ucla_topic_analysis.analysis import parse_filing_path
+from ucla_topic_analysis.analysis.score_writer import CsvScoreWriter
+from ucla_topic_analysis.analysis.score_writer import ParquetScoreWriter
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class ScoreWriterTestCase(TestCase):
+    """Tests the score writers
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(data_dir, "score-writer")
+        os.makedirs(self.folder, exist_ok=True)
+        self.rows = [
+            pd.DataFrame({
+                "10k_path": ["sec_edgar_filings\\AAPL\\10-K\\2018-11-05.txt",
+                             "sec_edgar_filings/MSFT/10-K/2019-08-01.txt"],
+                "sentence_index": [0, 3],
+                "topic0 score": [0.5, np.nan]
+            }),
+            pd.DataFrame({
+                "10k_path": ["sec_edgar_filings/AAPL/10-K/2018-11-05.txt"],
+                "sentence_index": [7],
+                "topic0 score": [0.25]
+            })
+        ]
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_parse_filing_path(self):
+        """Tests reading the ticker and date with either separator
+        """
+        self.assertEqual(("AAPL", "2018-11-05"),
+                         parse_filing_path(self.rows[0]["10k_path"][0]))
+        self.assertEqual(("MSFT", "2019-08-01"),
+                         parse_filing_path(self.rows[0]["10k_path"][1]))
+
+    def test_csv(self):
+        """Tests that rows are appended to the CSV file
+        """
+        file_path = os.path.join(self.folder, "scores.csv")
+        writer = CsvScoreWriter(file_path)
+        for rows in self.rows:
+            writer.write(rows)
+        writer.close()
+        result = pd.read_csv(file_path)
+        self.assertEqual([0, 3, 7], list(result["sentence_index"]))
+
+        # Without append the file is replaced
+        writer = CsvScoreWriter(file_path)
+        writer.write(self.rows[1])
+        self.assertEqual([7], list(pd.read_csv(file_path)["sentence_index"]))
+
+    @skipUnless(pyarrow, "requires pyarrow")
+    def test_parquet(self):
+        """Tests that rows are partitioned by ticker and year
+        """
+        folder = os.path.join(self.folder, "scores")
+        writer = ParquetScoreWriter(folder, path_column="10k_path")
+        for rows in self.rows:
+            writer.write(rows)
+        writer.close()
+        self.assertTrue(os.path.isdir(
+            os.path.join(folder, "ticker=AAPL", "year=2018")))
+        result = pd.read_parquet(folder)
+        result = result.sort_values("sentence_index").reset_index(drop=True)
+        self.assertEqual([0, 3, 7], list(result["sentence_index"]))
+        self.assertEqual(["AAPL", "MSFT", "AAPL"],
+                         [str(ticker) for ticker in result["ticker"]])
+        self.assertTrue(np.isnan(result["topic0 score"][1]))
+
+    @skipUnless(pyarrow, "requires pyarrow")
+    def test_parquet_schema(self):
+        """Tests that every file has the declared types even if the first rows
+        hold integers or only missing values
+        """
+        folder = os.path.join(self.folder, "scores")
+        writer = ParquetScoreWriter(
+            folder, path_column="10k_path",
+            schema=[("10k_path", "string"), ("sentence_index", "int64"),
+                    ("topic0 score", "float64")])
+        writer.write(pd.DataFrame({
+            "10k_path": ["sec_edgar_filings/MSFT/10-K/2019-08-01.txt"],
+            "sentence_index": [1],
+            "topic0 score": [0]
+        }))
+        writer.write(pd.DataFrame({
+            "10k_path": ["sec_edgar_filings/AAPL/10-K/2018-11-05.txt"],
+            "sentence_index": [2],
+            "topic0 score": [None]
+        }))
+        for rows in self.rows:
+            writer.write(rows)
+        writer.close()
+        result = pd.read_parquet(folder)
+        self.assertEqual(np.float64, result["topic0 score"].dtype)
+        self.assertEqual(np.int64, result["sentence_index"].dtype)
+        self.assertEqual(5, len(result))
+
+    @skipUnless(pyarrow, "requires pyarrow")
+    def test_parquet_partition_schema(self):
+        """Tests a schema holding the ticker column that rows are partitioned
+        by, like the risk scores have
+        """
+        folder = os.path.join(self.folder, "scores")
+        writer = ParquetScoreWriter(
+            folder, date_column="filing dates",
+            schema=[("ticker", "string"), ("filing dates", "string"),
+                    ("average of risk score", "float64")])
+        writer.write(pd.DataFrame({
+            "ticker": ["AAPL", "MSFT"],
+            "filing dates": ["2018-11-05", "2019-08-01"],
+            "average of risk score": [0, 0.5]
+        }))
+        writer.close()
+        self.assertTrue(os.path.isdir(
+            os.path.join(folder, "ticker=MSFT", "year=2019")))
+        result = pd.read_parquet(folder).sort_values("filing dates")
+        self.assertEqual(["AAPL", "MSFT"],
+                         [str(ticker) for ticker in result["ticker"]])
+        self.assertEqual([0.0, 0.5], list(result["average of risk score"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Tests the sentence index
+"""
+import os
+import shutil
+from unittest import TestCase
+from unittest import main
+
+import numpy as np
+
+from ucla_topic_analysis.analysis.sentence_index import SentenceIndex
+from ucla_topic_analysis.analysis.sentence_index import SentenceIndexWriter
+from ucla_topic_analysis.data.tfidf_model import TfidfModel
+
+
+class SentenceIndexTestCase(TestCase):
+    """Tests building and querying a sentence index
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.paths = ["sec_edgar_filings/AAPL/10-K/2018-11-05.txt",
+                      "sec_edgar_filings/MSFT/10-K/2019-08-01.txt",
+                      "sec_edgar_filings/GOOG/10-K/2019-02-01.txt"]
+        self.filings = [
+            ["market risk interest rate", "the", "cybersecurity breach"],
+            ["interest rate swap market market", "product liability claim"],
+            ["supplier product revenue customer", "breach of network",
+             "risk factor operation cybersecurity"]
+        ]
+        self.sentences = [sentence for filing in self.filings
+                          for sentence in filing]
+        self.model = TfidfModel(stop_words={"the", "of"}).fit(
+            iter(self.sentences))
+        self.folder = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                   "sentence-index")
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def build(self, block_size):
+        """Builds an index of the filings, adding them in two batches
+
+        Args:
+            block_size (int): The number of entries to invert at a time
+
+        Returns:
+            :obj:`SentenceIndex`: The index
+        """
+        writer = SentenceIndexWriter(self.folder)
+        writer.BLOCK_SIZE = block_size
+        for start, stop in ((0, 1), (1, 3)):
+            filings = self.filings[start:stop]
+            writer.add(self.paths[start:stop], filings, self.model.transform(
+                [sentence for filing in filings for sentence in filing]))
+        writer.close()
+        return SentenceIndex(self.folder, self.model)
+
+    def test_query(self):
+        """Tests that queries match the cosine similarity of every sentence
+        """
+        for block_size in (1, 3, 1 << 24):
+            index = self.build(block_size)
+            # The sentence of stop words is left out
+            self.assertEqual(len(self.sentences) - 1, len(index))
+
+            query = "cybersecurity breach"
+            similarities = (self.model.transform(self.sentences) @
+                            self.model.transform([query]).T).toarray()[:, 0]
+            order = np.argsort(-similarities, kind="stable")
+            rows = index.query(query, k=3)
+            np.testing.assert_allclose(similarities[order[:3]], rows["score"],
+                                       rtol=1e-6)
+            self.assertEqual("cybersecurity breach", rows["joined tokens"][0])
+            self.assertEqual(self.paths[0], rows["10k_path"][0])
+            self.assertEqual(2, rows["sentence_index"][0])
+
+            # Every sentence sharing a word is returned if k is large
+            self.assertEqual(np.count_nonzero(similarities),
+                             len(index.query(query, k=100)))
+            self.assertEqual(0, len(index.query("unknown", k=3)))
+
+    def test_query_filings(self):
+        """Tests that filings are scored by their most similar sentence
+        """
+        index = self.build(1 << 24)
+        rows = index.query_filings("interest rate market", k=2)
+        self.assertEqual(self.paths[:2], list(rows["10k_path"]))
+        self.assertEqual([0, 0], list(rows["sentence_index"]))
+        best = index.query("interest rate market", k=1)
+        self.assertAlmostEqual(best["score"][0], rows["score"][0])
+        self.assertEqual(1, len(index.query_filings("supplier", k=5)))
+
+    def test_chunks(self):
+        """Tests that adding a filing in chunks gives the same index as
+        adding it in one go
+        """
+        writer = SentenceIndexWriter(self.folder)
+        # The last filing is split between two batches
+        batches = [
+            ([0, 1, 2], [(0, 3), (0, 2), (0, 1)]),
+            ([2, 2], [(1, 2), (2, 3)])
+        ]
+        for filing_ids, bounds in batches:
+            chunks = [self.filings[filing_id][start:stop]
+                      for filing_id, (start, stop) in zip(filing_ids, bounds)]
+            writer.add([self.paths[filing_id] for filing_id in filing_ids],
+                       chunks, self.model.transform(
+                           [sentence for chunk in chunks
+                            for sentence in chunk]),
+                       [start for start, _stop in bounds])
+        writer.close()
+        index = SentenceIndex(self.folder, self.model)
+        expected = self.build(1 << 24)
+        for query in ("cybersecurity breach", "product risk"):
+            self.assertTrue(index.query(query, k=10).equals(
+                expected.query(query, k=10)))
+            self.assertTrue(index.query_filings(query, k=10).equals(
+                expected.query_filings(query, k=10)))
+        rows = index.query("risk factor operation", k=1)
+        self.assertEqual(self.paths[2], rows["10k_path"][0])
+        self.assertEqual(2, rows["sentence_index"][0])
+
+    def test_preprocess(self):
+        """Tests that queries are preprocessed like the sentences
+        """
+        self.build(1 << 24)
+        index = SentenceIndex(self.folder, self.model)
+        self.assertEqual(0, len(index.query("Breaches", k=3)))
+        index = SentenceIndex(
+            self.folder, self.model,
+            lambda text: text.lower().replace("breaches", "breach"))
+        rows = index.query("Breaches", k=3)
+        self.assertEqual(["breach of network", "cybersecurity breach"],
+                         sorted(rows["joined tokens"]))
+
+
+if __name__ == "__main__":
+    main()
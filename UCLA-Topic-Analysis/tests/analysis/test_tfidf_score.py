@@ -0,0 +1,148 @@
+"""Tests the TFIDFScorePipeline class
+"""
+from unittest import TestCase
+from unittest import main
+from unittest import skipUnless
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import linear_kernel
+
+from ucla_topic_analysis.data.tfidf_model import TfidfModel
+
+try:
+    from ucla_topic_analysis.analysis.tfidf_score import TFIDFScorePipeline
+except LookupError:
+    # The NLTK data used by the preprocessing is not installed
+    TFIDFScorePipeline = None
+
+
+@skipUnless(TFIDFScorePipeline, "requires the NLTK data")
+class TFIDFScoreTestCase(TestCase):
+    """Tests scoring sentences against the topics with a small model trained
+    on the topics and a few sentences
+    """
+
+    SENTENCES = [
+        "product liability claim lawsuit",
+        "interest rate swap market",
+        "supplier customer contract revenue",
+        "weather disaster facility",
+        "cash debt covenant credit"
+    ]
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.model = TfidfModel().fit(TFIDFScorePipeline.TOPICS +
+                                      self.SENTENCES)
+        with patch.object(TFIDFScorePipeline, "load_model",
+                          return_value=self.model):
+            self.pipeline = TFIDFScorePipeline()
+        self.paths = ["sec_edgar_filings/AAPL/10-K/2018-11-05.txt",
+                      "sec_edgar_filings/MSFT/10-K/2019-08-01.txt",
+                      "sec_edgar_filings/IBM/10-K/2019-02-26.txt"]
+        self.filings = [
+            ["product liability claim market insurance",
+             "risk",
+             "debt indebtedness cash obligation covenant"],
+            [],
+            ["natural disaster weather facility operation",
+             "unrelated words only here",
+             "foreign currency rate fluctuation international",
+             "product liability claim market insurance"]
+        ]
+
+    def test_batch_matches_filings(self):
+        """Tests that scoring filings in one batch gives the same rows as
+        scoring each filing on its own
+        """
+        for layout in ("wide", "long"):
+            batch = self.pipeline.get_batch_rows(self.paths, self.filings,
+                                                 layout)
+            expected = pd.concat(
+                [self.pipeline.get_batch_rows([path], [sentences], layout)
+                 for path, sentences in zip(self.paths, self.filings)],
+                ignore_index=True)
+            pd.testing.assert_frame_equal(expected, batch, check_dtype=False)
+            self.assertEqual(
+                [self.paths[0]] * 2 + [self.paths[2]] * 3,
+                list(batch.drop_duplicates(
+                    ["10k_path", "sentence_index"])["10k_path"]))
+            self.assertEqual(
+                [0, 2, 0, 2, 3],
+                list(batch.drop_duplicates(
+                    ["10k_path", "sentence_index"])["sentence_index"]))
+
+    def test_chunks(self):
+        """Tests that scoring filings in chunks gives the same rows as
+        scoring each filing in one go
+        """
+        expected = self.pipeline.get_batch_rows(self.paths, self.filings)
+        paths = []
+        chunks = []
+        offsets = []
+        for path, sentences in zip(self.paths, self.filings):
+            for start in range(0, max(len(sentences), 1), 2):
+                paths.append(path)
+                chunks.append(sentences[start:start + 2])
+                offsets.append(start)
+        pd.testing.assert_frame_equal(
+            expected,
+            self.pipeline.get_batch_rows(paths, chunks, offsets=offsets))
+
+    def test_matches_linear_kernel(self):
+        """Tests that scoring every topic with one matrix product gives the
+        same similarities as `linear_kernel` for each topic
+        """
+        sentences = [sentence for sentences in self.filings
+                     for sentence in sentences]
+        sentence_matrix = self.model.transform(sentences)
+        expected = np.column_stack([
+            linear_kernel(self.model.transform([topic]),
+                          sentence_matrix).flatten()
+            for topic in TFIDFScorePipeline.TOPICS])
+        np.testing.assert_allclose(
+            expected, self.pipeline.score_sentences(sentences), atol=1e-12)
+        self.assertEqual((0, len(TFIDFScorePipeline.TOPICS)),
+                         self.pipeline.score_sentences([]).shape)
+
+    def test_threshold(self):
+        """Tests that scores at or below the threshold and sentences that are
+        too short are left out
+        """
+        sentences = ["debt cash",
+                     "debt indebtedness cash obligation covenant",
+                     "unrelated words only here",
+                     "product liability claim market insurance"]
+        similarities = self.pipeline.score_sentences(sentences)
+        # The short sentence would be kept if it were long enough
+        self.assertLessEqual(len(sentences[0]),
+                             TFIDFScorePipeline.MIN_SENTENCE_LENGTH)
+        self.assertGreater(similarities[0].max(), TFIDFScorePipeline.THRESHOLD)
+        self.assertLessEqual(similarities[2].max(),
+                             TFIDFScorePipeline.THRESHOLD)
+
+        rows = self.pipeline.get_batch_rows([self.paths[0]], [sentences])
+        self.assertEqual([1, 3], list(rows["sentence_index"]))
+        self.assertEqual([sentences[1], sentences[3]],
+                         list(rows["joined tokens"]))
+        scores = rows[TFIDFScorePipeline.get_columns()[3:]].to_numpy()
+        expected = similarities[[1, 3]]
+        above = expected > TFIDFScorePipeline.THRESHOLD
+        np.testing.assert_array_equal(above, ~np.isnan(scores))
+        np.testing.assert_allclose(expected[above], scores[above])
+
+        rows = self.pipeline.get_batch_rows([self.paths[0]], [sentences],
+                                            "long")
+        row, topic = np.nonzero(above)
+        self.assertEqual([1, 3], sorted(set(rows["sentence_index"])))
+        self.assertEqual(list(np.array([1, 3])[row]),
+                         list(rows["sentence_index"]))
+        self.assertEqual(list(topic), list(rows["topic"]))
+        np.testing.assert_allclose(expected[row, topic], rows["score"])
+
+
+if __name__ == "__main__":
+    main()
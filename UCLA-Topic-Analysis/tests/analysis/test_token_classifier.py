@@ -0,0 +1,70 @@
+"""Tests the TokenClassifier class
+"""
+from unittest import TestCase
+from unittest import main
+
+from gensim.corpora import Dictionary
+
+from ucla_topic_analysis.analysis.token_classifier import TokenClassifier
+
+
+class TokenClassifierTestCase(TestCase):
+    """Tests the TokenClassifier class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.sentences = [
+            ["risk", "market", "uncertainty"],
+            ["risky", "uncertain", "riskuncertain", "risk"]
+        ]
+        self.dictionary = Dictionary(self.sentences)
+
+    def test_substring(self):
+        """Tests counting words that contain a keyword
+        """
+        classifier = TokenClassifier(self.dictionary)
+        bows = [self.dictionary.doc2bow(tokens) for tokens in self.sentences]
+        # A word with both keywords is a risk word
+        self.assertEqual((4, 2), classifier.count(bows))
+
+    def test_exact(self):
+        """Tests counting only the keywords themselves
+        """
+        classifier = TokenClassifier(self.dictionary,
+                                     risk_words=["RISK", "risky"],
+                                     uncertain_words=["uncertainty"],
+                                     match="exact")
+        bows = [self.dictionary.doc2bow(tokens) for tokens in self.sentences]
+        self.assertEqual((3, 1), classifier.count(bows))
+
+    def test_missing_words(self):
+        """Tests that words missing from the dictionary are counted
+        """
+        classifier = TokenClassifier(self.dictionary)
+        bow, missing = self.dictionary.doc2bow(
+            ["risk", "risks", "uncertainties", "growth"], return_missing=True)
+        self.assertEqual((2, 1), classifier.count([bow], missing))
+
+    def test_empty(self):
+        """Tests counting no documents
+        """
+        classifier = TokenClassifier(self.dictionary)
+        self.assertEqual((0, 0), classifier.count([]))
+        self.assertEqual((0, 0), classifier.count([[], []]))
+
+    def test_id_gaps(self):
+        """Tests a dictionary whose ids are not numbered from 0 without gaps
+        """
+        dictionary = Dictionary.from_corpus(
+            [[(0, 1), (7, 2)]], id2word={0: "market", 7: "risk"})
+        classifier = TokenClassifier(dictionary)
+        self.assertEqual((2, 0), classifier.count([[(0, 1), (7, 2)]]))
+
+        classifier = TokenClassifier(Dictionary())
+        self.assertEqual((1, 0), classifier.count([[]], {"risk": 1}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Tests building the dictionary in shards and saving it while it is built
+"""
+import os
+import shutil
+from unittest import TestCase
+from unittest import main
+from unittest import skipUnless
+from unittest.mock import patch
+
+from gensim.corpora import Dictionary
+
+import ucla_topic_analysis.data
+from tests.utils import async_test
+
+try:
+    from ucla_topic_analysis.data.coroutines.dictionary import (
+        DictionaryPipeline)
+    from ucla_topic_analysis.data.coroutines.dictionary import merge_shard
+except LookupError:
+    # The NLTK data used by the preprocessing is not installed
+    DictionaryPipeline = merge_shard = None
+
+
+@skipUnless(merge_shard, "requires the NLTK data")
+class MergeShardTestCase(TestCase):
+    """Tests the merge_shard function
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.documents = [
+            ["market", "risk", "interest", "rate"],
+            ["interest", "rate", "swap", "market", "market"],
+            [],
+            ["product", "liability", "claim"],
+            ["supplier", "product", "revenue", "customer", "risk"],
+            ["risk", "factor", "operation", "operation"],
+            ["debt", "cash", "market"]
+        ]
+
+    def test_matches_sequential(self):
+        """Tests that merging shards in order gives the same dictionary as
+        adding every document to one dictionary
+        """
+        expected = Dictionary(self.documents)
+        for bounds in ([0, 7], [0, 3, 7], [0, 1, 1, 4, 6, 7]):
+            dictionary = Dictionary()
+            for start, end in zip(bounds, bounds[1:]):
+                merge_shard(dictionary, Dictionary(self.documents[start:end]))
+            self.assertEqual(expected.token2id, dictionary.token2id)
+            self.assertEqual(expected.dfs, dictionary.dfs)
+            self.assertEqual(expected.cfs, dictionary.cfs)
+            self.assertEqual(expected.num_docs, dictionary.num_docs)
+            self.assertEqual(expected.num_pos, dictionary.num_pos)
+
+@skipUnless(DictionaryPipeline, "requires the NLTK data")
+class CheckpointTestCase(TestCase):
+    """Tests that the DictionaryPipeline saves the dictionary while it is
+    updated
+    """
+
+    DOCUMENTS = [
+        ["market", "risk", "interest", "rate"],
+        ["interest", "rate", "swap", "market", "market"],
+        ["product", "liability", "claim"],
+        ["supplier", "product", "revenue", "customer", "risk"],
+        ["risk", "factor", "operation", "operation"],
+        ["debt", "cash", "market"],
+        ["claim", "lawsuit", "debt"]
+    ]
+
+    def setUp(self):
+        """Points the training folder at an empty dictionary
+        """
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(test_dir, "dictionary-checkpoint")
+        os.makedirs(self.folder, exist_ok=True)
+        patcher = patch.object(ucla_topic_analysis.data,
+                               "TRAINING_FOLDER_PATH", self.folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.file_path = os.path.join(self.folder, "dictionary.gensim")
+        Dictionary().save(self.file_path)
+        # Each row has two documents
+        self.rows = [
+            {"text": [self.DOCUMENTS[index % len(self.DOCUMENTS)],
+                      self.DOCUMENTS[(3 * index) % len(self.DOCUMENTS)]]}
+            for index in range(10)
+        ]
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def get_saved(self):
+        """
+        Returns:
+            :obj:`gensim.corpora.dictionary.Dictionary`: The saved dictionary
+        """
+        return Dictionary.load(self.file_path)
+
+    def assertDictionaryEqual(self, expected, dictionary):
+        """Checks that two dictionaries have the same words and counts
+
+        Args:
+            expected (:obj:`gensim.corpora.dictionary.Dictionary`): The
+                expected dictionary
+            dictionary (:obj:`gensim.corpora.dictionary.Dictionary`): The
+                dictionary to check
+        """
+        self.assertEqual(expected.token2id, dictionary.token2id)
+        self.assertEqual(expected.dfs, dictionary.dfs)
+        self.assertEqual(expected.cfs, dictionary.cfs)
+        self.assertEqual(expected.num_docs, dictionary.num_docs)
+        self.assertEqual(expected.num_pos, dictionary.num_pos)
+
+    @staticmethod
+    def iter_rows(rows, fail_after=None):
+        """Gives copies of the rows like a fresh input stream would
+
+        Args:
+            rows (:obj:`list` of :obj:`dict`): The rows
+            fail_after (int): The number of rows to give before failing.
+                Defaults to None, which gives every row.
+
+        Yields:
+            :obj:`dict`: A row
+        """
+        for index, row in enumerate(rows):
+            if index == fail_after:
+                raise RuntimeError("interrupted")
+            yield {"text": list(row["text"])}
+
+    @async_test
+    async def test_save_interval(self):
+        """Tests that the dictionary is saved after every `SAVE_INTERVAL` rows
+        or once `SAVE_SECONDS` have passed, and not after every row
+        """
+        saved = []
+        with patch.object(DictionaryPipeline, "SAVE_INTERVAL", 3):
+            pipeline = DictionaryPipeline(
+                input_stream=self.iter_rows(self.rows), allow_update=True)
+            async for _data in pipeline.output_stream():
+                saved.append(self.get_saved().num_docs)
+        self.assertEqual([0, 0, 6, 6, 6, 12, 12, 12, 18, 18], saved)
+        # The rows after the last checkpoint are saved when the stream ends
+        self.assertEqual(20, self.get_saved().num_docs)
+
+        Dictionary().save(self.file_path)
+        saved = []
+        with patch.object(DictionaryPipeline, "SAVE_SECONDS", 0):
+            pipeline = DictionaryPipeline(
+                input_stream=self.iter_rows(self.rows[:3]), allow_update=True)
+            async for _data in pipeline.output_stream():
+                saved.append(self.get_saved().num_docs)
+        self.assertEqual([2, 4, 6], saved)
+
+    @async_test
+    async def test_save_interrupted(self):
+        """Tests that the dictionary is saved when the stream fails or is
+        stopped before it ends
+        """
+        with patch.object(DictionaryPipeline, "SAVE_INTERVAL", 3):
+            pipeline = DictionaryPipeline(
+                input_stream=self.iter_rows(self.rows, fail_after=5),
+                allow_update=True)
+            with self.assertRaises(RuntimeError):
+                async for _data in pipeline.output_stream():
+                    pass
+            self.assertEqual(10, self.get_saved().num_docs)
+
+            pipeline = DictionaryPipeline(
+                input_stream=self.iter_rows(self.rows), allow_update=True)
+            stream = pipeline.output_stream()
+            for _ in range(2):
+                await stream.__anext__()
+            await stream.aclose()
+            self.assertEqual(14, self.get_saved().num_docs)
+
+    @async_test
+    async def test_resume(self):
+        """Tests that a build resumed from the saved dictionary gives the same
+        dictionary as one that was never interrupted
+        """
+        expected = Dictionary(document for row in self.rows
+                              for document in row["text"])
+        with patch.object(DictionaryPipeline, "SAVE_INTERVAL", 3):
+            pipeline = DictionaryPipeline(
+                input_stream=self.iter_rows(self.rows, fail_after=5),
+                allow_update=True)
+            with self.assertRaises(RuntimeError):
+                async for _data in pipeline.output_stream():
+                    pass
+
+            # The rows that were not added are added to the saved dictionary
+            pipeline = DictionaryPipeline(
+                input_stream=self.iter_rows(self.rows[5:]), allow_update=True)
+            async for _data in pipeline.output_stream():
+                pass
+        self.assertDictionaryEqual(expected, self.get_saved())
+        self.assertDictionaryEqual(expected, await pipeline.get_dictionary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Tests the ExecutorPipeline
+"""
+from unittest import TestCase
+from unittest import main
+
+from tests.utils import async_test
+from ucla_topic_analysis.data.coroutines.executor import ExecutorPipeline
+from ucla_topic_analysis.data.coroutines.sent_lemmatise import SentLemmaPipeline
+
+
+class OutputStreamTestCase(TestCase):
+    """Tests the output_stream function in the ExecutorPipeline class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.documents = [
+            {"path": str(i), "text": [["word", str(i)], ["another", "word"]]}
+            for i in range(10)
+        ]
+        self.expected = [
+            {"path": str(i), "text": ["word " + str(i), "another word"]}
+            for i in range(10)
+        ]
+
+    @async_test
+    async def test_results_match(self):
+        """Tests that the workers return the same results in the same order
+        """
+        pipeline = ExecutorPipeline(
+            [SentLemmaPipeline()], input_stream=self.documents, workers=2)
+        actual = [data async for data in pipeline.output_stream()]
+        self.assertEqual(self.expected, actual)
+
+    @async_test
+    async def test_batches(self):
+        """Tests that batching the documents gives the same results
+        """
+        pipeline = ExecutorPipeline(
+            [SentLemmaPipeline()], input_stream=self.documents, workers=2,
+            batch_size=3)
+        actual = [data async for data in pipeline.output_stream()]
+        self.assertEqual(self.expected, actual)
+        self.assertEqual(self.expected[-1], pipeline.result)
+
+    @async_test
+    async def test_workers_are_stopped(self):
+        """Tests that the process pool is shut down when the stream ends
+        """
+        pipeline = ExecutorPipeline(
+            [SentLemmaPipeline()], input_stream=self.documents, workers=2)
+        async for _data in pipeline.output_stream():
+            self.assertIsNotNone(pipeline._executor)
+        self.assertIsNone(pipeline._executor)
+
+    def test_process(self):
+        """Tests running the stages in the current process
+        """
+        pipeline = ExecutorPipeline([SentLemmaPipeline()], workers=1)
+        self.assertEqual(self.expected[0], pipeline.process(self.documents[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ from unittest import TestCase
 
 from tests.utils import async_test
 from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
+from ucla_topic_analysis.data.coroutines.read import add_offsets
+from ucla_topic_analysis.data.coroutines.read import join_chunks
+from ucla_topic_analysis.data.manifest import CorpusManifest
 
 
 class CoroutineTestCase(TestCase):
@@ -39,3 +42,147 @@ class CoroutineTestCase(TestCase):
                     "And a third line for luck")
         actual = await self.file_reader.coroutine(self.data_dir + "/test-file2.txt")
         self.assertEqual(expected, actual["text"])
+
+
+class ChunkTestCase(TestCase):
+    """Tests reading files in chunks
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.data_dir = os.path.dirname(os.path.realpath(__file__)) + "/data"
+        self.file_path = self.data_dir + "/chunked-file.txt"
+        self.text = ("First sentence. Second one is longer\n\n" +
+                     "A new paragraph? Yes, with caf\u00e9 and \u20ac signs. " +
+                     "Averyveryverylongwordthatdoesnotfit")
+        with open(self.file_path, "w", encoding="utf-8") as data_file:
+            data_file.write(self.text)
+
+    def tearDown(self):
+        """cleans up after the tests
+        """
+        os.remove(self.file_path)
+
+    def test_iter_chunks(self):
+        """Tests that chunks end on boundaries and give back the whole text
+        """
+        for use_mmap in (False, True):
+            chunks = list(ReadFilePipeline.iter_chunks(
+                self.file_path, 30, use_mmap=use_mmap))
+            self.assertEqual(self.text, "".join(chunks))
+            # The chunk size is in bytes when the file is memory mapped
+            sizes = [len(chunk.encode("utf-8") if use_mmap else chunk)
+                     for chunk in chunks]
+            self.assertLessEqual(max(sizes), 30)
+            # Only the long word at the end has to be cut
+            self.assertTrue(all(chunk[-1].isspace() for chunk in chunks[:-2]))
+
+        chunks = list(ReadFilePipeline.iter_chunks(self.file_path, 45))
+        self.assertEqual("First sentence. Second one is longer\n\n",
+                         chunks[0])
+
+        # An empty file has one empty chunk
+        with open(self.file_path, "w", encoding="utf-8"):
+            pass
+        for use_mmap in (False, True):
+            chunks = list(ReadFilePipeline.iter_chunks(
+                self.file_path, 10, use_mmap=use_mmap))
+            self.assertEqual([""], chunks)
+
+    @async_test
+    async def test_chunked_stream(self):
+        """Tests that the chunks of each file are labelled and can be joined
+        """
+        files = [self.file_path, self.data_dir + "/test-file2.txt"]
+        pipeline = ReadFilePipeline(input_stream=files, chunk_size=30)
+        chunks = [chunk async for chunk in pipeline.output_stream()]
+        self.assertEqual(0, chunks[0]["chunk"])
+        self.assertTrue(chunks[-1]["final"])
+        self.assertEqual(2, sum(chunk["final"] for chunk in chunks))
+
+        pipeline = ReadFilePipeline(input_stream=files, chunk_size=30)
+        documents = [document async for document
+                     in join_chunks(pipeline.output_stream())]
+        self.assertEqual(2, len(documents))
+        self.assertEqual(self.text, documents[0]["text"])
+        self.assertNotIn("chunk", documents[0])
+
+    @async_test
+    async def test_hash(self):
+        """Tests that the hash of each file's contents is given with the file
+        or its last chunk, however it is read
+        """
+        files = [self.file_path, self.data_dir + "/test-file2.txt"]
+        expected = [CorpusManifest.get_hash(file_path) for file_path in files]
+        pipeline = ReadFilePipeline(input_stream=files)
+        self.assertEqual(expected, [data["hash"] async for data
+                                    in pipeline.output_stream()])
+        for use_mmap in (False, True):
+            pipeline = ReadFilePipeline(input_stream=files, chunk_size=30,
+                                        use_mmap=use_mmap)
+            chunks = [chunk async for chunk in pipeline.output_stream()]
+            self.assertEqual(expected, [chunk["hash"] for chunk in chunks
+                                        if chunk["final"]])
+            self.assertFalse(any("hash" in chunk for chunk in chunks
+                                 if not chunk["final"]))
+            pipeline = ReadFilePipeline(input_stream=files, chunk_size=30,
+                                        use_mmap=use_mmap)
+            self.assertEqual(expected, [
+                document["hash"] async for document
+                in join_chunks(pipeline.output_stream())])
+
+    @async_test
+    async def test_add_offsets(self):
+        """Tests that each chunk has the position of its text in its file
+        """
+        files = [self.file_path, self.data_dir + "/test-file2.txt"]
+        pipeline = ReadFilePipeline(input_stream=files, chunk_size=30)
+        chunks = [chunk async for chunk
+                  in add_offsets(pipeline.output_stream())]
+        texts = {}
+        for chunk in chunks:
+            text = texts.setdefault(chunk["path"], "")
+            # The offset of a file's first chunk is 0
+            self.assertEqual(len(text), chunk["offset"])
+            texts[chunk["path"]] = text + chunk["text"]
+        self.assertEqual(2, len(texts))
+        self.assertIn(self.text, texts.values())
+
+class LabelTestCase(TestCase):
+    """Tests labelling documents for a schema
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.schema = {"training": 0.8, "testing": 0.2}
+        self.paths = ["sec_edgar_filings/T{0}/10-K/2019-01-01.txt".format(index)
+                      for index in range(2000)]
+
+    def test_get_labels(self):
+        """Tests that the labels follow the schema and do not depend on the
+        order of the documents
+        """
+        labels = ReadFilePipeline.get_labels(self.paths, self.schema)
+        self.assertAlmostEqual(0.2, labels.count("testing") / len(labels),
+                               delta=0.03)
+        reverse = ReadFilePipeline.get_labels(self.paths[::-1], self.schema)
+        self.assertEqual(labels, reverse[::-1])
+        windows = [path.replace("/", "\\") for path in self.paths[:10]]
+        self.assertEqual(labels[:10],
+                         ReadFilePipeline.get_labels(windows, self.schema))
+        self.assertEqual([None, None],
+                         ReadFilePipeline.get_labels(self.paths[:2], None))
+
+        # Another salt gives other labels
+        self.assertNotEqual(labels, ReadFilePipeline.get_labels(
+            self.paths, self.schema, salt="other"))
+
+    def test_sort_document(self):
+        """Tests that the pipeline labels a document like get_labels does
+        """
+        pipeline = ReadFilePipeline(schema=self.schema)
+        labels = ReadFilePipeline.get_labels(self.paths[:20], self.schema)
+        self.assertEqual(labels, [pipeline._sort_document(path)
+                                  for path in self.paths[:20]])
@@ -0,0 +1,190 @@
+"""Tests the corpus file formats
+"""
+import os
+import json
+import shutil
+from unittest import TestCase
+from unittest import main
+
+from ucla_topic_analysis.data.corpus_file import BinaryCorpusFile
+from ucla_topic_analysis.data.corpus_file import JsonCorpusFile
+
+
+class CorpusFileTestCase(TestCase):
+    """Tests that the JSON and binary corpus files hold the same data
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(data_dir, "corpus-file")
+        os.makedirs(self.folder, exist_ok=True)
+        labels = ["training", "validation", "testing"]
+        self.corpus_files = [
+            JsonCorpusFile(os.path.join(self.folder, "corpus.dat")),
+            BinaryCorpusFile(os.path.join(self.folder, "corpus-csr"), labels)
+        ]
+        self.rows = [
+            {"path": "a.txt", "label": "training",
+             "text": [[[0, 1], [3, 2]], [], [[1, 5]]]},
+            {"path": "b.txt", "label": "testing", "text": [[[2, 1]]]},
+            {"path": "c.txt", "label": "training", "text": [[[4, 7], [5, 1]]]}
+        ]
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    @staticmethod
+    def get_documents(corpus_file, label):
+        """Reads the documents for a label as lists of lists
+        """
+        return [[list(term) for term in document]
+                for document in corpus_file.iter_documents(label)]
+
+    def test_append_and_iterate(self):
+        """Tests that documents are returned in the order they were added
+        """
+        for corpus_file in self.corpus_files:
+            self.assertFalse(corpus_file.exists())
+            for row in self.rows:
+                corpus_file.append(row)
+            self.assertTrue(corpus_file.exists())
+            self.assertEqual(
+                [[[0, 1], [3, 2]], [], [[1, 5]], [[4, 7], [5, 1]]],
+                self.get_documents(corpus_file, "training"))
+            self.assertEqual([[[2, 1]]],
+                             self.get_documents(corpus_file, "testing"))
+            self.assertEqual([], self.get_documents(corpus_file, "validation"))
+            self.assertEqual((4, 3), corpus_file.count("training"))
+            self.assertEqual(["a.txt", "b.txt", "c.txt"],
+                             corpus_file.get_row_paths())
+
+    def test_remove_rows(self):
+        """Tests removing the rows for some files
+        """
+        for corpus_file in self.corpus_files:
+            for row in self.rows:
+                corpus_file.append(row)
+            corpus_file.remove_rows({"a.txt"})
+            self.assertEqual([[[4, 7], [5, 1]]],
+                             self.get_documents(corpus_file, "training"))
+            self.assertEqual([[[2, 1]]],
+                             self.get_documents(corpus_file, "testing"))
+            self.assertEqual(["b.txt", "c.txt"], corpus_file.get_row_paths())
+
+            # Rows can still be added after removing some
+            corpus_file.append(self.rows[0])
+            self.assertEqual((4, 3), corpus_file.count("training"))
+            self.assertEqual(
+                [[[4, 7], [5, 1]], [[0, 1], [3, 2]], [], [[1, 5]]],
+                self.get_documents(corpus_file, "training"))
+
+    def test_binary_stopped_append(self):
+        """Tests that data left by an append that was stopped before it
+        extended indptr.bin, in corpora written when indptr.bin was extended
+        last, is ignored and then removed
+        """
+        corpus_file = self.corpus_files[1]
+        corpus_file.append(self.rows[0])
+        for name in ("indices.bin", "counts.bin", "labels.bin"):
+            with open(os.path.join(corpus_file.file_path, name),
+                      "ab") as array_file:
+                array_file.write(b"\x01\x00\x00\x00")
+        with open(os.path.join(corpus_file.file_path, "rows.jsonl"),
+                  "a") as rows_file:
+            rows_file.write(json.dumps({"path": "b.txt", "label": "testing",
+                                       "documents": 1}) + "\n")
+            rows_file.write('{"path": "c.t')
+        with open(os.path.join(corpus_file.file_path, "indptr.bin"),
+                  "ab") as indptr_file:
+            indptr_file.write(b"\x05\x00")
+
+        corpus_file = BinaryCorpusFile(corpus_file.file_path,
+                                       ["training", "validation", "testing"])
+        self.assertEqual((3, 1), corpus_file.count("training"))
+        self.assertEqual(["a.txt"], corpus_file.get_row_paths())
+        self.assertEqual([], self.get_documents(corpus_file, "testing"))
+
+        corpus_file.append(self.rows[2])
+        self.assertEqual(["a.txt", "c.txt"], corpus_file.get_row_paths())
+        self.assertEqual(
+            [[[0, 1], [3, 2]], [], [[1, 5]], [[4, 7], [5, 1]]],
+            self.get_documents(corpus_file, "training"))
+        corpus_file.remove_rows({"a.txt"})
+        self.assertEqual([[[4, 7], [5, 1]]],
+                         self.get_documents(corpus_file, "training"))
+
+    def test_binary_stopped_before_row(self):
+        """Tests that documents added by an append that was stopped before it
+        wrote the row are ignored and then removed, and that rows without
+        documents are kept
+        """
+        corpus_file = self.corpus_files[1]
+        corpus_file.append(self.rows[0])
+        rows_path = os.path.join(corpus_file.file_path, "rows.jsonl")
+        rows_size = os.path.getsize(rows_path)
+        corpus_file.append(self.rows[1])
+        with open(rows_path, "r+b") as rows_file:
+            rows_file.truncate(rows_size)
+            rows_file.seek(rows_size)
+            rows_file.write(b'{"path": "d.txt", "label": "testing", "docu')
+
+        corpus_file = BinaryCorpusFile(corpus_file.file_path,
+                                       ["training", "validation", "testing"])
+        self.assertEqual((0, 1), corpus_file.count("testing"))
+        self.assertEqual(["a.txt"], corpus_file.get_row_paths())
+        self.assertEqual([], self.get_documents(corpus_file, "testing"))
+
+        corpus_file.append({"path": "d.txt", "label": "testing", "text": []})
+        corpus_file.append(self.rows[2])
+        self.assertEqual(["a.txt", "d.txt", "c.txt"],
+                         corpus_file.get_row_paths())
+        self.assertEqual((0, 3), corpus_file.count("testing"))
+        self.assertEqual(
+            [[[0, 1], [3, 2]], [], [[1, 5]], [[4, 7], [5, 1]]],
+            self.get_documents(corpus_file, "training"))
+        self.assertEqual(5 * 8, os.path.getsize(
+            os.path.join(corpus_file.file_path, "indptr.bin")))
+
+    def test_binary_stopped_replace(self):
+        """Tests that a corpus moved aside by a rewrite that was stopped is
+        put back
+        """
+        corpus_file = self.corpus_files[1]
+        corpus_file.append(self.rows[0])
+        os.replace(corpus_file.file_path, corpus_file.file_path + ".old")
+        corpus_file = BinaryCorpusFile(corpus_file.file_path,
+                                       ["training", "validation", "testing"])
+        self.assertEqual(["a.txt"], corpus_file.get_row_paths())
+
+    def test_json_index(self):
+        """Tests that the JSON corpus index is rebuilt when it is missing or
+        does not match the corpus file
+        """
+        corpus_file = self.corpus_files[0]
+        for row in self.rows[:2]:
+            corpus_file.append(row)
+        self.assertTrue(os.path.isfile(corpus_file.index_path))
+
+        # Missing index
+        os.remove(corpus_file.index_path)
+        corpus_file = JsonCorpusFile(corpus_file.file_path)
+        self.assertEqual((3, 2), corpus_file.count("training"))
+        self.assertTrue(os.path.isfile(corpus_file.index_path))
+
+        # Rows written without updating the index
+        with open(corpus_file.file_path, "a") as data_file:
+            data_file.write(json.dumps(self.rows[2]))
+            data_file.write("\n")
+        corpus_file = JsonCorpusFile(corpus_file.file_path)
+        self.assertEqual((4, 3), corpus_file.count("training"))
+        self.assertEqual(
+            [[[0, 1], [3, 2]], [], [[1, 5]], [[4, 7], [5, 1]]],
+            self.get_documents(corpus_file, "training"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Tests the FileDiscovery class
+"""
+import os
+import shutil
+from unittest import TestCase
+from unittest import main
+
+from ucla_topic_analysis.data.discovery import FileDiscovery
+from ucla_topic_analysis.data.discovery import parse_path
+
+
+class DiscoveryTestCase(TestCase):
+    """Tests listing files with the FileDiscovery class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        self.data_dir = os.path.join(test_dir, "discovery-data")
+        self.manifest_path = os.path.join(test_dir, "file-manifest.json")
+        for ticker in ("AAPL", "MSFT"):
+            for date in ("2018-11-05", "2019-11-01"):
+                self.write_file(os.path.join("sec_edgar_filings", ticker,
+                                             "10-K", date + ".txt"))
+        self.write_file("notes.md")
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        if os.path.isfile(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def write_file(self, rel_path):
+        """Writes a file in the test folder
+
+        Returns:
+            str: The path to the file
+        """
+        file_path = os.path.join(self.data_dir, rel_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as data_file:
+            data_file.write(rel_path)
+        return file_path
+
+    def get_walk(self):
+        """
+        Returns:
+            :obj:`list` of :obj:`str`: The text files found with os.walk
+        """
+        return sorted(os.path.join(dir_path, file_name)
+                      for dir_path, _dir_names, file_names
+                      in os.walk(self.data_dir)
+                      for file_name in file_names if file_name.endswith(".txt"))
+
+    def test_parse_path(self):
+        """Tests reading the ticker and date from a path
+        """
+        self.assertEqual(("AAPL", "2018-11-05"), parse_path(
+            "sec_edgar_filings\\AAPL\\10-K\\2018-11-05.txt"))
+        self.assertEqual((None, None), parse_path("notes.txt"))
+
+    def test_get_files(self):
+        """Tests that the files match a walk of the folder
+        """
+        discovery = FileDiscovery(self.data_dir, self.manifest_path)
+        self.assertEqual(self.get_walk(), discovery.get_file_list())
+        files = discovery.get_files()
+        self.assertEqual(("AAPL", "2018-11-05"),
+                         (files[0]["ticker"], files[0]["date"]))
+        self.assertEqual(os.path.getsize(self.get_walk()[0]), files[0]["size"])
+
+    def test_cache(self):
+        """Tests that unchanged folders are read from the manifest and changed
+        folders are listed again
+        """
+        FileDiscovery(self.data_dir, self.manifest_path).get_files()
+        folder = os.path.join(self.data_dir, "sec_edgar_filings", "AAPL",
+                              "10-K")
+        mtime = os.stat(folder).st_mtime
+
+        # A folder with the same modification time is not listed again
+        os.remove(os.path.join(folder, "2018-11-05.txt"))
+        os.utime(folder, (mtime, mtime))
+        discovery = FileDiscovery(self.data_dir, self.manifest_path)
+        self.assertEqual(4, len(discovery.get_file_list()))
+
+        # A folder with a new modification time is
+        os.utime(folder, (mtime + 10, mtime + 10))
+        self.assertTrue(discovery.refresh(force=True))
+        self.assertEqual(self.get_walk(), discovery.get_file_list())
+        self.assertFalse(discovery.refresh(force=True))
+
+        # New folders are found
+        self.write_file(os.path.join("sec_edgar_filings", "GOOG", "10-K",
+                                     "2019-02-01.txt"))
+        discovery.refresh(force=True)
+        self.assertEqual(self.get_walk(), discovery.get_file_list())
+
+
+if __name__ == "__main__":
+    main()
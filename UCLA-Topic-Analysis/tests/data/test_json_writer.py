@@ -0,0 +1,96 @@
+"""Tests the JSON writers
+"""
+import os
+import json
+from unittest import TestCase
+from unittest import main
+
+from ucla_topic_analysis.data.json_writer import JsonArrayWriter
+from ucla_topic_analysis.data.json_writer import JsonLinesWriter
+
+
+class JsonWriterTestCase(TestCase):
+    """Tests the JsonArrayWriter and JsonLinesWriter classes
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        self.file_path = os.path.join(data_dir, "json-writer-test.json")
+        self.records = [{"text": "a\nb", "id": index} for index in range(3)]
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
+
+    def read(self):
+        """
+        Returns:
+            str: The contents of the test file
+        """
+        with open(self.file_path, "r", encoding="utf-8") as json_file:
+            return json_file.read()
+
+    def write(self, text):
+        """Replaces the contents of the test file
+        """
+        with open(self.file_path, "w", encoding="utf-8") as json_file:
+            json_file.write(text)
+
+    def test_array(self):
+        """Tests writing and appending to a JSON array
+        """
+        with JsonArrayWriter(self.file_path) as writer:
+            pass
+        self.assertEqual([], json.loads(self.read()))
+
+        with JsonArrayWriter(self.file_path) as writer:
+            for record in self.records[:2]:
+                writer.write(record)
+        self.assertEqual(self.records[:2], json.loads(self.read()))
+
+        with JsonArrayWriter(self.file_path) as writer:
+            writer.write(self.records[2])
+        self.assertEqual(self.records, json.loads(self.read()))
+
+        with JsonArrayWriter(self.file_path, append=False) as writer:
+            writer.write(self.records[0])
+        self.assertEqual(self.records[:1], json.loads(self.read()))
+
+    def test_array_recovery(self):
+        """Tests finishing arrays that were not closed
+        """
+        whole = json.dumps(self.records[0])
+        for text, expected in [
+                ("[\n" + whole, self.records[:1]),
+                ("[\n" + whole + ",\n", self.records[:1]),
+                ("[\n" + whole + ",\n" + whole[:5], self.records[:1]),
+                ("[\n" + whole[:5], []),
+                ("[\n", []),
+                # The format written by earlier versions
+                ("[\n\n" + whole + "]", self.records[:1])]:
+            self.write(text)
+            with JsonArrayWriter(self.file_path) as writer:
+                writer.write(self.records[1])
+            self.assertEqual(expected + [self.records[1]],
+                             json.loads(self.read()))
+
+    def test_lines(self):
+        """Tests writing JSON lines and removing an unfinished line
+        """
+        with JsonLinesWriter(self.file_path) as writer:
+            for record in self.records[:2]:
+                writer.write(record)
+        with open(self.file_path, "a", encoding="utf-8") as json_file:
+            json_file.write(json.dumps(self.records[2])[:5])
+        with JsonLinesWriter(self.file_path) as writer:
+            writer.write(self.records[2])
+        lines = self.read().splitlines()
+        self.assertEqual(self.records, [json.loads(line) for line in lines])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Tests the LemmaCache class
+"""
+import os
+import json
+from unittest import TestCase
+from unittest import main
+
+from ucla_topic_analysis.data.lemma_cache import LemmaCache
+
+
+class LemmaCacheTestCase(TestCase):
+    """Tests the LemmaCache class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        self.file_path = os.path.join(data_dir, "lemma-cache.json")
+        self.calls = []
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        try:
+            os.remove(self.file_path)
+        except OSError:
+            pass
+
+    def lemmatise(self, word):
+        """A fake lemmatiser that removes a trailing 's'
+        """
+        self.calls.append(word)
+        return word[:-1] if word.endswith("s") else word
+
+    def test_hits_and_misses(self):
+        """Tests that lemmas are only looked up once
+        """
+        cache = LemmaCache(self.lemmatise)
+        self.assertEqual("risk", cache.get("risks"))
+        self.assertEqual("risk", cache.get("risks"))
+        self.assertEqual("market", cache.get("market"))
+        self.assertEqual(["risks", "market"], self.calls)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_bounded(self):
+        """Tests that the least recently used lemma is dropped
+        """
+        cache = LemmaCache(self.lemmatise, maxsize=2)
+        cache.get("risks")
+        cache.get("loans")
+        cache.get("risks")
+        cache.get("debts")
+        self.assertEqual(2, len(cache))
+        self.assertIn("risks", cache)
+        self.assertNotIn("loans", cache)
+
+    def test_save_and_load(self):
+        """Tests that a saved cache can be loaded by another cache
+        """
+        cache = LemmaCache(self.lemmatise, file_path=self.file_path)
+        cache.get("risks")
+        cache.save()
+
+        other = LemmaCache(self.lemmatise, file_path=self.file_path)
+        self.assertEqual("risk", other.get("risks"))
+        self.assertEqual(1, other.hits)
+        self.assertEqual(["risks"], self.calls)
+
+    def test_save_merges(self):
+        """Tests that saving keeps the lemmas saved by other caches
+        """
+        first = LemmaCache(self.lemmatise, file_path=self.file_path)
+        second = LemmaCache(self.lemmatise, file_path=self.file_path)
+        first.get("risks")
+        second.get("loans")
+        first.save()
+        second.save()
+        with open(self.file_path) as cache_file:
+            saved = json.load(cache_file)
+        self.assertEqual({"risks": "risk", "loans": "loan"}, saved)
+
+    def test_autosave(self):
+        """Tests that the cache is saved after `autosave` new lemmas
+        """
+        cache = LemmaCache(self.lemmatise, file_path=self.file_path,
+                           autosave=2)
+        cache.get("risks")
+        self.assertFalse(os.path.isfile(self.file_path))
+        cache.get("loans")
+        self.assertTrue(os.path.isfile(self.file_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Tests the CorpusManifest class
+"""
+import os
+import shutil
+from unittest import TestCase
+from unittest import main
+from unittest.mock import patch
+
+from ucla_topic_analysis.data.manifest import CorpusManifest
+
+
+class GetChangesTestCase(TestCase):
+    """Tests the get_changes function in the CorpusManifest class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.data_dir = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "manifest-data")
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.data_dir, "manifest.json")
+        self.files = [self.write_file(name, name)
+                      for name in ("file1.txt", "file2.txt")]
+        self.manifest = CorpusManifest(self.manifest_path)
+        for file_path in self.files:
+            self.manifest.add(file_path)
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def write_file(self, name, text, mtime=None):
+        """Writes a file in the test folder
+
+        Returns:
+            str: The path to the file
+        """
+        file_path = os.path.join(self.data_dir, name)
+        with open(file_path, "w") as data_file:
+            data_file.write(text)
+        if mtime is not None:
+            os.utime(file_path, (mtime, mtime))
+        return file_path
+
+    def test_unchanged(self):
+        """Tests that files in the manifest are not reported
+        """
+        self.assertEqual(([], set()), self.manifest.get_changes(self.files))
+
+    def test_new_file(self):
+        """Tests that new files are reported
+        """
+        new_file = self.write_file("file3.txt", "file3")
+        changed, stale = self.manifest.get_changes(self.files + [new_file])
+        self.assertEqual([new_file], changed)
+        self.assertEqual(set(), stale)
+
+    def test_changed_file(self):
+        """Tests that changed files are reported as new and stale
+        """
+        self.write_file("file1.txt", "changed text", mtime=1)
+        changed, stale = self.manifest.get_changes(self.files)
+        self.assertEqual([self.files[0]], changed)
+        self.assertEqual({CorpusManifest.get_rel_path(self.files[0])}, stale)
+
+    def test_touched_file(self):
+        """Tests that files with a new modification time but the same contents
+        are not reported
+        """
+        self.write_file("file1.txt", "file1.txt", mtime=1)
+        self.assertEqual(([], set()), self.manifest.get_changes(self.files))
+
+    def test_deleted_file(self):
+        """Tests that deleted files are reported as stale
+        """
+        changed, stale = self.manifest.get_changes(self.files[1:])
+        self.assertEqual([], changed)
+        self.assertEqual({CorpusManifest.get_rel_path(self.files[0])}, stale)
+
+    def test_add_digest(self):
+        """Tests that a file's hash is not worked out again when it is given
+        """
+        digest = CorpusManifest.get_hash(self.files[0])
+        manifest = CorpusManifest(self.manifest_path)
+        with patch.object(CorpusManifest, "get_hash") as get_hash:
+            manifest.add(self.files[0], digest)
+        get_hash.assert_not_called()
+        # A touched file is compared with the given hash
+        self.write_file("file1.txt", "file1.txt", mtime=1)
+        self.assertEqual(([], set()), manifest.get_changes(self.files[:1]))
+
+    def test_save(self):
+        """Tests that a saved manifest can be loaded
+        """
+        self.manifest.save()
+        loaded = CorpusManifest(self.manifest_path)
+        self.assertEqual(2, len(loaded))
+        self.assertEqual(([], set()), loaded.get_changes(self.files))
+
+
+if __name__ == "__main__":
+    main()
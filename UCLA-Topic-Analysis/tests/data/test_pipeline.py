@@ -54,5 +54,103 @@ class RunTestCase(TestCase):
         await self.pipeline.run("some other test data ")
         self.assertEqual(expected, self.pipeline._result)
 
+
+class SlowPipeline(Pipeline):
+    """ A test pipeline that keeps track of how many elements it is processing
+    at the same time
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = 0
+        self.max_running = 0
+
+    async def coroutine(self, data):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        # Make later elements finish first to check the order is kept
+        await asyncio.sleep(0.01 / (data + 1))
+        self.running -= 1
+        return data * 2
+
+
+class OutputStreamTestCase(TestCase):
+    """Tests the output_stream function in the Pipeline class
+    """
+
+    @staticmethod
+    async def collect(stream):
+        """Collects the elements of an async stream into a list
+        """
+        return [data async for data in stream]
+
+    @async_test
+    async def test_sequential(self):
+        """Tests that elements are processed one at a time by default
+        """
+        pipeline = SlowPipeline(input_stream=range(5))
+        actual = await self.collect(pipeline.output_stream())
+        self.assertEqual([0, 2, 4, 6, 8], actual)
+        self.assertEqual(1, pipeline.max_running)
+
+    @async_test
+    async def test_concurrent_keeps_order(self):
+        """Tests that the concurrent mode yields results in input order
+        """
+        pipeline = SlowPipeline(input_stream=range(20), concurrency=4)
+        actual = await self.collect(pipeline.output_stream())
+        self.assertEqual([2*i for i in range(20)], actual)
+        self.assertEqual(actual[-1], pipeline.result)
+
+    @async_test
+    async def test_concurrency_is_bounded(self):
+        """Tests that no more than `concurrency` elements run at the same time
+        """
+        pipeline = SlowPipeline(input_stream=range(20), concurrency=3)
+        await self.collect(pipeline.output_stream())
+        self.assertEqual(3, pipeline.max_running)
+
+    @async_test
+    async def test_backpressure(self):
+        """Tests that a stage stops reading its input when the queue is full
+        """
+        pulled = []
+
+        def source():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        pipeline = SlowPipeline(input_stream=source(), concurrency=2,
+                                queue_size=4)
+        stream = pipeline.output_stream()
+        await stream.__anext__()
+        await asyncio.sleep(0.05)
+        self.assertLessEqual(len(pulled), 6)
+        await stream.aclose()
+
+    @async_test
+    async def test_chained_stages(self):
+        """Tests chaining concurrent stages with async input streams
+        """
+        first = SlowPipeline(input_stream=range(10), concurrency=2)
+        second = SlowPipeline(input_stream=first.output_stream(), concurrency=2)
+        actual = await self.collect(second.output_stream())
+        self.assertEqual([4*i for i in range(10)], actual)
+
+    @async_test
+    async def test_error_is_raised(self):
+        """Tests that errors in the coroutine reach the consumer
+        """
+        pipeline = TestPipeline(input_stream=["a", 1, "b"], concurrency=2)
+        with self.assertRaises(TypeError):
+            await self.collect(pipeline.output_stream())
+
+    def test_invalid_concurrency(self):
+        """Tests that the concurrency must be positive
+        """
+        with self.assertRaises(ValueError):
+            TestPipeline(concurrency=0)
+
+
 if __name__ == "__main__":
     main()
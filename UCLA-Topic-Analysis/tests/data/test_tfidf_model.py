@@ -0,0 +1,97 @@
+"""Tests the TfidfModel class
+"""
+import os
+import pickle
+import shutil
+from unittest import TestCase
+from unittest import main
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from ucla_topic_analysis.data.tfidf_model import Analyzer
+from ucla_topic_analysis.data.tfidf_model import TfidfModel
+
+
+class TfidfModelTestCase(TestCase):
+    """Tests training and using the TfidfModel class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        self.documents = [
+            "market risk interest rate",
+            "interest rate swap market market",
+            "product liability claim",
+            "supplier product revenue customer",
+            "risk factor operation"
+        ]
+        self.queries = ["Market interest", "product claim the", "unknown"]
+        self.folder = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                   "tfidf-model")
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_matches_sklearn(self):
+        """Tests that the weights match TfidfVectorizer
+        """
+        expected = TfidfVectorizer(analyzer=Analyzer({"the"})).fit(
+            self.documents).transform(self.queries).toarray()
+        model = TfidfModel(stop_words={"the"}).fit(iter(self.documents))
+        self.assertEqual(len(self.documents), model.n_documents)
+        np.testing.assert_allclose(
+            expected, model.transform(self.queries).toarray(), rtol=1e-6)
+
+        # The model can be pickled and used after loading
+        model = pickle.loads(pickle.dumps(model))
+        np.testing.assert_allclose(
+            expected, model.transform(self.queries).toarray(), rtol=1e-6)
+
+    def test_hashing(self):
+        """Tests that hashing gives the same similarities
+        """
+        model = TfidfModel().fit(self.documents)
+        hashed = TfidfModel(hashing=True, batch_size=2).fit(self.documents)
+        expected = (model.transform(self.queries) @
+                    model.transform(self.documents).T).toarray()
+        actual = (hashed.transform(self.queries) @
+                  hashed.transform(self.documents).T).toarray()
+        np.testing.assert_allclose(expected, actual)
+
+    def test_save(self):
+        """Tests that a saved model gives the same vectors when it is loaded
+        """
+        for hashing in (False, True):
+            model = TfidfModel(hashing=hashing, stop_words={"the"}).fit(
+                self.documents)
+            self.assertFalse(TfidfModel.exists(self.folder))
+            model.save(self.folder)
+            self.assertTrue(TfidfModel.exists(self.folder))
+            loaded = TfidfModel.load(self.folder)
+            np.testing.assert_allclose(
+                model.transform(self.queries).toarray(),
+                loaded.transform(self.queries).toarray())
+            self.assertEqual(model.vocabulary_, loaded.vocabulary_)
+
+            # A model moved aside by a save that was stopped is put back
+            model.save(self.folder)
+            os.replace(self.folder, self.folder + ".old")
+            self.assertTrue(TfidfModel.exists(self.folder))
+            shutil.rmtree(self.folder)
+
+    def test_pruning(self):
+        """Tests that the number of words kept is bounded
+        """
+        model = TfidfModel(max_terms=4).fit(self.documents)
+        self.assertLessEqual(len(model.vocabulary_), 4)
+        self.assertEqual(len(self.documents), model.n_documents)
+        self.assertEqual(model.vocabulary_,
+                         TfidfModel(max_terms=4).fit(self.documents).vocabulary_)
+
+
+if __name__ == "__main__":
+    main()
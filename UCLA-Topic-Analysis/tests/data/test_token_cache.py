@@ -0,0 +1,62 @@
+"""Tests the TokenCache class
+"""
+import os
+import shutil
+from unittest import TestCase
+from unittest import main
+
+from ucla_topic_analysis.data.token_cache import TokenCache
+
+
+class TokenCacheTestCase(TestCase):
+    """Tests the TokenCache class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        data_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(data_dir, "token-cache")
+        self.cache = TokenCache(self.folder, "1")
+        self.sentences = [["risk", "factor"], [], ["uncertain", "market"]]
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_missing(self):
+        """Tests getting a document that is not cached
+        """
+        key = self.cache.key("AAPL/10-K/filing.txt", "Some text.")
+        self.assertIsNone(self.cache.get(key))
+
+    def test_put_and_get(self):
+        """Tests that cached documents are returned unchanged
+        """
+        key = self.cache.key("AAPL/10-K/filing.txt", "Some text.")
+        self.cache.put(key, self.sentences)
+        self.assertEqual(self.sentences, self.cache.get(key))
+
+    def test_key_changes(self):
+        """Tests that the key changes with the path, text and version
+        """
+        key = self.cache.key("AAPL/10-K/filing.txt", "Some text.")
+        other_version = TokenCache(self.folder, "2")
+        self.assertNotEqual(
+            key, self.cache.key("MSFT/10-K/filing.txt", "Some text."))
+        self.assertNotEqual(
+            key, self.cache.key("AAPL/10-K/filing.txt", "Other text."))
+        self.assertNotEqual(
+            key, other_version.key("AAPL/10-K/filing.txt", "Some text."))
+
+    def test_path_separators(self):
+        """Tests that windows and posix paths give the same key
+        """
+        self.assertEqual(
+            self.cache.key("AAPL\\10-K\\filing.txt", "Some text."),
+            self.cache.key("AAPL/10-K/filing.txt", "Some text."))
+
+
+if __name__ == "__main__":
+    main()
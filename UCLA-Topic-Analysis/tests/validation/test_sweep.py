@@ -0,0 +1,122 @@
+"""Tests the LDA sweep
+"""
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest import main
+from unittest.mock import patch
+
+from gensim.corpora import Dictionary
+
+from ucla_topic_analysis.data.corpus_file import BinaryCorpusFile
+from ucla_topic_analysis.data.corpus_file import JsonCorpusFile
+from ucla_topic_analysis.validation.sweep import LdaSweep
+from ucla_topic_analysis.validation.sweep import get_binary_corpus
+
+
+class SweepTestCase(TestCase):
+    """Tests training and scoring models with the LdaSweep class
+    """
+
+    def setUp(self):
+        """sets up the tests
+        """
+        test_dir = os.path.dirname(os.path.realpath(__file__))
+        self.folder = os.path.join(test_dir, "sweep")
+        os.makedirs(self.folder, exist_ok=True)
+        self.labels = ["training", "validation", "testing"]
+        texts = [
+            ["market", "risk", "interest", "rate"],
+            ["interest", "rate", "swap", "market"],
+            ["product", "liability", "claim", "insurance"],
+            ["supplier", "product", "revenue", "customer"],
+            ["risk", "factor", "operation", "interest"],
+            ["claim", "lawsuit", "liability", "product"]
+        ]
+        self.dictionary = Dictionary(texts)
+        self.json_corpus = JsonCorpusFile(
+            os.path.join(self.folder, "lda-corpus.dat"))
+        for index, text in enumerate(texts):
+            self.json_corpus.append({
+                "label": "validation" if index == 5 else "training",
+                "path": "file{0}.txt".format(index),
+                "text": [self.dictionary.doc2bow(text)] * 3
+            })
+
+    def tearDown(self):
+        """Cleans up after any tests
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_binary_corpus(self):
+        """Tests that a JSON corpus is copied to a binary corpus
+        """
+        folder = os.path.join(self.folder, "lda-corpus-csr")
+        self.assertEqual(folder, get_binary_corpus(self.json_corpus,
+                                                   self.labels, folder,
+                                                   batch_size=4))
+        binary = BinaryCorpusFile(folder, self.labels)
+        for label in self.labels:
+            self.assertEqual(
+                [[tuple(term) for term in document]
+                 for document in self.json_corpus.iter_documents(label)],
+                list(binary.iter_documents(label)))
+        self.assertEqual(folder, get_binary_corpus(binary, self.labels, None))
+
+    def test_run(self):
+        """Tests that each number of topics is scored once and a sweep carries
+        on from where it stopped
+        """
+        folder = get_binary_corpus(self.json_corpus, self.labels,
+                                   os.path.join(self.folder, "lda-corpus-csr"))
+        results_path = os.path.join(self.folder, "lda-sweep.csv")
+        sweep = LdaSweep([2, 3], self.dictionary, folder, self.labels, cpus=2,
+                         random_state=1, results_path=results_path)
+        results = sweep.run()
+        self.assertEqual([2, 3], list(results["num_topics"]))
+        self.assertTrue((results["perplexity"] > 1).all())
+        self.assertTrue(results["coherence"].notna().all())
+        self.assertTrue(os.path.isfile(sweep.get_model_path(2)))
+
+        # Only the new number of topics is trained. A saved model without a
+        # row is scored without training it again.
+        sweep = LdaSweep([2, 3, 4], self.dictionary, folder, self.labels,
+                         cpus=4, random_state=1, results_path=results_path)
+        self.assertEqual([4], sweep.get_pending())
+        results = sweep.run()
+        self.assertEqual([2, 3, 4], list(results["num_topics"]))
+        os.remove(results_path)
+        results = sweep.run()
+        self.assertEqual([2, 3, 4], list(results["num_topics"]))
+        self.assertTrue(results["seconds"].isna().all())
+
+        # Changing the dictionary makes every model out of date
+        self.dictionary.add_documents([["cybersecurity"]])
+        sweep = LdaSweep([2, 3], self.dictionary, folder, self.labels,
+                         cpus=2, random_state=1, results_path=results_path)
+        self.assertEqual([2, 3], sweep.get_pending())
+        self.assertFalse(os.path.isfile(sweep.get_model_path(2)))
+        sweep.run()
+        self.assertEqual(5, len(sweep.get_results(every=True)))
+
+    def test_run_fails(self):
+        """Tests that the results file is closed when training a model fails
+        """
+        folder = get_binary_corpus(self.json_corpus, self.labels,
+                                   os.path.join(self.folder, "lda-corpus-csr"))
+        sweep = LdaSweep([2, 3], self.dictionary, folder, self.labels, cpus=2,
+                         results_path=os.path.join(self.folder,
+                                                   "lda-sweep.csv"))
+        module = "ucla_topic_analysis.validation.sweep."
+        with patch(module + "ProcessPoolExecutor", ThreadPoolExecutor), \
+                patch(module + "train_model",
+                      side_effect=RuntimeError("failed")), \
+                patch(module + "CsvScoreWriter") as writer_class:
+            with self.assertRaises(RuntimeError):
+                sweep.run()
+        writer_class.return_value.close.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    main()
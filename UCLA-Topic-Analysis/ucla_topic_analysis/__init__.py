@@ -27,6 +27,103 @@ def get_workers():
     workers = get_config().get("TRAINING", "workers")
     return int(workers) if workers is not None and int(workers) > 0 else None
 
+def get_concurrency():
+    """This function returns the number of elements each pipeline stage is
+    allowed to process at the same time when building the corpus.
+
+    Returns:
+        int: The concurrency for each stage. Or None if the value is not set or
+        less than 1, in which case the stages run one element at a time.
+    """
+    concurrency = get_config().get("PIPELINE", "concurrency", fallback=None)
+    return (int(concurrency) if concurrency is not None and int(concurrency) > 0
+            else None)
+
+def get_chunk_size():
+    """This function returns the size of the chunks files are read in.
+
+    Returns:
+        int: The most characters (bytes when memory mapping) read from a file
+        at a time. Or None if the value is not set or less than 1, in which
+        case every file is read in one go.
+    """
+    chunk_size = get_config().get("PIPELINE", "chunk_size", fallback=None)
+    return (int(chunk_size) if chunk_size is not None and int(chunk_size) > 0
+            else None)
+
+def get_use_mmap():
+    """This function returns whether files are memory mapped when they are
+    read in chunks.
+
+    Returns:
+        bool: The value of `mmap` in the PIPELINE section. Defaults to False.
+    """
+    return get_config().getboolean("PIPELINE", "mmap", fallback=False)
+
+def get_corpus_format():
+    """This function returns the format to store the LDA corpus in.
+
+    Returns:
+        str: "json" for one JSON object per line or "binary" for a memory
+        mapped bag of words corpus. Defaults to "json".
+    """
+    corpus_format = get_config().get("TRAINING", "corpus_format",
+                                     fallback="json")
+    if corpus_format not in ("json", "binary"):
+        raise ValueError("'corpus_format' must be one of {'json', 'binary'}")
+    return corpus_format
+
+def get_dictionary_sharded():
+    """This function returns whether the dictionary should be built in shards
+    by worker processes.
+
+    Returns:
+        bool: The value of `sharded` in the DICTIONARY section. Defaults to
+        True.
+    """
+    return get_config().getboolean("DICTIONARY", "sharded", fallback=True)
+
+def get_dictionary_filter():
+    """This function returns the arguments for filtering rare and common words
+    out of the dictionary once it has been built.
+
+    Returns:
+        dict: The `no_below`, `no_above` and `keep_n` arguments for
+        `Dictionary.filter_extremes` set in the DICTIONARY section. The
+        dictionary should not be filtered if this is empty.
+    """
+    config = get_config()
+    options = {}
+    for key, convert in (("no_below", int), ("no_above", float),
+                         ("keep_n", int)):
+        value = config.get("DICTIONARY", key, fallback=None)
+        if value is not None:
+            options[key] = convert(value)
+    return options
+
+def get_output_format():
+    """This function returns the format to write score files in.
+
+    Returns:
+        str: "csv" or "parquet". Defaults to "csv".
+    """
+    output_format = get_config().get("OUTPUT", "format", fallback="csv")
+    if output_format not in ("csv", "parquet"):
+        raise ValueError("'format' must be one of {'csv', 'parquet'}")
+    return output_format
+
+def get_output_layout():
+    """This function returns the layout of the tf-idf score file.
+
+    Returns:
+        str: "wide" for one column per topic or "long" for one row per
+        sentence and topic with a score. Defaults to "wide".
+    """
+    layout = get_config().get("OUTPUT", "layout", fallback="wide")
+    if layout not in ("wide", "long"):
+        raise ValueError("'layout' must be one of {'wide', 'long'}")
+    return layout
+
 def get_data_folder():
     """
     This function returns the path to the folder containing the financial
@@ -52,21 +149,16 @@ def get_filings_folder():
 def get_file_list():
     """
     This function is used for getting the path to the pdfs in the financial
-    folder
+    folder. The listing is cached in a manifest and shared by every caller, so
+    only folders that changed are listed again. See
+    `ucla_topic_analysis.data.discovery`.
 
     Returns:
         list: A list of absolute paths for each file in DATA_FOLDER
         and its subfolders
     """
-    data_folder = get_data_folder()
-
-    file_list = []
-    for dir_path, _dir_name, file_names in os.walk(data_folder):
-        for file_name in file_names:
-            if file_name[-4:] == ".txt":
-                abs_path = os.path.join(dir_path, file_name)
-                file_list.append(abs_path)
-    return file_list
+    from ucla_topic_analysis.data.discovery import get_discovery
+    return get_discovery().get_file_list()
 
 def log_async_time(func):
     """A decorator for logging the time it took for an async function to execute
@@ -1,6 +1,7 @@
 """This module contains shared functions that are needed during data processing.
 """
 import os
+import re
 
 
 MODULE_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -21,3 +22,17 @@ def get_score_file_path(file_name):
         lda-num-topics.model
     """
     return os.path.normpath(os.path.join(SCORE_FOLDER_PATH, file_name))
+
+def parse_filing_path(path):
+    """Gets the ticker and filing date from the path to a filing. Paths are of
+    the form sec_edgar_filings/TICKER/10-K/DATE... and may use either path
+    separator.
+
+    Args:
+        path (str): The path to the filing relative to the data folder
+
+    Returns:
+        (str, str): The ticker and the filing date
+    """
+    parts = re.split(r"[\\/]", path)
+    return parts[1], parts[-1][:10]
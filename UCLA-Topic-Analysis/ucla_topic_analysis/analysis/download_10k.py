@@ -1,14 +1,16 @@
-import time
-import os
-from sec_edgar_downloader import Downloader
-from ucla_topic_analysis import get_filings_folder
-from ucla_topic_analysis.data.coroutines import print_progress
+import asyncio
+from ucla_topic_analysis.analysis.downloader import FilingDownloader
 
 def download(tickers):
-    path = get_filings_folder()
-    dl = Downloader(path)
-    n = len(tickers)
-    for i in range(n):
-        print_progress(i, n)    
-        if os.path.exists('../Filings/sec_edgar_filings/' + tickers[i]) == False:
-            dl.get_10k_filings(tickers[i])
\ No newline at end of file
+    """Downloads the 10-K filings for the tickers into the filings folder.
+    Tickers that have already been downloaded are skipped. See
+    `FilingDownloader.from_config` for the settings.
+
+    Args:
+        tickers (:obj:`list` of :obj:`str`): The tickers to download
+
+    Returns:
+        :obj:`dict`: The tickers that were "downloaded", "skipped" or "failed"
+    """
+    downloader = FilingDownloader.from_config()
+    return asyncio.run(downloader.download(list(tickers)))
@@ -0,0 +1,559 @@
+"""Contains an asynchronous downloader for 10-K filings. Tickers are downloaded
+by a pool of workers that share a rate limit. Failed tickers are retried with
+exponential backoff and finished tickers are written to a journal so an
+interrupted download carries on where it stopped.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import functools
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from ucla_topic_analysis import get_config, get_filings_folder
+from ucla_topic_analysis.data.coroutines import print_progress
+
+# Holds the function each thread started by `run_throttled` calls before a
+# request
+_THROTTLE = threading.local()
+
+
+def get_ticker_folder(folder, ticker):
+    """Gets the folder the filings for a ticker are saved in. This is the
+    layout used by sec_edgar_downloader.
+
+    Args:
+        folder (str): The filings folder
+        ticker (str): The ticker
+
+    Returns:
+        str: The path to the ticker's folder
+    """
+    return os.path.join(folder, "sec_edgar_filings", ticker)
+
+
+class TokenBucket:
+    """Limits the rate of requests. Each request takes a token. Tokens are
+    added at `rate` per second up to `capacity`, so short bursts are allowed
+    but the average rate never goes over `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """Initialises the bucket full
+
+        Args:
+            rate (float): The number of tokens added per second
+            capacity (float): The most tokens the bucket can hold. Defaults to
+                `rate`.
+        """
+        if rate <= 0:
+            raise ValueError("'rate' must be greater than 0")
+        self._rate = rate
+        self._capacity = capacity or rate
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        """Waits until a token is available and takes it
+        """
+        # Created here so the bucket is not tied to the loop it was made in
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity,
+                    self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+def throttle_requests(session):
+    """Wraps the `request` method of a session, like a `requests.Session`, so
+    requests it makes for a function run with `run_throttled` wait for the
+    rate limiter. Other sessions and requests made in other threads are not
+    affected. Wrapping a session more than once has no further effect.
+
+    Args:
+        session (:obj:`requests.Session`): The session
+    """
+    request = session.request
+    if getattr(request, "throttled", False):
+        return
+
+    @functools.wraps(request)
+    def throttled_request(*args, **kwargs):
+        acquire = getattr(_THROTTLE, "acquire", None)
+        if acquire is not None:
+            acquire()
+        return request(*args, **kwargs)
+
+    throttled_request.throttled = True
+    session.request = throttled_request
+
+
+class SessionProxy:
+    """Stands in for the `requests` module in the modules of a library so the
+    requests it makes with functions like `requests.get` are sent through one
+    session. Everything else is looked up on the module.
+    """
+
+    METHODS = ("request", "get", "options", "head", "post", "put", "patch",
+               "delete")
+
+    def __init__(self, module, session):
+        """Initialises the proxy
+
+        Args:
+            module (module): The `requests` module
+            session (:obj:`requests.Session`): The session
+        """
+        self.module = module
+        self.session = session
+
+    def __getattr__(self, name):
+        if name in self.METHODS:
+            return getattr(self.session, name)
+        return getattr(self.module, name)
+
+
+def use_session(package, session):
+    """Sends the requests the modules of a package make with the functions of
+    the `requests` module through a session. Only modules that have been
+    imported are changed.
+
+    Args:
+        package (str): The name of the package
+        session (:obj:`requests.Session`): The session
+    """
+    for name, module in list(sys.modules.items()):
+        if name != package and not name.startswith(package + "."):
+            continue
+        library = getattr(module, "requests", None)
+        if isinstance(library, SessionProxy):
+            library = library.module
+        if getattr(library, "__name__", None) == "requests":
+            module.requests = SessionProxy(library, session)
+
+
+async def run_throttled(rate_limiter, function, *args):
+    """Runs a blocking function in a thread. Each request it makes through a
+    session wrapped by `throttle_requests` takes a token from the rate limiter
+    first.
+
+    Args:
+        rate_limiter (:obj:`TokenBucket`): The rate limiter
+        function (function): The function to run
+        *args: The arguments for the function
+
+    Returns:
+        The result of the function
+    """
+    loop = asyncio.get_running_loop()
+
+    def acquire():
+        asyncio.run_coroutine_threadsafe(rate_limiter.acquire(), loop).result()
+
+    def run():
+        _THROTTLE.acquire = acquire
+        try:
+            return function(*args)
+        finally:
+            _THROTTLE.acquire = None
+
+    return await loop.run_in_executor(None, run)
+
+
+class DownloadJournal:
+    """Records the result of each ticker in a file with one JSON object per
+    line. Lines are only ever appended, so an interrupted write can at most
+    lose the last ticker.
+    """
+
+    def __init__(self, file_path):
+        """Loads the journal
+
+        Args:
+            file_path (str): The path to the journal. If the file does not
+                exist the journal starts empty.
+        """
+        self._file_path = file_path
+        self._entries = {}
+        if os.path.isfile(file_path):
+            with open(file_path, "r", encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by an interrupted write
+                        continue
+                    self._entries[entry["ticker"]] = entry
+
+    def is_done(self, ticker):
+        """
+        Returns:
+            bool: True if the ticker has been downloaded
+        """
+        entry = self._entries.get(ticker)
+        return entry is not None and entry["status"] == "done"
+
+    def get(self, ticker):
+        """
+        Returns:
+            :obj:`dict`: The last entry for the ticker or None
+        """
+        return self._entries.get(ticker)
+
+    def record(self, ticker, status, attempts, error=None):
+        """Adds an entry for a ticker
+
+        Args:
+            ticker (str): The ticker
+            status (str): "started", "done" or "failed"
+            attempts (int): The number of attempts made
+            error (str): The last error if the ticker failed
+        """
+        entry = {"ticker": ticker, "status": status, "attempts": attempts,
+                 "error": error, "time": time.time()}
+        self._entries[ticker] = entry
+        directory = os.path.dirname(self._file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._file_path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(entry))
+            journal_file.write("\n")
+
+
+class Fetcher:
+    """Base class for fetchers. A fetcher downloads the filings for one ticker
+    into the filings folder.
+    """
+
+    def __init__(self, folder):
+        """Initialises the fetcher
+
+        Args:
+            folder (str): The filings folder
+        """
+        self.folder = folder
+
+    async def fetch(self, ticker, rate_limiter):
+        """Downloads the filings for a ticker. Sub classes must implement this.
+
+        Args:
+            ticker (str): The ticker
+            rate_limiter (:obj:`TokenBucket`): Must be acquired before each
+                request
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def is_retryable(error):
+        """Checks whether a failed fetch should be tried again
+
+        Args:
+            error (:obj:`Exception`): The error the fetch raised
+
+        Returns:
+            bool: True for connection errors, timeouts, too many requests and
+            server errors. False for other errors, like a ticker that does not
+            exist.
+        """
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code == 429 or error.code >= 500
+        # requests is only imported by fetchers that use it
+        requests = sys.modules.get("requests")
+        if requests is not None and isinstance(error,
+                                               requests.RequestException):
+            if isinstance(error, requests.HTTPError):
+                response = getattr(error, "response", None)
+                status = getattr(response, "status_code", None)
+                return status is not None and (status == 429 or status >= 500)
+            return isinstance(error,
+                              (requests.ConnectionError, requests.Timeout))
+        return isinstance(error, (ConnectionError, TimeoutError,
+                                  socket.timeout, urllib.error.URLError))
+
+
+class EdgarFetcher(Fetcher):
+    """Downloads filings from EDGAR with sec_edgar_downloader. The library
+    makes several requests for each ticker with `requests`, so they are sent
+    through a session of the fetcher's own that is wrapped with
+    `throttle_requests` and every one of them takes a token from the rate
+    limiter. Other sessions in the process are not affected.
+    """
+
+    def __init__(self, folder, filing_type="10-K"):
+        """Initialises the fetcher
+
+        Args:
+            folder (str): The filings folder
+            filing_type (str): The type of filing to download. Defaults to
+                10-K.
+        """
+        super().__init__(folder)
+        import requests
+        from sec_edgar_downloader import Downloader
+        self._session = requests.Session()
+        throttle_requests(self._session)
+        use_session("sec_edgar_downloader", self._session)
+        self._downloader = Downloader(folder)
+        self._filing_type = filing_type
+
+    def _download(self, ticker):
+        """Downloads the filings with the blocking library call
+
+        Args:
+            ticker (str): The ticker
+        """
+        if self._filing_type == "10-K" and hasattr(self._downloader,
+                                                   "get_10k_filings"):
+            self._downloader.get_10k_filings(ticker)
+        else:
+            self._downloader.get(self._filing_type, ticker)
+
+    async def fetch(self, ticker, rate_limiter):
+        """Downloads the filings for a ticker in a thread
+
+        Args:
+            ticker (str): The ticker
+            rate_limiter (:obj:`TokenBucket`): The shared rate limiter. It is
+                acquired before each request.
+        """
+        await run_throttled(rate_limiter, self._download, ticker)
+
+
+class UrlFetcher(Fetcher):
+    """Downloads filings from a server that returns the filings for a ticker
+    as a JSON object mapping file names to the text of each filing. This is
+    used with mirrors of EDGAR and with stub servers in tests.
+    """
+
+    def __init__(self, folder, url_template, timeout=60):
+        """Initialises the fetcher
+
+        Args:
+            folder (str): The filings folder
+            url_template (str): The URL for a ticker with "{ticker}" where the
+                ticker goes
+            timeout (float): The number of seconds to wait for a response.
+                Defaults to 60.
+        """
+        super().__init__(folder)
+        self._url_template = url_template
+        self._timeout = timeout
+
+    def _get(self, ticker):
+        """Requests the filings for a ticker
+
+        Args:
+            ticker (str): The ticker
+
+        Returns:
+            :obj:`dict`: The text of each filing by file name
+        """
+        url = self._url_template.format(ticker=urllib.parse.quote(ticker))
+        with urllib.request.urlopen(url, timeout=self._timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def _save(self, ticker, filings):
+        """Saves the filings. Each file is written in one step so an
+        interrupted download never leaves half a filing behind.
+
+        Args:
+            ticker (str): The ticker
+            filings (:obj:`dict`): The text of each filing by file name
+        """
+        folder = os.path.join(get_ticker_folder(self.folder, ticker), "10-K")
+        os.makedirs(folder, exist_ok=True)
+        for file_name, text in filings.items():
+            file_path = os.path.join(folder, os.path.basename(file_name))
+            with open(file_path + ".part", "w", encoding="utf-8") as data_file:
+                data_file.write(text)
+            os.replace(file_path + ".part", file_path)
+
+    async def fetch(self, ticker, rate_limiter):
+        """Downloads and saves the filings for a ticker
+
+        Args:
+            ticker (str): The ticker
+            rate_limiter (:obj:`TokenBucket`): The shared rate limiter
+        """
+        await rate_limiter.acquire()
+        loop = asyncio.get_running_loop()
+        filings = await loop.run_in_executor(None, self._get, ticker)
+        await loop.run_in_executor(None, self._save, ticker, filings)
+
+
+class FilingDownloader:
+    """Downloads the filings for many tickers at once.
+
+    Tickers that are done in the journal or that already have a folder in the
+    filings folder are skipped. Each failed ticker is retried with exponential
+    backoff and recorded as failed after `retries` retries. Failed tickers are
+    tried again the next time the downloader runs.
+    """
+
+    def __init__(self, fetcher, journal_path=None, concurrency=4, rate=10,
+                 retries=5, backoff=1, max_backoff=300):
+        """Initialises the downloader
+
+        Args:
+            fetcher (:obj:`Fetcher`): Downloads the filings for a ticker
+            journal_path (str): The path to the journal. Defaults to
+                download-journal.jsonl in the filings folder.
+            concurrency (int): The number of tickers to download at once.
+                Defaults to 4.
+            rate (float): The most requests per second. Defaults to 10, the
+                SEC's limit.
+            retries (int): The number of times to retry a ticker. Defaults to
+                5.
+            backoff (float): The number of seconds to wait before the first
+                retry. The wait doubles with each retry. Defaults to 1.
+            max_backoff (float): The longest wait between retries. Defaults to
+                300.
+        """
+        if concurrency < 1:
+            raise ValueError("'concurrency' must be greater than 0")
+        self._fetcher = fetcher
+        self._journal = DownloadJournal(
+            journal_path or
+            os.path.join(fetcher.folder, "download-journal.jsonl"))
+        self._concurrency = concurrency
+        self._rate_limiter = TokenBucket(rate)
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+
+    @classmethod
+    def from_config(cls, fetcher=None):
+        """Makes a downloader with the settings in the DOWNLOAD section of the
+        config: `concurrency`, `rate`, `retries`, `backoff` and `url`. If
+        `url` is set filings are downloaded from it with a `UrlFetcher`,
+        otherwise from EDGAR.
+
+        Args:
+            fetcher (:obj:`Fetcher`): The fetcher to use instead of the one
+                from the config
+
+        Returns:
+            :obj:`FilingDownloader`: The downloader
+        """
+        config = get_config()
+        if fetcher is None:
+            url = config.get("DOWNLOAD", "url", fallback=None)
+            folder = get_filings_folder()
+            fetcher = UrlFetcher(folder, url) if url else EdgarFetcher(folder)
+        return cls(fetcher,
+                   concurrency=config.getint("DOWNLOAD", "concurrency",
+                                             fallback=4),
+                   rate=config.getfloat("DOWNLOAD", "rate", fallback=10),
+                   retries=config.getint("DOWNLOAD", "retries", fallback=5),
+                   backoff=config.getfloat("DOWNLOAD", "backoff", fallback=1))
+
+    def is_downloaded(self, ticker):
+        """
+        Returns:
+            bool: True if the ticker does not need to be downloaded. Tickers
+            that are not in the journal are done if they have a folder, since
+            they were downloaded before the journal was kept.
+        """
+        entry = self._journal.get(ticker)
+        if entry is not None:
+            return entry["status"] == "done"
+        return os.path.exists(get_ticker_folder(self._fetcher.folder, ticker))
+
+    def get_delay(self, attempt):
+        """Gets the wait before retrying
+
+        Args:
+            attempt (int): The number of attempts made so far
+
+        Returns:
+            float: The number of seconds to wait
+        """
+        delay = min(self._max_backoff, self._backoff * 2 ** (attempt - 1))
+        # Spread retries out so workers do not all retry at once
+        return delay * random.uniform(1, 1.25)
+
+    async def download_ticker(self, ticker):
+        """Downloads a ticker, retrying if it fails
+
+        Args:
+            ticker (str): The ticker
+
+        Returns:
+            bool: True if the ticker was downloaded
+        """
+        # Marks the ticker as unfinished in case the download is interrupted
+        self._journal.record(ticker, "started", 0)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self._fetcher.fetch(ticker, self._rate_limiter)
+            except Exception as error:  # checked by is_retryable
+                if (not self._fetcher.is_retryable(error) or
+                        attempt > self._retries):
+                    self._journal.record(ticker, "failed", attempt,
+                                         error=repr(error))
+                    return False
+                await asyncio.sleep(self.get_delay(attempt))
+                continue
+            self._journal.record(ticker, "done", attempt)
+            return True
+
+    async def download(self, tickers):
+        """Downloads the filings for the tickers
+
+        Args:
+            tickers (:obj:`list` of :obj:`str`): The tickers
+
+        Returns:
+            :obj:`dict`: The tickers that were "downloaded", "skipped" or
+            "failed"
+        """
+        result = {"downloaded": [], "skipped": [], "failed": []}
+        queue = asyncio.Queue()
+        for ticker in dict.fromkeys(tickers):
+            if self.is_downloaded(ticker):
+                result["skipped"].append(ticker)
+            else:
+                queue.put_nowait(ticker)
+        total = queue.qsize()
+        if not total:
+            return result
+
+        async def worker():
+            while True:
+                try:
+                    ticker = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if await self.download_ticker(ticker):
+                    result["downloaded"].append(ticker)
+                else:
+                    result["failed"].append(ticker)
+                print_progress(len(result["downloaded"]) +
+                               len(result["failed"]), total)
+
+        workers = [asyncio.ensure_future(worker())
+                   for _ in range(min(self._concurrency, total))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        print("")
+        return result
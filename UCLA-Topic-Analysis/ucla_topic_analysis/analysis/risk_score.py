@@ -1,24 +1,155 @@
 import time
 import os
-import re
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from gensim.models import LdaModel
 from gensim.corpora import Dictionary
 from ucla_topic_analysis.analysis import get_score_file_path
+from ucla_topic_analysis.analysis import parse_filing_path
+from ucla_topic_analysis.analysis.score_writer import get_score_writer
+from ucla_topic_analysis.analysis.token_classifier import TokenClassifier
 from ucla_topic_analysis.data.pipeline import Pipeline
-from ucla_topic_analysis import get_file_list
+from ucla_topic_analysis import get_file_list, get_data_folder, get_workers
 from ucla_topic_analysis.data.coroutines import print_progress
-from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
-from ucla_topic_analysis.data.coroutines.sentence_tokeniser import SentencePipeline
-from ucla_topic_analysis.data.coroutines.words_tokeniser import WordPipeline
-from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
+from ucla_topic_analysis.data.coroutines.preprocess import PreprocessPipeline
+
+# The dictionary, model, word classifier and preprocessing used by a worker
+# process, loaded once when the worker starts.
+_WORKER = {}
+
+def get_topic_distributions(model, bows):
+    """Infers the topic distribution of many documents in one call to the model
+
+    Args:
+        model (:obj:`gensim.models.LdaModel`): The LDA model
+        bows (:obj:`list` of :obj:`list` of :obj:`(int, int)`): The documents
+            in bag of words form
+
+    Returns:
+        :obj:`numpy.ndarray`: A matrix with the probability of each topic
+        (columns) for each document (rows). These are the same probabilities
+        `model[bow]` gives before dropping the small ones.
+    """
+    if not bows:
+        return np.zeros((0, model.num_topics))
+    gamma, _ = model.inference(bows)
+    return gamma / gamma.sum(axis=1, keepdims=True)
+
+def get_topic_ranks(distributions, topic_id, minimum_probability):
+    """Finds the rank of a topic in each document. This is the position the
+    topic would have in `model[bow]` sorted by descending probability.
+
+    Args:
+        distributions (:obj:`numpy.ndarray`): The topic distribution of each
+            document from `get_topic_distributions`
+        topic_id (int): The topic to rank
+        minimum_probability (float): Topics with a lower probability are left
+            out like `model[bow]` does
+
+    Returns:
+        :obj:`numpy.ndarray`: The rank of the topic in each document starting
+        at 1, or 0 if the topic's probability is below the minimum.
+    """
+    probabilities = distributions[:, topic_id, np.newaxis]
+    # Topics with the same probability keep the order of their ids
+    ranks = (np.count_nonzero(distributions > probabilities, axis=1) +
+             np.count_nonzero(distributions[:, :topic_id] == probabilities,
+                              axis=1) + 1)
+    ranks[probabilities[:, 0] < minimum_probability] = 0
+    return ranks
+
+def _init_worker():
+    """Loads the dictionary, model and preprocessing in a worker process
+    """
+    dictionary, model = RiskScorePipeline.load_model()
+    preprocess = PreprocessPipeline()
+    preprocess.setup()
+    _WORKER.update(dictionary=dictionary, model=model, preprocess=preprocess,
+                   classifier=TokenClassifier.from_config(dictionary))
+
+def _score_chunk(file_paths):
+    """Scores some of the filings in a worker process
+
+    Args:
+        file_paths (:obj:`list` of :obj:`str`): The absolute paths to the
+            filings
+
+    Returns:
+        :obj:`pandas.DataFrame`: The scores with one row for each filing in
+        the same order as the paths
+    """
+    data_folder = get_data_folder()
+    rows = []
+    for file_path in file_paths:
+        rows.append(RiskScorePipeline.score_filing(
+            os.path.relpath(file_path, data_folder),
+            _WORKER["preprocess"].iter_file(file_path),
+            _WORKER["dictionary"], _WORKER["model"], _WORKER["classifier"]))
+    return pd.DataFrame(rows, columns=RiskScorePipeline.COLUMNS)
 
 class RiskScorePipeline(Pipeline):
     """Pipeline for calculating a risk score
+
+    The filings are scored in chunks by worker processes. The scores for each
+    chunk are saved as soon as it is done, so an interrupted run carries on
+    from the chunks that are left.
+
+    Risk and uncertain words are counted with a `TokenClassifier` using the
+    keywords in the RISK section of the config.
     """
-    RISK_WORD = re.compile('.*risk.*')
-    UNCERTAIN_WORD = re.compile('.*uncertain.*')
+
+    # The id of the risk topic in the LDA model
+    RISK_TOPIC = 15
+
+    # The paths to the dictionary and LDA model used for scoring
+    DICTIONARY_PATH = 'ucla_topic_analysis/data/training/dictionary.gensim'
+    MODEL_PATH = 'ucla_topic_analysis/data/training/lda-50.model'
+
+    # The number of filings scored by a worker at a time
+    CHUNK_SIZE = 100
+
+    # The seed for the model's random state. It is reset for each filing so
+    # a filing gets the same scores however the filings are split up.
+    SEED = 0
+
+    # The columns of the score file
+    COLUMNS = [
+        'ticker',
+        'filing dates',
+        'total number of sentences',
+        'total number of risk sentences',
+        'score rank 1',
+        'score rank 2',
+        'score rank 3',
+        'score rank 4',
+        'average of risk score',
+        'average of ranks',
+        'total number of risk word',
+        'total number of uncertain word'
+    ]
+
+    # The type of each column in a Parquet score file. The averages are floats
+    # even for filings without risk sentences, where they are 0.
+    COLUMN_TYPES = {
+        'ticker': 'string',
+        'filing dates': 'string',
+        'total number of sentences': 'int64',
+        'total number of risk sentences': 'int64',
+        'score rank 1': 'int64',
+        'score rank 2': 'int64',
+        'score rank 3': 'int64',
+        'score rank 4': 'int64',
+        'average of risk score': 'float64',
+        'average of ranks': 'float64',
+        'total number of risk word': 'int64',
+        'total number of uncertain word': 'int64'
+    }
 
     def __init__(self, *args, **kwargs):
         """Loads a tfidf csv file for updating
@@ -40,120 +171,184 @@ class RiskScorePipeline(Pipeline):
         Returns:
             An iterable containing lists of sentences
         """
-        # Build the pipeline
-        files = ReadFilePipeline.get_input_stream()
-        file_stream = ReadFilePipeline(
-            input_stream=files, schema=schema).output_stream()
-        sent_stream = SentencePipeline(
-            input_stream=file_stream).output_stream()
-        word_stream = WordPipeline(input_stream=sent_stream).output_stream()
-        return LemmaPipeline(input_stream=word_stream).output_stream()
+        return PreprocessPipeline.get_input_stream(schema)
 
-    @staticmethod
-    def load_model():
+    @classmethod
+    def load_model(cls):
         """This function loads the LDA dictionary and model 
 
         Returns:
             a gensim dictionary and LDA model
         """
-        dictionary = Dictionary.load('ucla_topic_analysis/data/training/dictionary.gensim')
-        model = LdaModel.load('ucla_topic_analysis/data/training/lda-50.model')
+        dictionary = Dictionary.load(cls.DICTIONARY_PATH)
+        model = LdaModel.load(cls.MODEL_PATH)
         return dictionary, model
 
+    @classmethod
+    def score_filing(cls, path, chunks, dictionary, model, classifier):
+        """Calculates the risk scores for a filing. The sentences are scored
+        one chunk at a time and only running totals are kept, so a large
+        filing is never held in memory as a whole.
+
+        Args:
+            path (str): The path to the filing relative to the data folder
+            chunks: An iterable with the preprocessed sentences of each chunk
+                of the filing. See `PreprocessPipeline.iter_file`.
+            dictionary (:obj:`gensim.corpora.Dictionary`): The LDA dictionary
+            model (:obj:`gensim.models.LdaModel`): The LDA model
+            classifier (:obj:`TokenClassifier`): The classifier for counting
+                risk and uncertain words
+
+        Returns:
+            :obj:`dict`: The value for each of the `COLUMNS`
+        """
+        ticker, filing_date = parse_filing_path(path)
+        model.random_state = np.random.RandomState(cls.SEED)
+        # The smallest probability `model[bow]` keeps
+        minimum_probability = max(model.minimum_probability, 1e-8)
+        total_sent = 0
+        risk_num = 0
+        rank_counts = np.zeros(5, dtype=np.int64)
+        score_sum = 0.0
+        rank_sum = 0
+        risk_word = 0
+        uncertain_word = 0
+        for sentences in chunks:
+            # Infer the topics of every sentence in the chunk at once
+            bows = []
+            missing = Counter()
+            for tokens in sentences:
+                bow, sentence_missing = dictionary.doc2bow(
+                    tokens, return_missing=True)
+                bows.append(bow)
+                missing.update(sentence_missing)
+            distributions = get_topic_distributions(model, bows)
+            ranks = get_topic_ranks(distributions, cls.RISK_TOPIC,
+                                    minimum_probability)
+            is_risk = ranks > 0
+            ranks = ranks[is_risk]
+            total_sent += len(bows)
+            risk_num += len(ranks)
+            rank_counts += np.bincount(ranks, minlength=5)[:5]
+            score_sum += float(distributions[is_risk, cls.RISK_TOPIC].sum())
+            rank_sum += int(ranks.sum())
+            chunk_risk, chunk_uncertain = classifier.count(bows, missing)
+            risk_word += chunk_risk
+            uncertain_word += chunk_uncertain
+
+        return {
+            'ticker': ticker,
+            'filing dates': filing_date,
+            'total number of sentences': total_sent,
+            'total number of risk sentences': risk_num,
+            'score rank 1': int(rank_counts[1]),
+            'score rank 2': int(rank_counts[2]),
+            'score rank 3': int(rank_counts[3]),
+            'score rank 4': int(rank_counts[4]),
+            'average of risk score': score_sum / risk_num if risk_num else 0,
+            'average of ranks': rank_sum / risk_num if risk_num else 0,
+            'total number of risk word': risk_word,
+            'total number of uncertain word': uncertain_word
+        }
+
+    @classmethod
+    def get_part_path(cls, folder, index, file_paths):
+        """Gets the path to the saved scores for a chunk of filings. The name
+        changes if the filings in the chunk, the filings' files or the model
+        change, so out of date scores are never used.
+
+        Args:
+            folder (str): The folder holding the saved scores
+            index (int): The position of the chunk
+            file_paths (:obj:`list` of :obj:`str`): The filings in the chunk
+
+        Returns:
+            str: The path to the file
+        """
+        digest = hashlib.sha1()
+        for file_path in [cls.DICTIONARY_PATH, cls.MODEL_PATH] + file_paths:
+            stat = os.stat(file_path)
+            digest.update("{0}\0{1}\0{2}\0".format(
+                file_path, stat.st_size, stat.st_mtime).encode("utf-8"))
+        file_name = "{0:06d}-{1}.pkl".format(index, digest.hexdigest()[:16])
+        return os.path.join(folder, file_name)
+
+    @staticmethod
+    def save_part(scores, file_path):
+        """Saves the scores for a chunk in one step so an interrupted save is
+        never mistaken for a finished chunk.
+
+        Args:
+            scores (:obj:`pandas.DataFrame`): The scores for the chunk
+            file_path (str): The path to save the scores to
+        """
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(file_path))
+        os.close(file_descriptor)
+        try:
+            scores.to_pickle(temp_path)
+            os.replace(temp_path, file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
     async def calc_risk(self):
-        """This function calculates a risk score
+        """This function calculates a risk score for every filing and saves
+        the scores to risk_score.csv, or the risk_score Parquet dataset if the
+        output format is parquet.
         """
-        dictionary, model = self.load_model()
-        # for this model, risk topic id is 15
-        input_stream = self.get_input_stream()
-        # Train the dictionary
-        count = 1
-        total = len(get_file_list())
-        tickers = []
-        filing_dates = []
-        total_num_sent = []
-        total_risk_sent = []
-        total_risk_top1 = []
-        total_risk_top2 = []
-        total_risk_top3 = []
-        total_risk_top4 = []
-        total_risk_words = []
-        total_uncertain_words = []
-        weighted_risk_score = []
-        weighted_rank_score = []
-        async for data in input_stream:
-            list_of_tokenized_words = data['text']
-            path = data['path'].split('\\')
-            ticker = path[1]
-            filing_date = path[-1][:10]
-            total_sent = len(list_of_tokenized_words)
-            scores = []
-            ranks = []
-            risk_num = 0
-            risk_top1 = 0
-            risk_top2 = 0
-            risk_top3 = 0
-            risk_top4 = 0
-            risk_word = 0
-            uncertain_word = 0
-            for tokens in list_of_tokenized_words:
-                bow_vector = dictionary.doc2bow(tokens)
-                for idx, (topic_id, score) in enumerate(sorted(model[bow_vector], key=lambda tup: -1*tup[1])):
-                    if topic_id == 15:
-                        scores.append(score)
-                        ranks.append(idx + 1)
-                        risk_num = risk_num + 1
-                        if idx < 1:
-                            risk_top1 += 1
-                        elif idx < 2:
-                            risk_top2 += 1
-                        elif idx < 3:
-                            risk_top3 += 1
-                        elif idx < 4:
-                            risk_top4 += 1
-                for token in tokens:
-                    if re.match(self.RISK_WORD, token):
-                        risk_word += 1
-                    elif re.match(self.UNCERTAIN_WORD, token):
-                        uncertain_word += 1
-            tickers.append(ticker)
-            filing_dates.append(filing_date)
-            total_num_sent.append(total_sent)
-            total_risk_sent.append(risk_num)
-            total_risk_top1.append(risk_top1)
-            total_risk_top2.append(risk_top2)
-            total_risk_top3.append(risk_top3)
-            total_risk_top4.append(risk_top4)
-            total_risk_words.append(risk_word)
-            total_uncertain_words.append(uncertain_word)
-            if len(scores) > 0:
-                weighted_risk_score.append(np.mean(scores))
-                weighted_rank_score.append(np.mean(ranks))
-            else:
-                weighted_risk_score.append(0)
-                weighted_rank_score.append(0)
-            print_progress(count, total)
-            count += 1
-        print('')
-        
-        df = pd.DataFrame({
-            'ticker': tickers,
-            'filing dates': filing_dates,
-            'total number of sentences': total_num_sent,
-            'total number of risk sentences': total_risk_sent,
-            'score rank 1': total_risk_top1,
-            'score rank 2': total_risk_top2,
-            'score rank 3': total_risk_top3,
-            'score rank 4': total_risk_top4,
-            'average of risk score': weighted_risk_score,
-            'average of ranks': weighted_rank_score,
-            'total number of risk word': total_risk_words,
-            'total number of uncertain word': total_uncertain_words
-        })
-
-        file_name = "risk_score.csv"
-        file_path = get_score_file_path(file_name)
-        df.to_csv(file_path)
+        file_paths = sorted(get_file_list())
+        chunks = [file_paths[start:start + self.CHUNK_SIZE]
+                  for start in range(0, len(file_paths), self.CHUNK_SIZE)]
+        parts_folder = get_score_file_path("risk_score.parts")
+        os.makedirs(parts_folder, exist_ok=True)
+        part_paths = [self.get_part_path(parts_folder, index, chunk)
+                      for index, chunk in enumerate(chunks)]
+        remaining = [index for index, part_path in enumerate(part_paths)
+                     if not os.path.isfile(part_path)]
+        if len(remaining) < len(chunks):
+            print("Reusing scores for {0} of {1} chunks".format(
+                len(chunks) - len(remaining), len(chunks)))
+
+        if remaining:
+            workers = min(get_workers() or os.cpu_count() or 1, len(remaining))
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_worker) as executor:
+
+                async def score(index):
+                    scores = await loop.run_in_executor(
+                        executor, _score_chunk, chunks[index])
+                    self.save_part(scores, part_paths[index])
+
+                tasks = [asyncio.ensure_future(score(index))
+                         for index in remaining]
+                try:
+                    for count, task in enumerate(asyncio.as_completed(tasks), 1):
+                        await task
+                        print_progress(count, len(remaining))
+                finally:
+                    for task in tasks:
+                        task.cancel()
+            print('')
+
+        # Merge the chunks in the order of the filings
+        writer = get_score_writer(
+            "risk_score", date_column='filing dates', index=True,
+            schema=[(column, self.COLUMN_TYPES[column])
+                    for column in self.COLUMNS])
+        try:
+            if not part_paths:
+                writer.write(pd.DataFrame(columns=self.COLUMNS))
+            offset = 0
+            for part_path in part_paths:
+                df = pd.read_pickle(part_path)
+                df.index = pd.RangeIndex(offset, offset + len(df))
+                offset += len(df)
+                writer.write(df)
+        finally:
+            writer.close()
+        shutil.rmtree(parts_folder, ignore_errors=True)
 
 
     async def coroutine(self, data):
@@ -0,0 +1,212 @@
+"""Contains writers for saving scores to CSV or Parquet files
+"""
+import os
+import shutil
+from collections import OrderedDict
+
+from ucla_topic_analysis import get_output_format
+from ucla_topic_analysis.analysis import get_score_file_path
+from ucla_topic_analysis.analysis import parse_filing_path
+
+
+class CsvScoreWriter:
+    """Writes scores to a CSV file. Each call to `write` appends to the file.
+    """
+
+    def __init__(self, file_path, append=False, index=False):
+        """Opens the score file
+
+        Args:
+            file_path (str): The path to the CSV file
+            append (bool): If this is False (default) any existing file is
+                replaced. Otherwise rows are added to the end of it.
+            index (bool): Whether to write the row index. Defaults to False.
+        """
+        self.file_path = file_path
+        self._index = index
+        if not append and os.path.isfile(file_path):
+            os.remove(file_path)
+
+    def write(self, df):
+        """Appends rows to the file. The header is written if the file does not
+        exist yet.
+
+        Args:
+            df (:obj:`pandas.DataFrame`): The rows to write
+        """
+        header = not os.path.isfile(self.file_path)
+        with open(self.file_path, 'a', encoding='utf-8', newline='') as f:
+            df.to_csv(f, index=self._index, header=header)
+
+    def close(self):
+        """Nothing to do. Rows are written straight away.
+        """
+
+
+class ParquetScoreWriter:
+    """Writes scores to a Parquet dataset partitioned by ticker and year, e.g.
+    `cos_score/ticker=AAPL/year=2019/part-0.parquet`. Every call to `write`
+    adds a row group to the files of the partitions in the rows, so rows are
+    never held in memory for the whole run. The dataset can be loaded with
+    `pandas.read_parquet` on the folder.
+
+    Every file has the same schema, so the files of a dataset can be read
+    together. Pass the type of each column as `schema`, otherwise it is taken
+    from the first rows written and later rows must have the same types.
+
+    Requires pyarrow.
+    """
+
+    # The number of partition files to keep open at a time
+    MAX_OPEN_FILES = 64
+
+    # The columns the dataset is partitioned by. They are kept in the folder
+    # names rather than in the files.
+    PARTITION_COLUMNS = ("ticker", "year")
+
+    def __init__(self, folder, path_column=None, date_column=None,
+                 schema=None):
+        """Creates an empty dataset. Any existing dataset in the folder is
+        removed.
+
+        Args:
+            folder (str): The folder for the dataset
+            path_column (str): A column holding the path to the filing to get
+                the ticker and year from. If this is None the rows must have a
+                "ticker" column and a date column.
+            date_column (str): The column holding the filing date if
+                `path_column` is not set
+            schema (:obj:`list` of :obj:`(str, str)`): The name and type of
+                each column, e.g. `("score", "float64")`. Types are pyarrow
+                type names such as "string", "int64" or "float64". Columns
+                that are empty or hold integers in some rows are still written
+                with these types. The partition columns are left out of the
+                files. Defaults to the types of the first rows.
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing Parquet files requires pyarrow. Install "
+                              "it with `pip install pyarrow`.")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.folder = folder
+        self._path_column = path_column
+        self._date_column = date_column
+        self._schema = None
+        if schema is not None:
+            self._schema = pyarrow.schema([
+                (name, pyarrow.type_for_alias(type_name))
+                for name, type_name in schema
+                if name not in self.PARTITION_COLUMNS
+            ])
+        self._writers = OrderedDict()
+        self._parts = {}
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+    def _get_partitions(self, df):
+        """Gets the ticker and year of each row
+
+        Args:
+            df (:obj:`pandas.DataFrame`): The rows
+
+        Returns:
+            (:obj:`list` of :obj:`str`, :obj:`list` of :obj:`int`): The ticker
+            and year of each row
+        """
+        if self._path_column is not None:
+            parsed = [parse_filing_path(path) for path in df[self._path_column]]
+            tickers = [ticker for ticker, _date in parsed]
+            dates = [date for _ticker, date in parsed]
+        else:
+            tickers = list(df["ticker"])
+            dates = list(df[self._date_column])
+        return tickers, [int(date[:4]) for date in dates]
+
+    def _get_writer(self, ticker, year):
+        """Gets the open file for a partition. The least recently used file is
+        closed if too many are open, and a new part file is started if the
+        partition is written to again.
+
+        Args:
+            ticker (str): The ticker
+            year (int): The year
+
+        Returns:
+            :obj:`pyarrow.parquet.ParquetWriter`: The writer for the partition
+        """
+        key = (ticker, year)
+        writer = self._writers.get(key)
+        if writer is not None:
+            self._writers.move_to_end(key)
+            return writer
+        if len(self._writers) >= self.MAX_OPEN_FILES:
+            _key, oldest = self._writers.popitem(last=False)
+            oldest.close()
+        folder = os.path.join(self.folder, "ticker={0}".format(ticker),
+                              "year={0}".format(year))
+        os.makedirs(folder, exist_ok=True)
+        part = self._parts.get(key, 0)
+        self._parts[key] = part + 1
+        file_path = os.path.join(folder, "part-{0}.parquet".format(part))
+        writer = self._pq.ParquetWriter(file_path, self._schema)
+        self._writers[key] = writer
+        return writer
+
+    def write(self, df):
+        """Adds rows to the dataset
+
+        Args:
+            df (:obj:`pandas.DataFrame`): The rows to write
+        """
+        if not len(df):
+            return
+        tickers, years = self._get_partitions(df)
+        df = df.drop(columns=[column for column in self.PARTITION_COLUMNS
+                              if column in df.columns])
+        df = df.assign(ticker=tickers, year=years)
+        for (ticker, year), rows in df.groupby(["ticker", "year"], sort=False):
+            rows = rows.drop(columns=list(self.PARTITION_COLUMNS))
+            if self._schema is None:
+                self._schema = self._pa.Schema.from_pandas(
+                    rows, preserve_index=False)
+            table = self._pa.Table.from_pandas(rows, schema=self._schema,
+                                               preserve_index=False)
+            self._get_writer(ticker, year).write_table(table)
+
+    def close(self):
+        """Closes the open partition files
+        """
+        while self._writers:
+            _key, writer = self._writers.popitem()
+            writer.close()
+
+
+def get_score_writer(name, path_column=None, date_column=None, append=False,
+                     index=False, schema=None):
+    """Opens a writer for a score file in the format set in the OUTPUT
+    section of the config.
+
+    Args:
+        name (str): The name of the score file without an extension
+        path_column (str): The column holding the path to the filing. Used to
+            partition Parquet files.
+        date_column (str): The column holding the filing date if there is no
+            path column. Used to partition Parquet files.
+        append (bool): Whether to add to an existing CSV file. Parquet datasets
+            are always replaced.
+        index (bool): Whether to write the row index to a CSV file
+        schema (:obj:`list` of :obj:`(str, str)`): The name and type of each
+            column of a Parquet dataset. See `ParquetScoreWriter`.
+
+    Returns:
+        :obj:`CsvScoreWriter` or :obj:`ParquetScoreWriter`: The writer
+    """
+    if get_output_format() == "parquet":
+        return ParquetScoreWriter(get_score_file_path(name),
+                                  path_column=path_column,
+                                  date_column=date_column, schema=schema)
+    return CsvScoreWriter(get_score_file_path(name + ".csv"), append=append,
+                          index=index)
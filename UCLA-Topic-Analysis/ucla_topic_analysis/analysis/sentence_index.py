@@ -0,0 +1,378 @@
+"""Contains an inverted index of the TF-IDF vectors of every sentence for
+finding the sentences or filings most similar to any query.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ucla_topic_analysis.data import replace_folder, restore_folder
+
+
+def _load(folder, name, dtype):
+    """Memory maps an array in an index folder
+
+    Args:
+        folder (str): The index folder
+        name (str): The name of the file holding the array
+        dtype: The numpy data type of the array
+
+    Returns:
+        :obj:`numpy.ndarray`: The array. Empty arrays are not mapped since
+        numpy can not map empty files.
+    """
+    path = os.path.join(folder, name)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class SentenceIndexWriter:
+    """Writes a `SentenceIndex`. The sentence vectors are appended row by row
+    to flat files, and `close` turns them into an index one block at a time,
+    so the matrix is never held in memory.
+    """
+
+    # The number of entries of the matrix handled at a time by `close`
+    BLOCK_SIZE = 1 << 24
+
+    def __init__(self, folder):
+        """Starts a new index. Any index in the folder is replaced when the
+        writer is closed.
+
+        Args:
+            folder (str): The folder for the index
+        """
+        self.folder = folder
+        parent = os.path.dirname(os.path.abspath(folder))
+        os.makedirs(parent, exist_ok=True)
+        self._temp_folder = tempfile.mkdtemp(dir=parent)
+        # mkdtemp only lets the owner read the folder
+        os.chmod(self._temp_folder, 0o755)
+        self._files = {
+            name: open(os.path.join(self._temp_folder, name), "wb")
+            for name in ("rows-indices.bin", "rows-data.bin",
+                         "rows-lengths.bin", "filings.bin", "sentences.bin",
+                         "text.bin", "text_ends.bin")
+        }
+        self._paths = []
+        self._num_terms = None
+        self._num_rows = 0
+        self._text_end = 0
+
+    def add(self, paths, filings, matrix, offsets=None):
+        """Adds the sentences of some filings to the index. Sentences without
+        any words the model knows are left out.
+
+        A filing can be added one chunk at a time. A chunk with an offset
+        above 0 that has the same path as the filing added last is added to
+        that filing.
+
+        Args:
+            paths (:obj:`list` of :obj:`str`): The path to each filing
+            filings (:obj:`list` of :obj:`list` of :obj:`str`): The sentences
+                of each filing, or of a chunk of it
+            matrix (:obj:`scipy.sparse.csr_matrix`): The TF-IDF vector of every
+                sentence of the filings in order
+            offsets (:obj:`list` of :obj:`int`): The index in its filing of
+                the first sentence of each chunk. Defaults to 0 for every
+                filing.
+        """
+        if self._num_terms is None:
+            self._num_terms = matrix.shape[1]
+        elif matrix.shape[1] != self._num_terms:
+            raise ValueError("Every matrix must have the same number of "
+                             "columns")
+        if offsets is None:
+            offsets = [0] * len(paths)
+        ids = []
+        for path, offset in zip(paths, offsets):
+            if not (offset and self._paths and self._paths[-1] == path):
+                self._paths.append(path)
+            ids.append(len(self._paths) - 1)
+        lengths = np.array([len(filing) for filing in filings], dtype=np.int64)
+        filing_ids = np.repeat(np.array(ids, dtype=np.int32), lengths)
+        sentence_ids = (np.arange(lengths.sum()) +
+                        np.repeat(np.asarray(offsets, dtype=np.int64) -
+                                  (np.cumsum(lengths) - lengths), lengths))
+
+        row_lengths = np.diff(matrix.indptr)
+        keep = np.flatnonzero(row_lengths)
+        matrix = matrix[keep]
+        sentences = [sentence for filing in filings for sentence in filing]
+        text = [sentences[row].encode("utf-8") for row in keep]
+        text_ends = self._text_end + np.cumsum(
+            [len(sentence) for sentence in text], dtype=np.int64)
+        if len(text):
+            self._text_end = int(text_ends[-1])
+
+        files = self._files
+        matrix.indices.astype(np.int32).tofile(files["rows-indices.bin"])
+        matrix.data.astype(np.float32).tofile(files["rows-data.bin"])
+        row_lengths[keep].astype(np.int32).tofile(files["rows-lengths.bin"])
+        filing_ids[keep].tofile(files["filings.bin"])
+        sentence_ids[keep].astype(np.int32).tofile(files["sentences.bin"])
+        files["text.bin"].write(b"".join(text))
+        text_ends.tofile(files["text_ends.bin"])
+        self._num_rows += len(keep)
+
+    def _invert(self):
+        """Turns the rows written by `add` into the columns of an inverted
+        index. For each word `indptr.bin` holds where its entries start in
+        `indices.bin` (the rows with the word) and `data.bin` (its weights).
+        """
+        folder = self._temp_folder
+        num_terms = self._num_terms or 0
+        indices = _load(folder, "rows-indices.bin", np.int32)
+        data = _load(folder, "rows-data.bin", np.float32)
+        row_ends = np.cumsum(_load(folder, "rows-lengths.bin", np.int32),
+                             dtype=np.int64)
+
+        # Count the entries in each column
+        counts = np.zeros(num_terms, dtype=np.int64)
+        for start in range(0, len(indices), self.BLOCK_SIZE):
+            counts += np.bincount(indices[start:start + self.BLOCK_SIZE],
+                                  minlength=num_terms)
+        indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        indptr.tofile(os.path.join(folder, "indptr.bin"))
+
+        # Put each block of entries in its place in the columns. Blocks are
+        # done in order so the rows in each column stay sorted.
+        column_indices = np.memmap(os.path.join(folder, "indices.bin"),
+                                   dtype=np.int32, mode="w+",
+                                   shape=max(len(indices), 1))
+        column_data = np.memmap(os.path.join(folder, "data.bin"),
+                                dtype=np.float32, mode="w+",
+                                shape=max(len(indices), 1))
+        next_position = indptr[:-1].copy()
+        start = 0
+        while start < len(indices):
+            stop = min(start + self.BLOCK_SIZE, len(indices))
+            columns = indices[start:stop]
+            rows = np.searchsorted(row_ends, np.arange(start, stop),
+                                   side="right").astype(np.int32)
+            order = np.argsort(columns, kind="stable")
+            columns = columns[order]
+            unique, first, number = np.unique(columns, return_index=True,
+                                              return_counts=True)
+            positions = (next_position[columns] + np.arange(len(columns)) -
+                         np.repeat(first, number))
+            column_indices[positions] = rows[order]
+            column_data[positions] = data[start:stop][order]
+            next_position[unique] += number
+            start = stop
+        column_indices.flush()
+        column_data.flush()
+        del column_indices, column_data, indices, data
+        for name in ("indices.bin", "data.bin"):
+            # The memory map needed at least one entry
+            with open(os.path.join(folder, name), "r+b") as array_file:
+                array_file.truncate(len(row_ends) and int(row_ends[-1]) * 4)
+        for name in ("rows-indices.bin", "rows-data.bin", "rows-lengths.bin"):
+            os.remove(os.path.join(folder, name))
+
+    def close(self):
+        """Finishes the index and puts it in its folder
+        """
+        for index_file in self._files.values():
+            index_file.close()
+        try:
+            self._invert()
+            with open(os.path.join(self._temp_folder, "paths.json"), "w",
+                      encoding="utf-8") as paths_file:
+                json.dump(self._paths, paths_file)
+            with open(os.path.join(self._temp_folder, "meta.json"), "w",
+                      encoding="utf-8") as meta_file:
+                json.dump({
+                    "version": SentenceIndex.VERSION,
+                    "rows": self._num_rows,
+                    "terms": self._num_terms or 0
+                }, meta_file)
+        except Exception:
+            shutil.rmtree(self._temp_folder, ignore_errors=True)
+            raise
+        replace_folder(self._temp_folder, self.folder)
+
+
+class SentenceIndex:
+    """An inverted index of the TF-IDF vectors of sentences. For each word the
+    index holds the sentences that have the word and its weight in them, so a
+    query only reads the entries of its own words. The arrays are memory
+    mapped, so opening the index is quick and a query only reads the pages it
+    needs.
+
+    The sentence vectors have unit length, so a query's score for a sentence
+    is the cosine similarity of the query and the sentence. Queries are
+    passed through `preprocess` so they are made of the same lemmatised words
+    as the sentences, and then transformed with the model the index was built
+    with, e.g.::
+
+        index = SentenceIndex(folder, model, preprocess)
+        index.query("cybersecurity breaches", k=20)
+    """
+
+    # The version of the index format
+    VERSION = 1
+
+    def __init__(self, folder, model, preprocess=None):
+        """Opens an index
+
+        Args:
+            folder (str): The folder of the index
+            model: The TF-IDF model the index was built with. It must have a
+                `transform` method.
+            preprocess (function): A function that turns the text of a query
+                into the words of a sentence joined by spaces, the way the
+                sentences in the index were preprocessed. If this is None
+                (default) queries are used as they are.
+        """
+        restore_folder(folder)
+        with open(os.path.join(folder, "meta.json"), "r",
+                  encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        if meta["version"] != self.VERSION:
+            raise ValueError("Unsupported sentence index version {0}".format(
+                meta["version"]))
+        with open(os.path.join(folder, "paths.json"), "r",
+                  encoding="utf-8") as paths_file:
+            self._paths = np.array(json.load(paths_file), dtype=object)
+        self.folder = folder
+        self.model = model
+        self.preprocess = preprocess
+        self.num_terms = meta["terms"]
+        self._indptr = _load(folder, "indptr.bin", np.int64)
+        self._indices = _load(folder, "indices.bin", np.int32)
+        self._data = _load(folder, "data.bin", np.float32)
+        self._filings = _load(folder, "filings.bin", np.int32)
+        self._sentences = _load(folder, "sentences.bin", np.int32)
+        self._text_ends = _load(folder, "text_ends.bin", np.int64)
+        self._text = _load(folder, "text.bin", np.uint8)
+
+    @staticmethod
+    def exists(folder):
+        """
+        Args:
+            folder (str): The folder of an index
+
+        Returns:
+            bool: True if there is an index in the folder
+        """
+        restore_folder(folder)
+        return os.path.isfile(os.path.join(folder, "meta.json"))
+
+    def __len__(self):
+        """
+        Returns:
+            int: The number of sentences in the index
+        """
+        return len(self._filings)
+
+    def get_text(self, row):
+        """
+        Args:
+            row (int): A row of the index
+
+        Returns:
+            str: The sentence in the row
+        """
+        start = int(self._text_ends[row - 1]) if row else 0
+        return bytes(self._text[start:int(self._text_ends[row])]).decode(
+            "utf-8")
+
+    def get_scores(self, text):
+        """Gets the similarity of a query to every sentence that shares a word
+        with it
+
+        Args:
+            text (str): The query
+
+        Returns:
+            (:obj:`numpy.ndarray`, :obj:`numpy.ndarray`): The rows of the
+            sentences and their similarity to the query
+        """
+        if self.preprocess is not None:
+            text = self.preprocess(text)
+        query = self.model.transform([text])
+        if query.shape[1] != self.num_terms:
+            raise ValueError("The index was built with another TF-IDF model")
+        query = query.tocsr()
+        rows = []
+        weights = []
+        for term, weight in zip(query.indices, query.data):
+            start, stop = self._indptr[term], self._indptr[term + 1]
+            rows.append(self._indices[start:stop])
+            weights.append(self._data[start:stop] * weight)
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        rows, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(weights))
+
+    @staticmethod
+    def _top(scores, k):
+        """
+        Args:
+            scores (:obj:`numpy.ndarray`): Some scores
+            k (int): The number of scores to pick
+
+        Returns:
+            :obj:`numpy.ndarray`: The positions of the `k` highest scores from
+            highest to lowest
+        """
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def query(self, text, k=10):
+        """Finds the sentences most similar to a query
+
+        Args:
+            text (str): The query
+            k (int): The number of sentences to return. Defaults to 10.
+
+        Returns:
+            :obj:`pandas.DataFrame`: The path to the filing, the index of the
+            sentence in the filing, the sentence and the similarity of each
+            sentence, from most to least similar
+        """
+        rows, scores = self.get_scores(text)
+        top = self._top(scores, k)
+        rows = rows[top]
+        return pd.DataFrame({
+            '10k_path': self._paths[self._filings[rows]],
+            'sentence_index': self._sentences[rows],
+            'joined tokens': [self.get_text(row) for row in rows],
+            'score': scores[top]
+        })
+
+    def query_filings(self, text, k=10):
+        """Finds the filings with the sentences most similar to a query. A
+        filing's score is the similarity of its most similar sentence.
+
+        Args:
+            text (str): The query
+            k (int): The number of filings to return. Defaults to 10.
+
+        Returns:
+            :obj:`pandas.DataFrame`: The path to the filing, its score and the
+            index of its most similar sentence, from most to least similar
+        """
+        rows, scores = self.get_scores(text)
+        filings = self._filings[rows]
+        # Sort by filing, then by score so the best sentence comes first
+        order = np.lexsort((-scores, filings))
+        filings = filings[order]
+        first = np.flatnonzero(np.concatenate(
+            ([True], filings[1:] != filings[:-1]))) if len(filings) else order
+        best = order[first]
+        top = self._top(scores[best], k)
+        best = best[top]
+        return pd.DataFrame({
+            '10k_path': self._paths[self._filings[rows[best]]],
+            'sentence_index': self._sentences[rows[best]],
+            'score': scores[best]
+        })
@@ -1,23 +1,48 @@
 import time
 import os
-import pickle
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import linear_kernel
 from ucla_topic_analysis.data.pipeline import Pipeline
-from ucla_topic_analysis.data import get_training_file_path
 from ucla_topic_analysis.data.coroutines import print_progress
-from ucla_topic_analysis import get_file_list
+from ucla_topic_analysis import get_config, get_file_list, get_output_layout
 from ucla_topic_analysis.analysis import get_score_file_path
-from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
-from ucla_topic_analysis.data.coroutines.sentence_tokeniser import SentencePipeline
-from ucla_topic_analysis.data.coroutines.words_tokeniser import WordPipeline
-from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
-from ucla_topic_analysis.data.coroutines.sent_lemmatise import SentLemmaPipeline
+from ucla_topic_analysis.analysis.score_writer import get_score_writer
+from ucla_topic_analysis.analysis.sentence_index import SentenceIndex
+from ucla_topic_analysis.analysis.sentence_index import SentenceIndexWriter
+from ucla_topic_analysis.data.coroutines.preprocess import PreprocessPipeline
+from ucla_topic_analysis.data.coroutines.tf_idf import TFIDFPipeline
 
 class TFIDFScorePipeline(Pipeline):
     """Pipeline for calculating a tfidf score
+
+    Filings are scored in batches. The sentences of several filings are
+    transformed in one call and scored against every topic with one sparse
+    matrix product, until the batch holds `BATCH_CHARACTERS` characters of
+    sentences (or `score_batch_characters` in the TFIDF section of the config).
+    Rows for the score file are buffered and written `BUFFER_ROWS` at a time.
+    Files that are read in chunks are added to the batches one chunk at a
+    time, so a large filing is never held in memory as a whole.
+
+    The scores are written in the format set in the OUTPUT section of the
+    config. The "wide" layout has a column for every topic and the "long"
+    layout has a row for every sentence and topic with a score.
     """
+
+    # Cosine similarities at or below this are left out of the score file
+    THRESHOLD = 0.1
+
+    # Sentences with this many characters or fewer are not scored
+    MIN_SENTENCE_LENGTH = 20
+
+    # The number of rows to buffer before appending to the score file
+    BUFFER_ROWS = 10000
+
+    # The number of characters of sentences to score in one batch
+    BATCH_CHARACTERS = 1 << 25
+
+    # The name of the folder holding the sentence index
+    INDEX_NAME = "sentence-index"
+
     TOPICS = [
         'investment property distribution interest agreement',
         'regulation change law financial operation tax accounting',
@@ -59,41 +84,135 @@ class TFIDFScorePipeline(Pipeline):
         # This is only for lazy loading. Use get_dict() unless you are sure you
         # need this.
         self._model = self.load_model()
-        self._topic_sparse_mat = {}
-        for i in range(30):
-            self._topic_sparse_mat['topic' + str(i)] = self._model.transform([self.TOPICS[i]])
+        # One row for each topic
+        self._topic_matrix = self._model.transform(self.TOPICS)
+
+    @classmethod
+    def get_columns(cls):
+        """
+        Returns:
+            :obj:`list` of :obj:`str`: The columns of the score file
+        """
+        return (['10k_path', 'sentence_index', 'joined tokens'] +
+                ['topic' + str(i) + ' score' for i in range(len(cls.TOPICS))])
+
+    @classmethod
+    def get_schema(cls, layout="wide"):
+        """
+        Args:
+            layout (str): "wide" (default) or "long". See `get_batch_rows`.
+
+        Returns:
+            :obj:`list` of :obj:`(str, str)`: The name and type of each column
+            of the score file. See `ParquetScoreWriter`.
+        """
+        if layout == "long":
+            return [('10k_path', 'string'), ('sentence_index', 'int64'),
+                    ('topic', 'int64'), ('score', 'float64')]
+        columns = cls.get_columns()
+        return ([(columns[0], 'string'), (columns[1], 'int64'),
+                 (columns[2], 'string')] +
+                [(column, 'float64') for column in columns[3:]])
+
+    def score_sentences(self, sentences):
+        """Calculates the cosine similarity of each sentence with each topic
+
+        Args:
+            sentences (:obj:`list` of :obj:`str`): The sentences with their
+                words joined by spaces
+
+        Returns:
+            :obj:`numpy.ndarray`: A matrix with the similarity of each sentence
+            (rows) to each topic (columns)
+        """
+        if not sentences:
+            return np.zeros((0, len(self.TOPICS)))
+        sent_mat = self._model.transform(sentences)
+        # The tf-idf vectors have unit length so the dot product is the cosine
+        return (sent_mat @ self._topic_matrix.T).toarray()
+
+    def get_batch_rows(self, paths, filings, layout="wide", offsets=None):
+        """Scores several filings in one batch and keeps the sentences that
+        are similar enough to at least one topic.
+
+        Args:
+            paths (:obj:`list` of :obj:`str`): The path to each filing
+            filings (:obj:`list` of :obj:`list` of :obj:`str`): The sentences
+                of each filing, or of a chunk of it
+            layout (str): "wide" (default) for a row for each sentence or
+                "long" for a row for each sentence and topic with a score
+            offsets (:obj:`list` of :obj:`int`): The index in its filing of
+                the first sentence of each chunk. Defaults to 0 for every
+                filing.
+
+        Returns:
+            :obj:`pandas.DataFrame`: The rows for the score file in the order
+            of the filings. In the wide layout scores at or below the threshold
+            are left empty. In the long layout they are left out.
+        """
+        sentences = [sentence for filing in filings for sentence in filing]
+        similarities = self.score_sentences(sentences)
+        lengths = np.array([len(filing) for filing in filings], dtype=np.int64)
+        filing_index = np.repeat(np.arange(len(filings)), lengths)
+        if offsets is None:
+            offsets = np.zeros(len(filings), dtype=np.int64)
+        sentence_index = (np.arange(len(sentences)) +
+                          np.repeat(np.asarray(offsets, dtype=np.int64) -
+                                    (np.cumsum(lengths) - lengths), lengths))
+        paths = np.array(paths, dtype=object)
+
+        above = similarities > self.THRESHOLD
+        long_enough = np.fromiter(
+            (len(sentence) > self.MIN_SENTENCE_LENGTH for sentence in sentences),
+            dtype=bool, count=len(sentences))
+        above &= long_enough[:, np.newaxis]
+
+        if layout == "long":
+            row, topic = np.nonzero(above)
+            return pd.DataFrame({
+                '10k_path': paths[filing_index[row]],
+                'sentence_index': sentence_index[row],
+                'topic': topic,
+                'score': similarities[row, topic]
+            })
+
+        keep = np.flatnonzero(above.any(axis=1))
+
+        scores = np.where(above[keep], similarities[keep], np.nan)
+        columns = self.get_columns()
+        rows = pd.DataFrame(scores, columns=columns[3:])
+        rows.insert(0, columns[0], paths[filing_index[keep]])
+        rows.insert(1, columns[1], sentence_index[keep])
+        rows.insert(2, columns[2], [sentences[i] for i in keep])
+        return rows
 
     @staticmethod
-    def get_input_stream(schema=None):
+    def get_input_stream(schema=None, chunked=False):
         """This function is used to get a pipeline to get the sentences to calculate
         risk score
 
         Args:
             schema(:obj:`dict`): The schema for the file pipeline
+            chunked (bool): Whether to give the sentences of large files one
+                chunk at a time. See `PreprocessPipeline.get_input_stream`.
 
         Returns:
             An iterable containing lists of sentences
         """
-        # Build the pipeline
-        files = ReadFilePipeline.get_input_stream()
-        file_stream = ReadFilePipeline(
-            input_stream=files, schema=schema).output_stream()
-        sent_stream = SentencePipeline(
-            input_stream=file_stream).output_stream()
-        word_stream = WordPipeline(input_stream=sent_stream).output_stream()
-        token_stream = LemmaPipeline(input_stream=word_stream).output_stream()
-        return SentLemmaPipeline(input_stream=token_stream).output_stream()
+        return PreprocessPipeline.get_input_stream(schema, join=True,
+                                                   chunked=chunked)
 
     @staticmethod
     def load_model():
-        """This function loads a tf-idf model
+        """This function loads a tf-idf model. A model saved as arrays is
+        memory mapped, so it loads quickly and processes share one copy.
 
         Returns:
-            a tf-idf model (TFIDFVectorizer)
+            a tf-idf model (TfidfModel or TFIDFVectorizer)
         """
-        file_name = get_training_file_path('tf-idf.model')
-        with open(file_name, "rb") as model_file:
-            model = pickle.load(model_file)
+        model = TFIDFPipeline.load_model()
+        if model is None:
+            raise FileNotFoundError("No tf-idf model has been trained")
         return model
 
     async def calc_cos(self):
@@ -101,36 +220,126 @@ class TFIDFScorePipeline(Pipeline):
         """
         count = 1
         total = len(get_file_list())
-        file_name = "cos_score.csv"
-        file_path = get_score_file_path(file_name)
-        input_stream = self.get_input_stream()
-        async for data in input_stream:
-            sentences = data['text']
-            sent_mat = self._model.transform(sentences)
-            cosine_similarities = []
-            for i in range(30):
-                cosine_similarities.append(linear_kernel(self._topic_sparse_mat['topic' + str(i)], sent_mat).flatten())
-            n = len(sentences)
-            for i in range(n):
-                if len(sentences[i]) > 20:
-                    score_dict = {'10k_path': [data['path']],
-                            'sentence_index' : [i],
-                            'joined tokens' : [sentences[i]]}
-                    for j in range(30):
-                        score_dict['topic'+str(j)+' score'] = cosine_similarities[j][i] if cosine_similarities[j][i] > 0.1 else None
-                    if os.path.isfile(file_path):
-                        df = pd.DataFrame(score_dict)
-                        if df.iloc[0, 3:32].sum() > 0:
-                            with open(file_path, 'a', encoding = 'utf-8') as f:
-                                df.to_csv(f, encoding = 'utf-8', index = False, header=False)
-                    else:
-                        df = pd.DataFrame(score_dict)
-                        if df.iloc[0, 3:32].sum() > 0:
-                            df.to_csv(file_path, encoding = 'utf-8', index = False)
-            print_progress(count, total)
-            count += 1
+        layout = get_output_layout()
+        writer = get_score_writer("cos_score", path_column='10k_path',
+                                  append=True, schema=self.get_schema(layout))
+        batch_characters = get_config().getint(
+            "TFIDF", "score_batch_characters", fallback=self.BATCH_CHARACTERS)
+        input_stream = self.get_input_stream(chunked=True)
+        paths = []
+        filings = []
+        offsets = []
+        characters = 0
+        buffer = []
+        buffered_rows = 0
+        try:
+            async for data in input_stream:
+                paths.append(data['path'])
+                filings.append(data['text'])
+                offsets.append(data['offset'])
+                characters += sum(len(sentence) for sentence in data['text'])
+                if characters >= batch_characters:
+                    rows = self.get_batch_rows(paths, filings, layout, offsets)
+                    paths, filings, offsets, characters = [], [], [], 0
+                    if len(rows):
+                        buffer.append(rows)
+                        buffered_rows += len(rows)
+                if buffered_rows >= self.BUFFER_ROWS:
+                    writer.write(pd.concat(buffer, ignore_index=True))
+                    buffer = []
+                    buffered_rows = 0
+                if data.get('final', True):
+                    print_progress(count, total)
+                    count += 1
+            if filings:
+                rows = self.get_batch_rows(paths, filings, layout, offsets)
+                if len(rows):
+                    buffer.append(rows)
+        finally:
+            if buffer:
+                writer.write(pd.concat(buffer, ignore_index=True))
+            writer.close()
+        print('')
+
+
+    @classmethod
+    def get_index_path(cls):
+        """
+        Returns:
+            str: The path to the folder of the sentence index
+        """
+        return get_score_file_path(cls.INDEX_NAME)
+
+    @staticmethod
+    def preprocess_query(text):
+        """Preprocesses the text of a query like the sentences in the index
+
+        Args:
+            text (str): The query
+
+        Returns:
+            str: The lemmatised words of the query joined by spaces
+        """
+        return " ".join(word for sentence in PreprocessPipeline.tokenise(text)
+                        for word in sentence)
+
+    @classmethod
+    def load_index(cls):
+        """Opens the sentence index for querying. Queries are preprocessed
+        with `preprocess_query`. See `SentenceIndex`.
+
+        Returns:
+            :obj:`SentenceIndex`: The index
+        """
+        if not SentenceIndex.exists(cls.get_index_path()):
+            raise FileNotFoundError("No sentence index has been built")
+        return SentenceIndex(cls.get_index_path(), cls.load_model(),
+                             cls.preprocess_query)
+
+    async def build_index(self):
+        """This function builds the sentence index. The sentences of each
+        batch of filings are transformed with the tf-idf model and added to
+        the index, which replaces any earlier index when it is finished.
+        """
+        count = 1
+        total = len(get_file_list())
+        batch_characters = get_config().getint(
+            "TFIDF", "score_batch_characters", fallback=self.BATCH_CHARACTERS)
+        writer = SentenceIndexWriter(self.get_index_path())
+        paths = []
+        filings = []
+        offsets = []
+        characters = 0
+        async for data in self.get_input_stream(chunked=True):
+            paths.append(data['path'])
+            filings.append(data['text'])
+            offsets.append(data['offset'])
+            characters += sum(len(sentence) for sentence in data['text'])
+            if characters >= batch_characters:
+                writer.add(paths, filings, self._transform_filings(filings),
+                           offsets)
+                paths, filings, offsets, characters = [], [], [], 0
+            if data.get('final', True):
+                print_progress(count, total)
+                count += 1
+        if filings:
+            writer.add(paths, filings, self._transform_filings(filings),
+                       offsets)
+        writer.close()
         print('')
-            
+
+    def _transform_filings(self, filings):
+        """
+        Args:
+            filings (:obj:`list` of :obj:`list` of :obj:`str`): The sentences
+                of each filing
+
+        Returns:
+            :obj:`scipy.sparse.csr_matrix`: The tf-idf vector of every sentence
+            of the filings in order
+        """
+        return self._model.transform(
+            [sentence for sentences in filings for sentence in sentences])
 
     async def coroutine(self, data):
         '''
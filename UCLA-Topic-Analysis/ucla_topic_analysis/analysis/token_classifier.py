@@ -0,0 +1,133 @@
+"""Contains a classifier for counting risk and uncertain words in documents
+"""
+import re
+
+import numpy as np
+
+from ucla_topic_analysis import get_config
+
+
+class TokenClassifier:
+    """Sorts words into risk words, uncertain words and other words. Every
+    word in a dictionary is sorted once up front, so counting the words in a
+    bag of words is an array lookup.
+
+    Keywords are matched anywhere in a word by default, so "risky" is a risk
+    word. With `match="exact"` only the keywords themselves are counted, which
+    suits word lists like the Loughran-McDonald lists. A word that is both a
+    risk and an uncertain word counts as a risk word.
+    """
+
+    NEITHER = 0
+    RISK = 1
+    UNCERTAIN = 2
+
+    # The default keywords
+    RISK_WORDS = ("risk",)
+    UNCERTAIN_WORDS = ("uncertain",)
+
+    def __init__(self, dictionary, risk_words=None, uncertain_words=None,
+                 match="substring"):
+        """Sorts the words in the dictionary
+
+        Args:
+            dictionary (:obj:`gensim.corpora.Dictionary`): The dictionary the
+                bags of words are made with
+            risk_words (:obj:`list` of :obj:`str`): The risk keywords. Defaults
+                to `RISK_WORDS`.
+            uncertain_words (:obj:`list` of :obj:`str`): The uncertain
+                keywords. Defaults to `UNCERTAIN_WORDS`.
+            match (str): "substring" to count words containing a keyword or
+                "exact" to count only the keywords. Defaults to "substring".
+        """
+        if match not in ("substring", "exact"):
+            raise ValueError("'match' must be one of {'substring', 'exact'}")
+        risk_words = [word.lower() for word in risk_words or self.RISK_WORDS]
+        uncertain_words = [word.lower()
+                           for word in uncertain_words or self.UNCERTAIN_WORDS]
+        if match == "exact":
+            self._is_risk = frozenset(risk_words).__contains__
+            self._is_uncertain = frozenset(uncertain_words).__contains__
+        else:
+            self._is_risk = re.compile(
+                "|".join(map(re.escape, risk_words))).search
+            self._is_uncertain = re.compile(
+                "|".join(map(re.escape, uncertain_words))).search
+
+        # The class of each word in the dictionary by id. Ids can have gaps,
+        # e.g. in a dictionary filtered without compacting it.
+        self._classes = np.zeros(max(dictionary.keys(), default=-1) + 1,
+                                 dtype=np.intp)
+        for word_id, word in dictionary.items():
+            self._classes[word_id] = self.classify(word)
+
+    @classmethod
+    def from_config(cls, dictionary):
+        """Makes a classifier with the keywords in the RISK section of the
+        config. `risk_words` and `uncertain_words` are comma separated lists
+        of keywords. `risk_words_file` and `uncertain_words_file` are files
+        with one keyword on each line, and are used instead of the lists if
+        they are set. `match` sets how keywords are matched.
+
+        Args:
+            dictionary (:obj:`gensim.corpora.Dictionary`): The dictionary the
+                bags of words are made with
+
+        Returns:
+            :obj:`TokenClassifier`: The classifier
+        """
+        config = get_config()
+
+        def get_words(name):
+            file_path = config.get("RISK", name + "_file", fallback=None)
+            if file_path:
+                with open(file_path, "r", encoding="utf-8") as words_file:
+                    return [line.strip() for line in words_file if line.strip()]
+            words = config.get("RISK", name, fallback=None)
+            if words:
+                return [word.strip() for word in words.split(",")
+                        if word.strip()]
+            return None
+
+        return cls(dictionary,
+                   risk_words=get_words("risk_words"),
+                   uncertain_words=get_words("uncertain_words"),
+                   match=config.get("RISK", "match", fallback="substring"))
+
+    def classify(self, word):
+        """Sorts a word
+
+        Args:
+            word (str): The word
+
+        Returns:
+            int: `RISK`, `UNCERTAIN` or `NEITHER`
+        """
+        if self._is_risk(word):
+            return self.RISK
+        if self._is_uncertain(word):
+            return self.UNCERTAIN
+        return self.NEITHER
+
+    def count(self, bows, missing=None):
+        """Counts the risk and uncertain words in some documents
+
+        Args:
+            bows (:obj:`list` of :obj:`list` of :obj:`(int, int)`): The
+                documents in bag of words form
+            missing (:obj:`dict`): The number of times each word that is not
+                in the dictionary appears in the documents. These are counted
+                too.
+
+        Returns:
+            (int, int): The number of risk words and uncertain words
+        """
+        ids = np.fromiter((word_id for bow in bows for word_id, _ in bow),
+                          dtype=np.intp)
+        counts = np.fromiter((count for bow in bows for _, count in bow),
+                             dtype=np.int64)
+        totals = np.bincount(self._classes[ids], weights=counts, minlength=3)
+        totals = totals.astype(np.int64)
+        for word, count in (missing or {}).items():
+            totals[self.classify(word)] += count
+        return int(totals[self.RISK]), int(totals[self.UNCERTAIN])
@@ -1,6 +1,7 @@
 """This module contains shared functions that are needed during data processing.
 """
 import os
+import shutil
 
 
 MODULE_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -21,3 +22,32 @@ def get_training_file_path(file_name):
         lda-num-topics.model
     """
     return os.path.normpath(os.path.join(TRAINING_FOLDER_PATH, file_name))
+
+def replace_folder(source, destination):
+    """Replaces a folder with another one. The old folder is moved aside
+    before the new one takes its place and only deleted afterwards, so if
+    this is stopped part way the old folder can be put back with
+    `restore_folder`.
+
+    Args:
+        source (str): The new folder
+        destination (str): The folder to replace. It does not need to exist.
+    """
+    backup = destination + ".old"
+    if os.path.isdir(destination):
+        if os.path.isdir(backup):
+            shutil.rmtree(backup)
+        os.replace(destination, backup)
+    os.replace(source, destination)
+    shutil.rmtree(backup, ignore_errors=True)
+
+def restore_folder(folder):
+    """Puts back a folder that `replace_folder` moved aside but did not
+    replace, because it was stopped part way
+
+    Args:
+        folder (str): The folder that was being replaced
+    """
+    backup = folder + ".old"
+    if not os.path.isdir(folder) and os.path.isdir(backup):
+        os.replace(backup, folder)
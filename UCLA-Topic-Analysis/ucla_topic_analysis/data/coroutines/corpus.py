@@ -0,0 +1,297 @@
+"""This module holds the base class for pipelines that write preprocessed data to
+a corpus file for training a model.
+"""
+import os
+import time
+
+from ucla_topic_analysis import get_data_folder, get_file_list
+from ucla_topic_analysis.data import get_training_file_path
+from ucla_topic_analysis.data.corpus_file import JsonCorpusFile
+from ucla_topic_analysis.data.manifest import CorpusManifest
+from ucla_topic_analysis.data.pipeline import Pipeline
+from ucla_topic_analysis.data.coroutines import print_progress
+
+
+class CorpusPipeline(Pipeline):
+    """Base class for pipelines that create and update a corpus file for
+    training, validating and testing a model. This is used to synchronise the
+    pipeline since model implementations don't generally accept async functions
+    for training.
+
+    Each row of the corpus file holds the data for one file in the data folder,
+    or for one chunk of a file that is read in chunks. A manifest of the files
+    in the corpus is kept next to it so preparing the data again only processes
+    new or changed files. A file is added to the manifest once the rows for all
+    of its chunks have been prepared.
+
+    NOTE: This pipeline is a data sink. It does not return any new data.
+    """
+
+    # The split schema for the corpus files
+    SCHEMA = {
+        "training": 0.8,
+        "validation": 0.1,
+        "testing": 0.1
+    }
+
+    # The name of the corpus file in the training folder. Set by sub classes.
+    FILE_NAME = None
+
+    # The number of rows to write between saves of the manifest
+    MANIFEST_SAVE_INTERVAL = 100
+
+    # The number of seconds between saves of the manifest
+    MANIFEST_SAVE_SECONDS = 300
+
+    def __init__(self, *args, mode="training", **kwargs):
+        """Sets up the pipeline
+        """
+        super().__init__(*args, **kwargs)
+
+        if mode not in self.SCHEMA:
+            raise ValueError("'mode' must be one of %s" %set(self.SCHEMA.keys()))
+        self._mode = mode
+
+        # The file the corpus is stored in. This keeps its index loaded between
+        # rows.
+        self._corpus_file = self.get_corpus_file()
+
+        # Used for caching the number of documents for the model to train on.
+        # This is lazy loaded. To gurantee that you get a value call `len` with
+        # this instance as the argument.
+        # Note: This is probably not equal to the actual number of files the
+        #       corpus is made up of
+        self._num_documents = None
+
+        # Used for caching the number of rows in the corpus file. This is lazy
+        # loaded. Use the `number_of_rows` property instead.
+        self._num_rows = None
+
+        # Rows waiting to be written to the corpus file by `flush`
+        self._pending_rows = []
+
+    @classmethod
+    def get_file_path(cls):
+        """
+        Returns:
+            str: the path to the file containing the corpus' data.
+        """
+        return get_training_file_path(cls.FILE_NAME)
+
+    @classmethod
+    def get_corpus_file(cls):
+        """Gets the file the corpus is stored in. Sub classes can override this
+        to store the corpus in a different format.
+
+        Returns:
+            :obj:`JsonCorpusFile`: The corpus file
+        """
+        return JsonCorpusFile(cls.get_file_path())
+
+    @classmethod
+    def exists(cls):
+        """
+        Returns:
+            bool: True if the corpus has been prepared
+        """
+        return cls.get_corpus_file().exists()
+
+    @classmethod
+    def get_manifest(cls):
+        """
+        Returns:
+            :obj:`CorpusManifest`: The manifest of the files in the corpus
+        """
+        file_name = os.path.splitext(cls.get_file_path())[0] + ".manifest.json"
+        return CorpusManifest(file_name)
+
+    @staticmethod
+    def get_input_stream(schema=None, files=None, chunked=False):
+        """This function builds a pipeline to prepare the data for the corpus.
+        Sub classes must implement this.
+
+        Args:
+            schema(:obj:`dict`): The schema for the file pipeline
+            files (:obj:`list` of :obj:`str`): The files to process. Defaults to
+                every file in the data folder.
+            chunked (bool): Whether to give the data of large files one chunk
+                at a time. See `PreprocessPipeline.get_input_stream`.
+
+        Returns:
+            An iterable containing the data for each row of the corpus.
+        """
+        raise NotImplementedError()
+
+    def get_data_stream(self, files):
+        """Builds the pipeline that prepares the rows for the given files. Sub
+        classes can override this to keep hold of pipeline stages that need to
+        be saved in `save_checkpoint`.
+
+        Args:
+            files (:obj:`list` of :obj:`str`): The files to process
+
+        Returns:
+            An iterable containing the data for each row of the corpus.
+        """
+        return self.get_input_stream(self.SCHEMA, files=files, chunked=True)
+
+    def save_checkpoint(self):
+        """Saves any state besides the corpus that the rows written so far
+        depend on. This is called before rows are written to the corpus file so
+        the rows never refer to state that has not been saved.
+        """
+
+    def flush(self):
+        """Saves a checkpoint and then writes the rows processed since the
+        last flush to the corpus file
+        """
+        self.save_checkpoint()
+        for data in self._pending_rows:
+            self._corpus_file.append(data)
+
+            # Add to the total number of documents if they have been loaded
+            # already
+            if (self._num_documents is not None and
+                    data["label"] == self._mode):
+                self._num_documents += len(data["text"])
+
+            # Add to the total number of rows if they have been loaded already
+            self._num_rows = (None if self._num_rows is None
+                              else self._num_rows + 1)
+        self._pending_rows = []
+
+    @classmethod
+    def get_row_paths(cls):
+        """Gets the path of the file each row of the corpus file was made from
+
+        Returns:
+            :obj:`list` of :obj:`str`: The paths relative to the data folder
+        """
+        return cls.get_corpus_file().get_row_paths()
+
+    @classmethod
+    def remove_rows(cls, rel_paths):
+        """Removes the rows for the given files from the corpus file.
+
+        Args:
+            rel_paths (:obj:`set` of :obj:`str`): The paths of the files to
+                remove relative to the data folder
+        """
+        cls.get_corpus_file().remove_rows(rel_paths)
+
+    @classmethod
+    async def prepare_data(cls):
+        """Runs a pipeline to generate the corpus data and saves it to a file.
+        Only files that are new or have changed since the data was last
+        prepared are processed.
+        """
+        manifest = cls.get_manifest()
+        data_folder = get_data_folder()
+        if not cls.exists():
+            # Without the corpus file the manifest is out of date
+            manifest.clear()
+        elif not len(manifest):
+            # The corpus was prepared before manifests were kept. Assume the
+            # files in it have not changed since.
+            for rel_path in set(cls.get_row_paths()):
+                file_path = os.path.join(data_folder, rel_path)
+                if os.path.isfile(file_path):
+                    manifest.add(file_path)
+        changed, stale = manifest.get_changes(get_file_list())
+
+        # Rows written after the last save of the manifest, for example by a
+        # run that was killed, are for files that are processed again
+        if cls.exists():
+            stale |= {rel_path for rel_path in cls.get_row_paths()
+                      if rel_path not in manifest}
+
+        # Remove rows for files that changed or no longer exist
+        if stale:
+            print("Removing {0} changed or deleted files from the corpus".format(
+                len(stale)))
+            cls.remove_rows(stale)
+            for rel_path in stale:
+                manifest.remove(rel_path)
+            manifest.save()
+
+        if not changed:
+            print("Corpus data is up to date")
+            return
+
+        # Build the pipeline
+        pipeline = cls()
+        data_stream = pipeline.get_data_stream(changed)
+
+        print("Preparing corpus data for {0} files".format(len(changed)))
+        count = 1
+        total = len(changed)
+        rows = 0
+        last_save = time.monotonic()
+        try:
+            async for data in data_stream:
+                await pipeline.run(data)
+                rows += 1
+                # Rows are written before the last chunk of a file, so the
+                # rows of a file that is not in the manifest are removed by
+                # the next run
+                final = data.get("final", True)
+                if final:
+                    # The file was hashed when it was read
+                    manifest.add(os.path.join(data_folder, data["path"]),
+                                 data.get("hash"))
+                if (rows % cls.MANIFEST_SAVE_INTERVAL == 0 or
+                        time.monotonic() - last_save >= cls.MANIFEST_SAVE_SECONDS):
+                    pipeline.flush()
+                    manifest.save()
+                    last_save = time.monotonic()
+                if final:
+                    print_progress(count, total)
+                    count += 1
+        finally:
+            pipeline.flush()
+            manifest.save()
+        print("")
+
+    @property
+    def number_of_rows(self):
+        """int: The number of rows in the prepared corpus file
+        """
+        if self._num_rows is None:
+            len(self)
+        return self._num_rows
+
+    def __len__(self):
+        """This function is used to return the number of documents in the corpus
+
+        Returns:
+            int: The number of documents in the corpus
+        """
+        if self._num_documents is None:
+            # count rows while we are at it
+            self._num_documents, self._num_rows = (
+                self._corpus_file.count(self._mode))
+        return self._num_documents
+
+    def __iter__(self):
+        """Generates data from the corups file.
+
+        Yields:
+            A document in the corpus.
+        """
+        completed = 1
+        for document in self._corpus_file.iter_documents(self._mode):
+            yield document
+            print_progress(completed, len(self))
+            completed += 1
+        print("")
+
+    async def coroutine(self, data):
+        """Adds the documents in the data to the rows written by the next
+        `flush`. This is a data sink it does not return any new data
+
+        Args:
+            data (:obj:`dict`): A dictionary containing the data for the model.
+        """
+        self._pending_rows.append({"label": data["label"],
+                                   "path": data["path"],
+                                   "text": data["text"]})
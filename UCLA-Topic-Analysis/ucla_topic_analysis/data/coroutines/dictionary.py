@@ -1,32 +1,110 @@
 """A pipeline for generating a dictionary from a corpus
 """
 import os
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from gensim.corpora import Dictionary
 
-from ucla_topic_analysis import get_file_list
+from ucla_topic_analysis import get_file_list, get_workers
+from ucla_topic_analysis import get_dictionary_sharded, get_dictionary_filter
 from ucla_topic_analysis.data import get_training_file_path
 from ucla_topic_analysis.data.pipeline import Pipeline
 from ucla_topic_analysis.data.coroutines import print_progress
+from ucla_topic_analysis.data.coroutines.preprocess import PreprocessPipeline
 from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
-from ucla_topic_analysis.data.coroutines.sentence_tokeniser import SentencePipeline
-from ucla_topic_analysis.data.coroutines.words_tokeniser import WordPipeline
-from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
+
+
+def build_shard(file_paths):
+    """Builds a dictionary from some of the files in the data folder. This runs
+    in a worker process.
+
+    Args:
+        file_paths (:obj:`list` of :obj:`str`): The files to add to the
+            dictionary in order
+
+    Returns:
+        :obj:`gensim.corpora.dictionary.Dictionary`: The dictionary for the
+        files
+    """
+    preprocess = PreprocessPipeline()
+    preprocess.setup()
+    dictionary = Dictionary()
+    for file_path in file_paths:
+        for sentences in preprocess.iter_file(file_path):
+            for document in sentences:
+                dictionary.doc2bow(document, allow_update=True)
+    return dictionary
+
+
+def merge_shard(dictionary, shard):
+    """Merges a dictionary built from later files into a dictionary. Words the
+    dictionary does not have are given ids in the order the shard gave them, so
+    merging shards in order gives the same ids as building the dictionary from
+    every file in one go.
+
+    Args:
+        dictionary (:obj:`gensim.corpora.dictionary.Dictionary`): The
+            dictionary to update
+        shard (:obj:`gensim.corpora.dictionary.Dictionary`): The dictionary to
+            merge into it
+    """
+    transform = dictionary.merge_with(shard)
+    # merge_with does not update collection frequencies
+    for old_id, new_id in transform.old2new.items():
+        dictionary.cfs[new_id] = (dictionary.cfs.get(new_id, 0) +
+                                  shard.cfs.get(old_id, 0))
 
 
 class DictionaryPipeline(Pipeline):
     """Pipeline for creating and updating a gensim dictionary and converting
     documents to a bag of words representation.
+
+    The dictionary is saved after every `SAVE_INTERVAL` rows, after
+    `SAVE_SECONDS` seconds and when the stream ends or fails, instead of after
+    every row.
+
+    A new dictionary is built in shards by worker processes unless `sharded`
+    is turned off in the DICTIONARY section of the config. Rare and common
+    words are filtered out of a new dictionary if the DICTIONARY section sets
+    `no_below`, `no_above` or `keep_n`.
     """
 
-    def __init__(self, *args, **kwargs):
+    # The number of shards given to each worker when building the dictionary
+    SHARDS_PER_WORKER = 4
+
+    # The number of rows to update the dictionary with between saves
+    SAVE_INTERVAL = 100
+
+    # The number of seconds between saves
+    SAVE_SECONDS = 300
+
+    def __init__(self, *args, checkpoint=True, allow_update=None, **kwargs):
         """Loads a dictionary for updating
+
+        Args:
+            checkpoint (bool): If this is False the pipeline never saves the
+                dictionary by itself and the owner must call `save_dict`.
+                Defaults to True.
+            allow_update (bool): Whether new words in the documents are added
+                to the dictionary. Defaults to True unless the dictionary is
+                filtered, since adding words would undo the filtering.
         """
         super().__init__(*args, **kwargs)
 
+        if allow_update is None:
+            allow_update = not get_dictionary_filter()
+        self._allow_update = allow_update
+
         # This is only for lazy loading. Use get_dict() unless you are sure you
         # need this.
         self._dictionary = None
 
+        self._checkpoint = checkpoint
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
     @staticmethod
     def load_dictionary():
         """This function is used to load a gensim dictionary from the models
@@ -44,38 +122,93 @@ class DictionaryPipeline(Pipeline):
         return None
 
     @staticmethod
-    def get_input_stream(schema=None):
+    def get_input_stream(schema=None, files=None, chunked=False):
         """This function is used to get a pipeline to feed into a dictionary for
         training an LDA model.
 
         Args:
             schema(:obj:`dict`): The schema for the file pipeline
+            files (:obj:`list` of :obj:`str`): The files to read. Defaults to
+                every file in the data folder.
+            chunked (bool): Whether to give the sentences of large files one
+                chunk at a time. See `PreprocessPipeline.get_input_stream`.
 
         Returns:
             An iterable containing lists of words to train a dictionary with.
         """
-        # Build the pipeline
-        files = ReadFilePipeline.get_input_stream()
-        file_stream = ReadFilePipeline(
-            input_stream=files, schema=schema).output_stream()
-        sent_stream = SentencePipeline(
-            input_stream=file_stream).output_stream()
-        word_stream = WordPipeline(input_stream=sent_stream).output_stream()
-        return LemmaPipeline(input_stream=word_stream).output_stream()
+        return PreprocessPipeline.get_input_stream(schema, files=files,
+                                                   chunked=chunked)
 
     async def train_dictionary(self):
         """This function trains a new gensim dictionary from the corpus.
         """
-        input_stream = self.get_input_stream()
-        # Train the dictionary
-        count = 1
-        total = len(get_file_list())
-        async for data in input_stream:
-            await self.run(data)
-            print_progress(count, total)
-            count += 1
+        workers = get_workers() or os.cpu_count() or 1
+        sharded = get_dictionary_sharded() and workers > 1
+        if sharded:
+            self._dictionary = await self.train_sharded(workers)
+        else:
+            input_stream = self.get_input_stream(chunked=True)
+            # Train the dictionary. Words are always added while training.
+            allow_update = self._allow_update
+            self._allow_update = True
+            count = 1
+            total = len(get_file_list())
+            try:
+                async for data in input_stream:
+                    await self.run(data)
+                    if data.get("final", True):
+                        print_progress(count, total)
+                        count += 1
+            finally:
+                self._allow_update = allow_update
+                # Keep the progress made if training fails
+                self.save_dict()
+            print("")
+
+        filter_options = get_dictionary_filter()
+        if filter_options:
+            print("Filtering dictionary with {0}".format(filter_options))
+            self._dictionary.filter_extremes(**filter_options)
+        if sharded or filter_options:
+            self.save_dict()
+
+    async def train_sharded(self, workers):
+        """Builds a dictionary by splitting the files in the data folder into
+        shards, building a dictionary for each shard in worker processes and
+        merging them in order.
+
+        Args:
+            workers (int): The number of worker processes to use
+
+        Returns:
+            :obj:`gensim.corpora.dictionary.Dictionary`: The dictionary
+        """
+        file_paths = list(ReadFilePipeline.get_input_stream())
+        num_shards = max(1, min(len(file_paths),
+                                workers * self.SHARDS_PER_WORKER))
+        size, remainder = divmod(len(file_paths), num_shards)
+        shards = []
+        start = 0
+        for index in range(num_shards):
+            end = start + size + (1 if index < remainder else 0)
+            shards.append(file_paths[start:end])
+            start = end
+
+        print("Building dictionary in {0} shards".format(num_shards))
+        dictionary = Dictionary()
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [loop.run_in_executor(executor, build_shard, shard)
+                       for shard in shards]
+            try:
+                for count, future in enumerate(futures, 1):
+                    merge_shard(dictionary, await future)
+                    print_progress(count, num_shards)
+            finally:
+                for future in futures:
+                    future.cancel()
         print("")
-        self.save_dict()
+        return dictionary
 
     async def get_dictionary(self):
         """This function is used to get an instance of a gensim dictionary. It
@@ -97,12 +230,49 @@ class DictionaryPipeline(Pipeline):
         return self._dictionary
 
     def save_dict(self):
-        """Saves the updated dictionary to file
+        """Saves the updated dictionary to file. The file is replaced in one
+        step so an interrupted save does not corrupt the saved dictionary.
         """
+        if self._dictionary is None:
+            return
         file_name = "dictionary.gensim"
         file_path = get_training_file_path(file_name)
 
-        self._dictionary.save(file_path)
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(file_path))
+        os.close(file_descriptor)
+        try:
+            self._dictionary.save(temp_path)
+            os.replace(temp_path, file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    def checkpoint(self):
+        """Saves the dictionary if enough rows have been added or enough time
+        has passed since it was last saved.
+        """
+        if not self._checkpoint or not self._unsaved:
+            return
+        if (self._unsaved >= self.SAVE_INTERVAL or
+                time.monotonic() - self._last_save >= self.SAVE_SECONDS):
+            self.save_dict()
+
+    async def output_stream(self):
+        """Converts the input stream to bags of words. The dictionary is saved
+        when the stream ends, even if it fails.
+
+        Yields:
+            :obj:`dict`: The data with the documents as bags of words
+        """
+        try:
+            async for data in super().output_stream():
+                yield data
+        finally:
+            if self._checkpoint and self._unsaved:
+                self.save_dict()
 
     async def coroutine(self, data):
         """Converts the documents in the data to bags of words
@@ -117,7 +287,10 @@ class DictionaryPipeline(Pipeline):
             each document.
         """
         dictionary = await self.get_dictionary()
-        data["text"] = [dictionary.doc2bow(document, allow_update=True)
+        data["text"] = [dictionary.doc2bow(document,
+                                           allow_update=self._allow_update)
                         for document in data["text"]]
-        self.save_dict()
+        if self._allow_update:
+            self._unsaved += 1
+            self.checkpoint()
         return data
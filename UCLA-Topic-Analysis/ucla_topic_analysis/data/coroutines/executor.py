@@ -0,0 +1,190 @@
+"""Contains a pipeline for running CPU bound pipelines in worker processes
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ucla_topic_analysis import get_workers
+from ucla_topic_analysis.data.pipeline import Pipeline
+
+# The stages run by the current worker process. This is set once per worker by
+# `_init_worker` so the stages (and the models they load) are not sent with
+# every document.
+_STAGES = []
+
+
+def _init_worker(stages):
+    """Sets up the stages in a new worker process
+
+    Args:
+        stages (:obj:`list` of :obj:`Pipeline`): The stages the worker runs
+    """
+    global _STAGES
+    for stage in stages:
+        stage.setup()
+    _STAGES = stages
+
+
+def _process(data):
+    """Runs a single document through the stages of the worker process
+
+    Args:
+        data: The document to process
+
+    Returns:
+        The document after it has been processed by every stage
+    """
+    for stage in _STAGES:
+        data = stage.process(data)
+    return data
+
+
+def _process_batch(batch):
+    """Runs a batch of documents through the stages of the worker process
+
+    Args:
+        batch (:obj:`list`): The documents to process
+
+    Returns:
+        :obj:`list`: The documents after they have been processed by every stage
+    """
+    for stage in _STAGES:
+        batch = stage.process_batch(batch)
+    return batch
+
+
+class ExecutorPipeline(Pipeline):
+    """Pipeline that runs a chain of CPU bound pipelines in a pool of worker
+    processes. Whole documents are shipped to the workers so every document is
+    processed by a single worker from start to finish.
+
+    For example, to tokenise and lemmatise documents on every core::
+
+        ExecutorPipeline([SentencePipeline(), WordPipeline(), LemmaPipeline()])
+    """
+
+    def __init__(self, stages, *args, workers=None, batch_size=1, **kwargs):
+        """Initialises the pipeline
+
+        Args:
+            stages (:obj:`list` of :obj:`Pipeline`): The pipelines to run, in
+                order. They must implement `process` and be picklable.
+            workers (int): The number of worker processes. Defaults to the
+                number of workers in the config or the number of cores if that
+                is not set.
+            batch_size (int): The number of documents sent to a worker at a
+                time when running as a stream. Defaults to 1.
+            concurrency (int): The number of documents (or batches) to have in
+                flight. Defaults to the number of workers so every worker is
+                busy.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be greater than 0")
+
+        self._stages = stages
+        self._batch_size = batch_size
+        self._workers = workers or get_workers() or os.cpu_count()
+        kwargs.setdefault("concurrency", self._workers)
+        super().__init__(*args, **kwargs)
+
+        # This is lazy loaded. Use get_executor() to make sure it is not None.
+        self._executor = None
+
+    def get_executor(self):
+        """Gets the process pool used by the pipeline, starting it if it has
+        not been started yet.
+
+        Returns:
+            :obj:`concurrent.futures.ProcessPoolExecutor`: The process pool
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers,
+                initializer=_init_worker,
+                initargs=(self._stages,))
+        return self._executor
+
+    def shutdown(self):
+        """Stops the worker processes. They will be restarted if the pipeline
+        is used again.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def coroutine(self, data):
+        """Processes the data in a worker process
+
+        Args:
+            data: The data to be processed by the stages
+
+        Returns:
+            The data after it has been processed by every stage
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_executor(), _process, data)
+
+    async def coroutine_batch(self, batch):
+        """Processes a batch of data in a single worker process
+
+        Args:
+            batch (:obj:`list`): The data to be processed by the stages
+
+        Returns:
+            :obj:`list`: The data after it has been processed by every stage
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.get_executor(), _process_batch, batch)
+
+    def process(self, data):
+        """Processes the data in the current process
+
+        Args:
+            data: The data to be processed by the stages
+
+        Returns:
+            The data after it has been processed by every stage
+        """
+        for stage in self._stages:
+            data = stage.process(data)
+        return data
+
+    async def _batches(self):
+        """Groups the input stream into batches
+
+        Yields:
+            :obj:`list`: Up to `batch_size` elements of the input data stream
+        """
+        batch = []
+        async for data in self._input_elements():
+            batch.append(data)
+            if len(batch) == self._batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def output_stream(self):
+        """Processes the data as a stream and stops the worker processes once
+        the stream is finished. If a batch size is set the workers are sent
+        batches of documents but the results are still yielded one at a time.
+
+        Yields:
+            The result of running the stages on a single element of the input
+            data stream
+        """
+        if self._input_stream is None:
+            raise Exception("No input data stream has been set")
+        try:
+            if self._batch_size == 1:
+                async for result in super().output_stream():
+                    yield result
+            else:
+                batches = self._stream(self._batches(), self.coroutine_batch)
+                async for batch in batches:
+                    for result in batch:
+                        self._result = result
+                        yield result
+        finally:
+            self.shutdown()
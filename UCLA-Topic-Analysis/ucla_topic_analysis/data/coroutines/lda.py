@@ -96,7 +96,7 @@ class LdaPipeline(Pipeline):
         corpus = LdaCorpusPipeline(mode=mode)
 
         # Make sure corpus data has been prepared
-        if not os.path.isfile(corpus.get_file_path()):
+        if not corpus.exists():
             raise Exception("No corpus has been prepared.")
 
         model = self._model or self._load_model()
@@ -111,15 +111,16 @@ class LdaPipeline(Pipeline):
         It will overwrite any existing model and creating a new one if one does
         not exist.
         """
-        # Get the dictionary
-        dictionary = await DictionaryPipeline().get_dictionary()
-
         # Get corpus
         corpus = LdaCorpusPipeline()
 
-        # Make sure corpus data has been prepared
-        if not os.path.isfile(corpus.get_file_path()):
-            await corpus.prepare_data()
+        # Make sure corpus data has been prepared and includes any new files.
+        # This adds the words in new files to the dictionary, so the
+        # dictionary is loaded after it.
+        await corpus.prepare_data()
+
+        # Get the dictionary
+        dictionary = await DictionaryPipeline().get_dictionary()
 
         print("Training model. This might take some time")
         model = LdaMulticore(
@@ -3,13 +3,11 @@ platform
 
 see: https://www.lighttag.io/
 """
-import json
-
 from ucla_topic_analysis import get_file_list
 from ucla_topic_analysis.data import get_training_file_path
-from ucla_topic_analysis.data.coroutines import create_file
-from ucla_topic_analysis.data.coroutines import insert
 from ucla_topic_analysis.data.coroutines import print_progress
+from ucla_topic_analysis.data.json_writer import JsonArrayWriter
+from ucla_topic_analysis.data.json_writer import JsonLinesWriter
 from ucla_topic_analysis.data.pipeline import Pipeline
 from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
 
@@ -17,6 +15,11 @@ from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
 class LightTagDataSetPipeline(Pipeline):
     """Pipeline for generating a dataset for the LightTag platform.
 
+    The documents are added to the end of a JSON array in
+    training/LightTag-dataset.json, or written one per line to
+    training/LightTag-dataset.jsonl. The file is kept open while the dataset
+    is generated and must be finished with `close`.
+
      NOTE: This pipeline is a data sink. It does not return any new data.
     """
 
@@ -27,6 +30,37 @@ class LightTagDataSetPipeline(Pipeline):
         "testing": 0.1
     }
 
+    # The writer for each file format
+    WRITERS = {
+        "json": JsonArrayWriter,
+        "jsonl": JsonLinesWriter
+    }
+
+    def __init__(self, *args, file_format="json", **kwargs):
+        """Initialises the pipeline
+
+        Args:
+            file_format (str): "json" (default) for a JSON array that LightTag
+                can import or "jsonl" for one JSON object per line
+        """
+        if file_format not in self.WRITERS:
+            raise ValueError("'file_format' must be one of %s"
+                             %set(self.WRITERS.keys()))
+        super().__init__(*args, **kwargs)
+        self._file_format = file_format
+        self._writer = None
+
+    @classmethod
+    def get_file_path(cls, file_format="json"):
+        """
+        Args:
+            file_format (str): The file format. Defaults to "json".
+
+        Returns:
+            str: The path to the dataset file
+        """
+        return get_training_file_path("LightTag-dataset." + file_format)
+
     @staticmethod
     def get_input_stream(schema=None):
         """This function is used to get an input stream for the
@@ -46,20 +80,26 @@ class LightTagDataSetPipeline(Pipeline):
         ).output_stream()
 
     @classmethod
-    async def generate_dataset(cls):
+    async def generate_dataset(cls, file_format="json"):
         """This function is used to create a dataset for the LightTag platform
+
+        Args:
+            file_format (str): "json" (default) or "jsonl"
         """
         #build the pipeline
         data_stream = cls.get_input_stream(cls.SCHEMA)
-        pipeline = cls()
+        pipeline = cls(file_format=file_format)
 
         # create the dataset
         count = 1
         total = len(get_file_list())
-        async for data in data_stream:
-            await pipeline.run(data)
-            print_progress(count, total)
-            count += 1
+        try:
+            async for data in data_stream:
+                await pipeline.run(data)
+                print_progress(count, total)
+                count += 1
+        finally:
+            pipeline.close()
         print("")
 
     async def coroutine(self, data):
@@ -70,12 +110,14 @@ class LightTagDataSetPipeline(Pipeline):
             data (:obj:`dict`): A dictionary containing data that needs to be
                 tagged
         """
-        file_path = get_training_file_path("LightTag-dataset.json")
-        is_new_file = create_file(file_path, "[\n]")
-        data_string = json.dumps(data)
-        prefix = "\n" if is_new_file else ",\n"
-        insertion_string = "{0}{1}".format(prefix, data_string)
-        with open(file_path, "r+") as json_file:
-            json_file.seek(0, 2)
-            position = json_file.tell() - 2
-            insert(insertion_string, json_file, position)
+        if self._writer is None:
+            self._writer = self.WRITERS[self._file_format](
+                self.get_file_path(self._file_format))
+        self._writer.write(data)
+
+    def close(self):
+        """Finishes and closes the dataset file
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
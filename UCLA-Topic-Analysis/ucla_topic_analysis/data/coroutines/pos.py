@@ -1,15 +1,35 @@
 """A pipeline for tagging parts of speech.
 """
-import nltk
+from nltk.tag.perceptron import PerceptronTagger
 from ucla_topic_analysis.data.pipeline import Pipeline
 
 class POSPipeline(Pipeline):
     """Pipeline that generates parts of speech tags given a list of words.
     """
 
+    # The tagger is lazy loaded by `setup` so the model is only read once
+    _tagger = None
+
+    def setup(self):
+        """Loads the perceptron tagger model
+        """
+        if self._tagger is None:
+            self._tagger = PerceptronTagger()
+
     async def coroutine(self, data):
         """Generates parts of speech tags for the given data
 
+        Args:
+            data (:obj:`list` of :obj:`str`): list of words to be tagged
+
+        Returns:
+            The tagged words. See `process`.
+        """
+        return self.process(data)
+
+    def process(self, data):
+        """Generates parts of speech tags for the given data
+
         Args:
             data (:obj:`list` of :obj:`str`): list of words to be tagged
 
@@ -22,4 +42,5 @@ class POSPipeline(Pipeline):
                     ...
                 ]
         """
-        return nltk.pos_tag(data)
+        self.setup()
+        return self._tagger.tag(data)
@@ -0,0 +1,191 @@
+"""A pipeline for turning the text of a document into lemmatised sentences in a
+single pass.
+"""
+import os
+
+import nltk
+from nltk.corpus import wordnet as wn
+
+from ucla_topic_analysis import get_concurrency, get_data_folder
+from ucla_topic_analysis import get_chunk_size, get_use_mmap
+from ucla_topic_analysis.data import get_training_file_path
+from ucla_topic_analysis.data.pipeline import Pipeline
+from ucla_topic_analysis.data.token_cache import TokenCache
+from ucla_topic_analysis.data.coroutines.executor import ExecutorPipeline
+from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
+from ucla_topic_analysis.data.coroutines.read import add_offsets
+from ucla_topic_analysis.data.coroutines.read import join_chunks
+from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
+
+
+class PreprocessPipeline(Pipeline):
+    """Pipeline that splits text into sentences, tokenises the sentences into
+    words and lemmatises and filters the words. It gives the same result as
+    chaining a SentencePipeline, WordPipeline and LemmaPipeline (and a
+    SentLemmaPipeline if `join` is set) without building the intermediate
+    lists for each stage.
+
+    The tokens of each document are kept in a token cache, so documents that
+    have not changed are only preprocessed once.
+
+    If `chunk_size` is set in the PIPELINE section of the config, files are
+    read and preprocessed in chunks. Streams built with `chunked` set, and
+    `iter_file`, give the sentences one chunk at a time, so stages that use
+    them never hold a large filing in memory as a whole.
+    """
+
+    # The number of documents sent to a worker process at a time
+    BATCH_SIZE = 8
+
+    # The version of the preprocessing. Increase this when the preprocessing
+    # changes so documents in the token cache are preprocessed again.
+    VERSION = "1"
+
+    def __init__(self, *args, join=False, use_cache=True, **kwargs):
+        """Initialises the pipeline
+
+        Args:
+            join (bool): If True the words in each sentence are joined with
+                spaces like the SentLemmaPipeline does. Defaults to False.
+            use_cache (bool): Whether to use the token cache in the training
+                folder. Defaults to True.
+        """
+        super().__init__(*args, **kwargs)
+        self._join = join
+        self._cache = (TokenCache(get_training_file_path("token-cache"),
+                                  self.VERSION)
+                       if use_cache else None)
+
+    @staticmethod
+    def get_input_stream(schema=None, join=False, files=None, chunked=False):
+        """This function builds a pipeline that reads the files in the data
+        folder and preprocesses them in worker processes.
+
+        Args:
+            schema(:obj:`dict`): The schema for the file pipeline
+            join (bool): Whether to join the words in each sentence
+            files (:obj:`list` of :obj:`str`): The files to read. Defaults to
+                every file in the data folder.
+            chunked (bool): If this is True and `chunk_size` is set in the
+                config, the stream has a dict for each chunk of a file (see
+                `ReadFilePipeline`) instead of joining the chunks of each file.
+                Every dict then has an "offset" with the index of its first
+                sentence in the file (see `add_offsets`). Defaults to False.
+
+        Returns:
+            An iterable containing a dict for each file, or each chunk of a
+            file, where "text" is a list of lemmatised sentences.
+        """
+        files = (ReadFilePipeline.get_input_stream() if files is None
+                 else sorted(files))
+        chunk_size = get_chunk_size()
+        file_stream = ReadFilePipeline(
+            input_stream=files, schema=schema, chunk_size=chunk_size,
+            use_mmap=get_use_mmap(),
+            concurrency=get_concurrency()).output_stream()
+        stream = ExecutorPipeline(
+            [PreprocessPipeline(join=join)],
+            input_stream=file_stream,
+            batch_size=PreprocessPipeline.BATCH_SIZE).output_stream()
+        if chunked:
+            return add_offsets(stream)
+        if chunk_size is None:
+            return stream
+        return join_chunks(stream)
+
+    def iter_file(self, file_path):
+        """Reads and preprocesses a file, one chunk at a time if `chunk_size`
+        is set in the config
+
+        Args:
+            file_path (str): The path to the file
+
+        Yields:
+            :obj:`list` of :obj:`list` of :obj:`str`: The lemmatised sentences
+            in each chunk of the file, or in the whole file if it is not read
+            in chunks
+        """
+        rel_path = os.path.relpath(file_path, get_data_folder())
+        chunk_size = get_chunk_size()
+        if chunk_size is None:
+            chunks = [ReadFilePipeline.read_file(file_path)]
+        else:
+            chunks = ReadFilePipeline.iter_chunks(file_path, chunk_size,
+                                                  get_use_mmap())
+        for text in chunks:
+            yield self.process({"text": text, "path": rel_path})["text"]
+
+    def setup(self):
+        """Loads the punkt model, the wordnet corpus and the lemma cache
+        """
+        nltk.sent_tokenize("")
+        wn.ensure_loaded()
+        LemmaPipeline.LEMMA_CACHE.load()
+
+    @staticmethod
+    def tokenise(text):
+        """Splits the text into lemmatised sentences
+
+        Args:
+            text (str): The text to tokenise
+
+        Returns:
+            :obj:`list` of :obj:`list` of :obj:`str`: The lemmatised words in
+            each sentence
+        """
+        prepare = LemmaPipeline.prepare_token_for_lda
+        word_tokenize = nltk.word_tokenize
+        return [prepare(word_tokenize(sentence))
+                for sentence in nltk.sent_tokenize(text)]
+
+    def get_tokens(self, data):
+        """Gets the lemmatised sentences for the data from the token cache or
+        by tokenising its text.
+
+        Args:
+            data (:obj:`dict`): A dictionary containing the key "text" and
+                optionally the key "path".
+
+        Returns:
+            :obj:`list` of :obj:`list` of :obj:`str`: The lemmatised words in
+            each sentence
+        """
+        if self._cache is None:
+            return self.tokenise(data["text"])
+        key = self._cache.key(data.get("path", ""), data["text"])
+        sentences = self._cache.get(key)
+        if sentences is None:
+            sentences = self.tokenise(data["text"])
+            self._cache.put(key, sentences)
+        return sentences
+
+    async def coroutine(self, data):
+        """Preprocesses the text in the data
+
+        Args:
+            data (:obj:`dict`): A dictionary containing the key "text" which is
+                to be preprocessed.
+
+        Returns:
+            :obj:`dict`: The preprocessed data. See `process`.
+        """
+        return self.process(data)
+
+    def process(self, data):
+        """Preprocesses the text in the data
+
+        Args:
+            data (:obj:`dict`): A dictionary containing the key "text" which is
+                to be preprocessed.
+
+        Returns:
+            :obj:`dict`: The data dict with the value associated with the key
+            "text" replaced with a list of lemmatised and filtered word lists
+            (or strings if `join` is set), one for each sentence. All other
+            data in the dict is left untouched.
+        """
+        sentences = self.get_tokens(data)
+        if self._join:
+            sentences = [" ".join(sentence) for sentence in sentences]
+        data["text"] = sentences
+        return data
@@ -1,16 +1,137 @@
 """Contains a pipeline for reading text files
 """
+import asyncio
+import codecs
+import hashlib
+import io
+import mmap
 import os
-import random
+
+import numpy as np
+
 from ucla_topic_analysis import get_file_list, get_data_folder
 from ucla_topic_analysis.data.pipeline import Pipeline
 
+# Places a chunk may end, from most to least preferred. A chunk ends after
+# the last paragraph break, or failing that after the last end of a sentence,
+# or failing that at the last whitespace.
+_BOUNDARIES = (
+    ("\n\n",),
+    (". ", ".\n", "? ", "?\n", "! ", "!\n"),
+    (" ", "\n", "\t")
+)
+_BYTE_BOUNDARIES = tuple(tuple(separator.encode("utf-8")
+                               for separator in separators)
+                         for separators in _BOUNDARIES)
+
+
+def find_boundary(text):
+    """Finds where to cut a chunk of text so no sentence is split across
+    chunks. Paragraph breaks and sentence ends in the first half of the text
+    are skipped so chunks do not get too small.
+
+    Args:
+        text (str or bytes): The text to cut
+
+    Returns:
+        int: The length of the chunk. This is the length of the text if there
+        is nowhere sensible to cut it.
+    """
+    boundaries = _BYTE_BOUNDARIES if isinstance(text, bytes) else _BOUNDARIES
+    half = len(text) // 2
+    for tier, separators in enumerate(boundaries):
+        start = 0 if tier == len(boundaries) - 1 else half
+        end = 0
+        for separator in separators:
+            index = text.rfind(separator, start)
+            if index >= 0:
+                end = max(end, index + len(separator))
+        if end > 0:
+            return end
+    return len(text)
+
+
+def join_chunks(stream):
+    """Joins the chunks of each file in a stream back together. The chunks of
+    a file must follow each other in order, which they do in the output of a
+    ReadFilePipeline and of pipelines that keep the order of their input.
+
+    Args:
+        stream: An async iterable of dicts from a chunked ReadFilePipeline.
+            The "text" of each chunk may be a string or a list.
+
+    Returns:
+        An async generator with one dict for each file where "text" has the
+        text of every chunk of the file
+    """
+    async def _join():
+        document = None
+        async for data in stream:
+            if "chunk" not in data:
+                yield data
+                continue
+            if document is None:
+                document = data
+            else:
+                document["text"] += data["text"]
+            if data["final"]:
+                del document["chunk"]
+                del document["final"]
+                if "hash" in data:
+                    document["hash"] = data["hash"]
+                yield document
+                document = None
+    return _join()
+
+
+def add_offsets(stream):
+    """Adds the position of each chunk's "text" in its file to the chunks in a
+    stream, so the chunks can be used one at a time without joining them. Like
+    `join_chunks` the chunks of a file must follow each other in order.
+
+    Args:
+        stream: An async iterable of dicts from a chunked ReadFilePipeline.
+            The "text" of each chunk may be a string or a list.
+
+    Returns:
+        An async generator with the dicts of the stream, each with the key
+        "offset" holding the total length of the "text" of the earlier chunks
+        of the same file. This is 0 for dicts that are not chunks.
+    """
+    async def _add_offsets():
+        offset = 0
+        async for data in stream:
+            if "chunk" not in data or data["chunk"] == 0:
+                offset = 0
+            data["offset"] = offset
+            offset += len(data["text"])
+            yield data
+    return _add_offsets()
+
 
 class ReadFilePipeline(Pipeline):
-    """Pipeline that generates a list of
+    """Pipeline that reads text files and labels them.
+
+    If `chunk_size` is set the output stream reads each file in chunks that end
+    on a paragraph or sentence boundary, so at most about `chunk_size`
+    characters of a file are held at a time. Each chunk is a dict with the
+    label and path of the file, the "text" of the chunk, the "chunk" number and
+    a "final" flag that is True for the last chunk of the file. `join_chunks`
+    puts the chunks back together.
+
+    The SHA-1 "hash" of each file's contents is worked out from the bytes as
+    they are read, so the file does not have to be read again to record it in
+    a `CorpusManifest`. It is given with the file, or with its last chunk.
+
+    Documents are labelled with a hash of their relative path, so a file gets
+    the same label whatever order or process it is read in.
     """
 
-    def __init__(self, *args, schema=None, **kwargs):
+    # Changing the salt gives every document a new label
+    SALT = "ucla-topic-analysis"
+
+    def __init__(self, *args, schema=None, chunk_size=None, use_mmap=False,
+                 **kwargs):
         """Initialises the pipeline
 
         Args:
@@ -19,6 +140,12 @@ class ReadFilePipeline(Pipeline):
                 The values must be in the range [0, 1] and must add up to 1. If
                 this is `None` (default) then every document will be labelled
                 `None`.
+            chunk_size (int): The most characters to read from a file at a
+                time in the output stream. If this is None (default) each file
+                is read in one go.
+            use_mmap (bool): Whether to memory map the files when reading them
+                in chunks. `chunk_size` is in bytes if this is set. Defaults to
+                False.
         """
 
         # Sanity tests
@@ -29,7 +156,8 @@ class ReadFilePipeline(Pipeline):
 
         # Set the instance variables
         self._schema = schema
-        self._seed = 0
+        self._chunk_size = chunk_size
+        self._use_mmap = use_mmap
 
         # Initialise parent class
         super().__init__(*args, **kwargs)
@@ -54,41 +182,226 @@ class ReadFilePipeline(Pipeline):
                 {
                     'text': The text in the file pointed to by the data,
                     'label': The label associated with this document,
-                    'path': The relative path to the file
+                    'path': The relative path to the file,
+                    'hash': The SHA-1 hash of the file's contents
                 }
         """
         rel_path = os.path.relpath(data, get_data_folder())
-        result = {"label": self._sort_document(), "path": rel_path}
-        with open(data, encoding='utf-8', mode='r') as data_file:
-            result["text"] = data_file.read()
-        self._seed += 1
+        result = {"label": self._sort_document(rel_path), "path": rel_path}
+
+        # Read in a thread so other stages can run while we wait on the disk
+        loop = asyncio.get_running_loop()
+        digest = hashlib.sha1()
+        result["text"] = await loop.run_in_executor(None, self.read_file, data,
+                                                    digest)
+        result["hash"] = digest.hexdigest()
         return result
 
-    def _sort_document(self, seed=None):
+    async def output_stream(self):
+        """Reads the files in the input stream. Files are read in chunks if
+        `chunk_size` is set, one file after another.
+
+        Yields:
+            :obj:`dict`: A dict for each file, or for each chunk of a file if
+            `chunk_size` is set. See `coroutine`.
+        """
+        if self._chunk_size is None:
+            async for result in super().output_stream():
+                yield result
+            return
+        if self._input_stream is None:
+            raise Exception("No input data stream has been set")
+        loop = asyncio.get_running_loop()
+        async for file_path in self._input_elements():
+            rel_path = os.path.relpath(file_path, get_data_folder())
+            label = self._sort_document(rel_path)
+            digest = hashlib.sha1()
+            chunks = self.iter_chunks(file_path, self._chunk_size,
+                                      self._use_mmap, digest)
+            text = await loop.run_in_executor(None, next, chunks, None)
+            index = 0
+            while text is not None:
+                # Read ahead one chunk to know if this is the last one
+                next_text = await loop.run_in_executor(None, next, chunks,
+                                                       None)
+                self._result = {
+                    "label": label,
+                    "path": rel_path,
+                    "text": text,
+                    "chunk": index,
+                    "final": next_text is None
+                }
+                if next_text is None:
+                    self._result["hash"] = digest.hexdigest()
+                yield self._result
+                text = next_text
+                index += 1
+
+    @classmethod
+    def iter_chunks(cls, file_path, chunk_size, use_mmap=False, digest=None):
+        """Reads a file in chunks that end on a paragraph or sentence boundary
+        where possible
+
+        Args:
+            file_path (str): Path to the file that is to be read
+            chunk_size (int): The most characters (or bytes if `use_mmap` is
+                set) in a chunk
+            use_mmap (bool): Whether to memory map the file. Defaults to False.
+            digest: A hash object from `hashlib` to update with the bytes of
+                the file as they are read. Defaults to None.
+
+        Yields:
+            str: The text of each chunk. An empty file has a single empty
+            chunk.
+        """
+        if use_mmap:
+            yield from cls._iter_mmap_chunks(file_path, chunk_size, digest)
+            return
+        # Decodes like `open` does in text mode
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder("utf-8")(), translate=True)
+        with open(file_path, mode='rb') as data_file:
+            text = ""
+            empty = True
+            while True:
+                if len(text) < chunk_size:
+                    # A character is at least one byte
+                    data = data_file.read(chunk_size - len(text))
+                    if digest is not None:
+                        digest.update(data)
+                    text += decoder.decode(data, final=not data)
+                    if not data:
+                        break
+                    continue
+                end = find_boundary(text[:chunk_size])
+                yield text[:end]
+                text = text[end:]
+                empty = False
+            if text or empty:
+                yield text
+
+    @staticmethod
+    def _iter_mmap_chunks(file_path, chunk_size, digest=None):
+        """Reads a memory mapped file in chunks. Only the pages of the current
+        chunk need to be in memory.
+
+        Args:
+            file_path (str): Path to the file that is to be read
+            chunk_size (int): The most bytes in a chunk
+            digest: A hash object to update with the bytes of the file.
+                Defaults to None.
+
+        Yields:
+            str: The text of each chunk with the line endings translated like
+            `open` does
+        """
+        with open(file_path, mode='rb') as data_file:
+            size = os.fstat(data_file.fileno()).st_size
+            if not size:
+                yield ""
+                return
+            with mmap.mmap(data_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                start = 0
+                while start < size:
+                    window = data[start:start + chunk_size]
+                    end = len(window)
+                    if start + end < size:
+                        end = find_boundary(window)
+                        # Do not split a character or a line ending
+                        while end > 1 and (data[start + end] & 0xC0) == 0x80:
+                            end -= 1
+                        if end > 1 and window[end - 1] == ord("\r"):
+                            end -= 1
+                    if digest is not None:
+                        digest.update(window[:end])
+                    text = window[:end].decode("utf-8")
+                    yield text.replace("\r\n", "\n").replace("\r", "\n")
+                    start += end
+
+    @staticmethod
+    def read_file(file_path, digest=None):
+        """Reads the whole file
+
+        Args:
+            file_path (str): Path to the file that is to be read
+            digest: A hash object from `hashlib` to update with the bytes of
+                the file. Defaults to None.
+
+        Returns:
+            str: The text in the file
+        """
+        if digest is None:
+            with open(file_path, encoding='utf-8', mode='r') as data_file:
+                return data_file.read()
+        with open(file_path, mode='rb') as data_file:
+            data = data_file.read()
+        digest.update(data)
+        # Translates the line endings like `open` does in text mode
+        return io.IncrementalNewlineDecoder(None, translate=True).decode(
+            data.decode("utf-8"), final=True)
+
+    @classmethod
+    def get_split_values(cls, rel_paths, salt=None):
+        """Hashes the paths of documents to numbers in the range [0, 1). The
+        paths are normalised so either path separator gives the same number.
+
+        Args:
+            rel_paths (:obj:`list` of :obj:`str`): The paths to the documents
+                relative to the data folder
+            salt (str): The salt for the hash. Defaults to `SALT`.
+
+        Returns:
+            :obj:`numpy.ndarray`: A number for each path
+        """
+        salt = (cls.SALT if salt is None else salt).encode("utf-8") + b"\0"
+        values = np.empty(len(rel_paths), dtype=np.float64)
+        for index, rel_path in enumerate(rel_paths):
+            digest = hashlib.blake2b(
+                salt + rel_path.replace("\\", "/").encode("utf-8"),
+                digest_size=8).digest()
+            # The top 53 bits fit in a float exactly
+            values[index] = (int.from_bytes(digest, "big") >> 11) / (1 << 53)
+        return values
+
+    @classmethod
+    def get_labels(cls, rel_paths, schema, salt=None):
+        """Labels many documents at once, for example every file in the data
+        folder::
+
+            files = get_discovery().get_files()
+            labels = ReadFilePipeline.get_labels(
+                [file["path"] for file in files], schema)
+
+        Args:
+            rel_paths (:obj:`list` of :obj:`str`): The paths to the documents
+                relative to the data folder
+            schema (:obj:`dict`): The proportion of documents for each label.
+                See `__init__`.
+            salt (str): The salt for the hash. Defaults to `SALT`.
+
+        Returns:
+            :obj:`list`: The label for each document. Every label is None if
+            there is no schema.
+        """
+        if not schema:
+            return [None] * len(rel_paths)
+        keys = sorted(schema.keys())
+        ends = np.cumsum([schema[key] for key in keys])
+        indices = np.searchsorted(ends, cls.get_split_values(rel_paths, salt),
+                                  side="right")
+        # Rounding can leave the last end a little under 1
+        indices = np.minimum(indices, len(keys) - 1)
+        return [keys[index] for index in indices]
+
+    def _sort_document(self, rel_path):
         """Used to pick a document for the current mode
 
         Args:
-            seed: The seed to use for the random number generator. If this is
-                not set then self._seed will be used.
+            rel_path (str): The path to the document relative to the data
+                folder
 
         Returns:
             str: the label to attach to the document
         """
-        seed = seed or self._seed
-
-        # Generate a random number
-        random.seed(self._seed)
-        random_number = random.random()
-
-        # If no mode or split mechanic is set then pick every document
-        if not self._schema:
-            return None
-
-        # Check if we should pick the document
-        start = 0
-        for key in sorted(self._schema.keys()):
-            end = start + self._schema[key]
-            if start <= random_number < end:
-                return key
-            start += self._schema[key]
-        raise IndexError("Error with `split` proportions")
+        return self.get_labels([rel_path], self._schema)[0]
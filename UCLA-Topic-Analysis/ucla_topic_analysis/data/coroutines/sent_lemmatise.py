@@ -9,6 +9,19 @@ class SentLemmaPipeline(Pipeline):
     async def coroutine(self, data):
         """join tokens with space to form sentence
 
+        Args:
+            data (:obj:`dict`): A dictionary containng the key "text" which is
+                an :obj:`list` of :obj:`str` containing the list of lists of strings
+                be join
+
+        Returns:
+            :obj:`dict`: The joined data. See `process`.
+        """
+        return self.process(data)
+
+    def process(self, data):
+        """join tokens with space to form sentence
+
         Args:
             data (:obj:`dict`): A dictionary containng the key "text" which is
                 an :obj:`list` of :obj:`str` containing the list of lists of strings
@@ -8,9 +8,26 @@ class SentencePipeline(Pipeline):
     """Pipeline that generates a list of sentences from string
     """
 
+    def setup(self):
+        """Loads the punkt model used for tokenising sentences
+        """
+        nltk.sent_tokenize("")
+
     async def coroutine(self, data):
         """Tokenises the given data into a list of sentences
 
+        Args:
+            data (:obj:`dict`): A dictionary containing the key "text" which is
+                to be tokenised into sentences.
+
+        Returns:
+            :obj:`dict`: The tokenised data. See `process`.
+        """
+        return self.process(data)
+
+    def process(self, data):
+        """Tokenises the given data into a list of sentences
+
         Args:
             data (:obj:`dict`): A dictionary containing the key "text" which is
                 to be tokenised into sentences.
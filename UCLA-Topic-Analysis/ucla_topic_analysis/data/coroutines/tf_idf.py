@@ -2,14 +2,16 @@
 """
 import os
 import pickle
+import shutil
 
 import nltk
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 from ucla_topic_analysis.data.pipeline import Pipeline
-from ucla_topic_analysis import log_async_time
+from ucla_topic_analysis import get_config, log_async_time
 from ucla_topic_analysis.data import get_training_file_path
+from ucla_topic_analysis.data.tfidf_model import TfidfModel
 from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
 from ucla_topic_analysis.data.coroutines.tf_idf_pre_process import TFIDFDataPreprocessor
 
@@ -17,6 +19,11 @@ from ucla_topic_analysis.data.coroutines.tf_idf_pre_process import TFIDFDataPrep
 class TFIDFPipeline(Pipeline):
     """Pipeline for creating a TF-IDF model. This is a data sink, it does not
     return any new data
+
+    Unless `streaming` is turned off in the TFIDF section of the config, the
+    model is a `TfidfModel` trained in one pass over the preprocessed corpus.
+    Otherwise it is a `TfidfVectorizer` that tokenises the corpus again and
+    keeps its counts in memory.
     """
 
     EN_STOP = LemmaPipeline.EN_STOP
@@ -33,11 +40,45 @@ class TFIDFPipeline(Pipeline):
     @staticmethod
     def get_file_path():
         """str: the name of the model's file. It is of the form
-        tf-idf.model
+        tf-idf.model. This is where models that are not a `TfidfModel` are
+        pickled.
         """
         file_name = "tf-idf.model"
         return get_training_file_path(file_name)
 
+    @staticmethod
+    def get_folder_path():
+        """str: The path to the folder a `TfidfModel` is saved in
+        """
+        return get_training_file_path("tf-idf-model")
+
+    @classmethod
+    def model_exists(cls):
+        """
+        Returns:
+            bool: True if a model has been saved in either format
+        """
+        return (TfidfModel.exists(cls.get_folder_path()) or
+                os.path.isfile(cls.get_file_path()))
+
+    @classmethod
+    def load_model(cls):
+        """This function is used to load a TF-IDF model from the training
+        folder. A saved `TfidfModel` is memory mapped. Otherwise the pickled
+        model is loaded.
+
+        Returns:
+            :obj:`TfidfModel` or
+            :obj:`sklearn.feature_extraction.text.TfidfVectorizer`: The model
+            or None if there was no tf-idf model saved.
+        """
+        if TfidfModel.exists(cls.get_folder_path()):
+            return TfidfModel.load(cls.get_folder_path())
+        if os.path.isfile(cls.get_file_path()):
+            with open(cls.get_file_path(), "rb") as model_file:
+                return pickle.load(model_file)
+        return None
+
     def get_model(self):
         """This function is used to get an instance of a TF-IDF model. It will
         load the model from file if it finds one, otherwise it will create a new
@@ -57,43 +98,51 @@ class TFIDFPipeline(Pipeline):
 
     def _load_model(self):
         """This function is used to load a TF-IDF model from the models
-        folder. Or `None` if one does not exist.
-
-        Returns:
-            :obj:`sklearn.feature_extraction.text.TfidfVectorizer`: The model
-            found in ucla_topic_analysis/model/tf-idf.model or None if there was
-            no tf-idf model saved.
+        folder. Or `None` if one does not exist. See `load_model`.
         """
-        if os.path.isfile(self.get_file_path()):
-            with open(self.get_file_path(), "rb") as model_file:
-                return pickle.load(model_file)
-        return None
+        return self.load_model()
 
     def save_model(self, file_path=None):
-        """Saves the updated model to file overwriting any existing model.
+        """Saves the updated model to file overwriting any existing model. A
+        `TfidfModel` is saved to a folder of arrays and any other model is
+        pickled.
+
+        Args:
+            file_path (str): Where to save the model. Defaults to
+                `get_folder_path` for a `TfidfModel` and `get_file_path`
+                otherwise.
         """
-        if self._model is not None:
+        if self._model is None:
+            raise Exception("Can not save. No model has been loaded.")
+        if isinstance(self._model, TfidfModel):
+            self._model.save(file_path or self.get_folder_path())
+            # Remove an older pickled model so it is not loaded by mistake
+            if file_path is None and os.path.isfile(self.get_file_path()):
+                os.remove(self.get_file_path())
+        else:
             path = file_path or self.get_file_path()
             with open(path, "wb") as modle_file:
                 pickle.dump(self._model, modle_file)
-        else:
-            raise Exception("Can not save. No model has been loaded.")
+            # Remove a TfidfModel so it is not loaded instead
+            if file_path is None and os.path.isdir(self.get_folder_path()):
+                shutil.rmtree(self.get_folder_path())
 
     @log_async_time
     async def train(self):
         """Trains a TF-IDF model from the data in the corpus file.
         """
         # Initialise vectorizer and corpus
-        vectorizer = TfidfVectorizer(
-            tokenizer=nltk.word_tokenize,
-            stop_words=self.EN_STOP
-        )
+        if get_config().getboolean("TFIDF", "streaming", fallback=True):
+            vectorizer = TfidfModel.from_config(stop_words=self.EN_STOP)
+        else:
+            vectorizer = TfidfVectorizer(
+                tokenizer=nltk.word_tokenize,
+                stop_words=self.EN_STOP
+            )
         corpus = TFIDFDataPreprocessor()
 
-        # Make sure corpus data has been prepared
-        if not os.path.isfile(corpus.get_file_path()):
-            print("Did not find any corpus data. preparing now")
-            await corpus.prepare_data()
+        # Make sure corpus data has been prepared and includes any new files
+        await corpus.prepare_data()
 
         # Train the model
         vectorizer.fit(corpus)
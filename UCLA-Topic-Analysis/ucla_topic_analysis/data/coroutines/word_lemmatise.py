@@ -3,8 +3,26 @@
 import re
 import nltk
 from nltk.corpus import wordnet as wn
+from ucla_topic_analysis.data import get_training_file_path
+from ucla_topic_analysis.data.lemma_cache import LemmaCache
 from ucla_topic_analysis.data.pipeline import Pipeline
 
+
+def morphy(word):
+    """Get the root of the word from wordnet
+
+    Args:
+        word (str): The word we want to lemmatise
+
+    Returns:
+        str: The lemmatised version of the given word
+    """
+    lemma = wn.morphy(word)
+    if lemma is None:
+        return word
+    return lemma
+
+
 class LemmaPipeline(Pipeline):
     """Pipeline that obtain the root of the word
     """
@@ -14,9 +32,21 @@ class LemmaPipeline(Pipeline):
     puntuation = ['(', ')', '[', ']', '{', '}', ',', '.', '$', '#',
                     '%', '/', '!', '&']
 
-    @staticmethod
-    def get_lemma(word):
-        """Get the root of the word
+    # Tokens that are always filtered out. A frozenset so each check is a
+    # single hash lookup.
+    EXCLUDED = frozenset(EN_STOP.union(puntuation))
+
+    # Same as matching word_contain_num. Tokens never contain new lines.
+    contains_number = re.compile('[0-9]').search
+
+    # Shared by every process through the file in the training folder
+    LEMMA_CACHE = LemmaCache(
+        morphy, file_path=get_training_file_path("lemma-cache.json"))
+
+    @classmethod
+    def get_lemma(cls, word):
+        """Get the root of the word. Lemmas are looked up in the lemma cache
+        before asking wordnet.
 
         Args:
             word (str): The word we want to lemmatise
@@ -24,10 +54,7 @@ class LemmaPipeline(Pipeline):
         Returns:
             str: The lemmatised version of the given word
         """
-        lemma = wn.morphy(word)
-        if lemma is None:
-            return word
-        return lemma
+        return cls.LEMMA_CACHE.get(word)
 
     @classmethod
     def prepare_token_for_lda(cls, words):
@@ -40,16 +67,34 @@ class LemmaPipeline(Pipeline):
         Returns:
             :obj:`list` of :obj:`str`: The cleaned up list of words
         """
-        tokens = [word.lower() for word in words]
-        tokens = [cls.get_lemma(word) for word in tokens
-                  if len(word) > 3 and word not in cls.EN_STOP
-                  and bool(re.match(cls.word_contain_num, word)) is False
-                  and word not in cls.puntuation]
-        return tokens
+        excluded = cls.EXCLUDED
+        contains_number = cls.contains_number
+        get_lemma = cls.LEMMA_CACHE.get
+        return [get_lemma(word) for word in map(str.lower, words)
+                if len(word) > 3 and word not in excluded
+                and not contains_number(word)]
+
+    def setup(self):
+        """Loads the wordnet corpus and the lemma cache
+        """
+        wn.ensure_loaded()
+        self.LEMMA_CACHE.load()
 
     async def coroutine(self, data):
         """Tokenises the given data into a list of words
 
+        Args:
+            data (:obj:`dict`): A dict with the key "text" containing a list of
+            lists with tokenised words that need to be processed
+
+        Returns:
+            :obj:`dict`: The lemmatised data. See `process`.
+        """
+        return self.process(data)
+
+    def process(self, data):
+        """Tokenises the given data into a list of words
+
         Args:
             data (:obj:`dict`): A dict with the key "text" containing a list of
             lists with tokenised words that need to be processed
@@ -7,9 +7,27 @@ class WordPipeline(Pipeline):
     """Pipeline that generates a list of words from string
     """
 
+    def setup(self):
+        """Loads the punkt model used by the word tokeniser
+        """
+        nltk.word_tokenize("")
+
     async def coroutine(self, data):
         """Tokenises the text in the given list of sentences into a lists of words
 
+        Args:
+            data (:obj:`dict`): A dictionary containng the key "text" which is
+                an :obj:`list` of :obj:`str` containing the list of strings to
+                be tokenised.
+
+        Returns:
+            :obj:`dict`: The tokenised data. See `process`.
+        """
+        return self.process(data)
+
+    def process(self, data):
+        """Tokenises the text in the given list of sentences into a lists of words
+
         Args:
             data (:obj:`dict`): A dictionary containng the key "text" which is
                 an :obj:`list` of :obj:`str` containing the list of strings to
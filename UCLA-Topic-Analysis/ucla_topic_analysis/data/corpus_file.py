@@ -0,0 +1,505 @@
+"""Contains the file formats used to store corpus data. Each row of a corpus
+file holds the documents made from one file in the data folder along with the
+file's path and label.
+"""
+import os
+import json
+import tempfile
+
+import numpy as np
+
+from ucla_topic_analysis.data import replace_folder, restore_folder
+
+
+class JsonCorpusFile:
+    """A corpus stored as one JSON object per line.
+
+    An index is kept next to the corpus file holding the byte offset, length,
+    label, number of documents and path of every row. Reading the documents for
+    one label only reads and parses the rows with that label, and counting the
+    documents does not read the corpus at all. The index is rebuilt if it does
+    not match the corpus file.
+    """
+
+    def __init__(self, file_path):
+        """Initialises the corpus file
+
+        Args:
+            file_path (str): The path to the corpus file
+        """
+        self.file_path = file_path
+        self.index_path = file_path + ".index"
+
+        # The index of the rows in the corpus. This is lazy loaded. Use
+        # self._get_index() to ensure it is not None.
+        self._index = None
+
+    def exists(self):
+        """
+        Returns:
+            bool: True if the corpus file exists
+        """
+        return os.path.isfile(self.file_path)
+
+    def _read_index(self):
+        """Reads the index file
+
+        Returns:
+            :obj:`list` of :obj:`list`: The offset, length, label, number of
+            documents and path of each row. None if the index is missing, can
+            not be read or does not match the corpus file.
+        """
+        rows = []
+        try:
+            with open(self.index_path, "r") as index_file:
+                for line in index_file:
+                    rows.append(json.loads(line))
+        except (OSError, ValueError):
+            return None
+        end = rows[-1][0] + rows[-1][1] if rows else 0
+        if end != os.path.getsize(self.file_path):
+            return None
+        return rows
+
+    @staticmethod
+    def _get_index_row(offset, line):
+        """Makes the index row for a line of the corpus file
+
+        Args:
+            offset (int): The position of the line in the corpus file
+            line (bytes): The line
+
+        Returns:
+            :obj:`list`: The offset, length, label, number of documents and
+            path of the row
+        """
+        data = json.loads(line)
+        return [offset, len(line), data["label"], len(data["text"]),
+                data["path"]]
+
+    @staticmethod
+    def _write_index_row(index_file, row):
+        """Writes a row to an index file
+
+        Args:
+            index_file: The open index file
+            row (:obj:`list`): The index row
+        """
+        index_file.write(json.dumps(row))
+        index_file.write("\n")
+
+    def _write_index(self, rows):
+        """Replaces the index file in one step
+
+        Args:
+            rows (:obj:`list` of :obj:`list`): The index rows
+        """
+        directory = os.path.dirname(self.index_path) or "."
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "w") as temp_file:
+                for row in rows:
+                    self._write_index_row(temp_file, row)
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
+    def _build_index(self):
+        """Builds the index by reading the whole corpus file
+
+        Returns:
+            :obj:`list` of :obj:`list`: The index rows
+        """
+        rows = []
+        offset = 0
+        with open(self.file_path, "rb") as data_file:
+            for line in data_file:
+                rows.append(self._get_index_row(offset, line))
+                offset += len(line)
+        self._write_index(rows)
+        return rows
+
+    def _get_index(self):
+        """
+        Returns:
+            :obj:`list` of :obj:`list`: The offset, length, label, number of
+            documents and path of each row in the corpus
+        """
+        if self._index is None:
+            if not self.exists():
+                self._index = []
+            else:
+                self._index = self._read_index() or self._build_index()
+        return self._index
+
+    def get_row_paths(self):
+        """Gets the path of the file each row was made from
+
+        Returns:
+            :obj:`list` of :obj:`str`: The paths relative to the data folder
+        """
+        return [row[4] for row in self._get_index()]
+
+    def remove_rows(self, rel_paths):
+        """Removes the rows for the given files.
+
+        Args:
+            rel_paths (:obj:`set` of :obj:`str`): The paths of the files to
+                remove relative to the data folder
+        """
+        if not rel_paths or not self.exists():
+            return
+        rows = []
+        offset = 0
+        directory = os.path.dirname(self.file_path)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(file_descriptor, "wb") as temp_file:
+            with open(self.file_path, "rb") as data_file:
+                for line in data_file:
+                    row = self._get_index_row(offset, line)
+                    if row[4] not in rel_paths:
+                        temp_file.write(line)
+                        rows.append(row)
+                        offset += len(line)
+        os.replace(temp_path, self.file_path)
+        self._write_index(rows)
+        self._index = rows
+
+    def append(self, data):
+        """Adds a row to the end of the corpus. The file is created if it does
+        not exist.
+
+        Args:
+            data (:obj:`dict`): A dict with the keys "text", "label" and "path"
+        """
+        index = self._get_index()
+        offset = index[-1][0] + index[-1][1] if index else 0
+        line = (json.dumps(data) + "\n").encode("utf-8")
+        with open(self.file_path, "ab") as data_file:
+            data_file.write(line)
+        row = [offset, len(line), data["label"], len(data["text"]),
+               data["path"]]
+        with open(self.index_path, "a") as index_file:
+            self._write_index_row(index_file, row)
+        index.append(row)
+
+    def count(self, label):
+        """Counts the documents with a label
+
+        Args:
+            label (str): The label to count the documents for
+
+        Returns:
+            (int, int): The number of documents with the label and the total
+            number of rows in the corpus
+        """
+        index = self._get_index()
+        num_documents = sum(row[3] for row in index if row[2] == label)
+        return num_documents, len(index)
+
+    def iter_documents(self, label):
+        """Iterates over the documents with a label
+
+        Args:
+            label (str): The label of the documents
+
+        Yields:
+            A document in the corpus
+        """
+        rows = [row for row in self._get_index() if row[2] == label]
+        with open(self.file_path, "rb") as data_file:
+            for offset, length, _label, _documents, _path in rows:
+                data_file.seek(offset)
+                for document in json.loads(data_file.read(length))["text"]:
+                    yield document
+
+
+class BinaryCorpusFile:
+    """A bag of words corpus stored in compressed sparse row form. The corpus is
+    a folder holding flat binary arrays that are memory mapped when read so
+    iterating over the corpus does not need any parsing:
+
+    * `indptr.bin`: int64 offsets where each document's terms start and end
+    * `indices.bin`: int32 term ids
+    * `counts.bin`: int32 term counts
+    * `labels.bin`: uint8 label code of each document
+    * `rows.jsonl`: the path, label and number of documents of each row
+
+    The row's line in `rows.jsonl` is written last when a row is added, so a
+    row, even one without documents, is only part of the corpus once all of
+    its data has been written. Only the documents of those rows are read.
+    Data left by an append that was stopped part way is ignored when reading
+    and removed before the next append.
+    """
+
+    # The label code used for documents without a known label
+    NO_LABEL = 255
+
+    def __init__(self, folder, labels):
+        """Initialises the corpus file
+
+        Args:
+            folder (str): The path to the folder holding the corpus
+            labels (:obj:`list` of :obj:`str`): The labels documents can have.
+                The position of a label in the list is its code so the list must
+                not change once the corpus has been written.
+        """
+        if len(labels) >= self.NO_LABEL:
+            raise ValueError("Too many labels for a binary corpus")
+        self.file_path = folder
+        self._labels = list(labels)
+
+        # Whether data left by a stopped append has been removed
+        self._repaired = False
+        restore_folder(folder)
+
+    def _get_path(self, name):
+        """
+        Returns:
+            str: The path to a file in the corpus folder
+        """
+        return os.path.join(self.file_path, name)
+
+    def _get_code(self, label):
+        """
+        Returns:
+            int: The code for a label
+        """
+        try:
+            return self._labels.index(label)
+        except ValueError:
+            return self.NO_LABEL
+
+    def _load(self, name, dtype, length=None):
+        """Memory maps one of the arrays in the corpus
+
+        Args:
+            name (str): The name of the file holding the array
+            dtype: The numpy data type of the array
+            length (int): The number of entries to map. Defaults to the whole
+                file.
+
+        Returns:
+            :obj:`numpy.ndarray`: The array. Empty arrays are not mapped since
+            numpy can not map empty files.
+        """
+        path = self._get_path(name)
+        if os.path.getsize(path) == 0 or length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r",
+                         shape=None if length is None else (length,))
+
+    def _load_indptr(self, num_documents=None):
+        """
+        Args:
+            num_documents (int): The number of documents in the rows of the
+                corpus if they have already been read
+
+        Returns:
+            :obj:`numpy.ndarray`: The entries of `indptr.bin` for the documents
+            that were fully added
+        """
+        if num_documents is None:
+            num_documents = sum(row["documents"] for row in self._get_rows())
+        return self._load("indptr.bin", np.int64, num_documents + 1)
+
+    def exists(self):
+        """
+        Returns:
+            bool: True if the corpus exists
+        """
+        return os.path.isfile(self._get_path("indptr.bin"))
+
+    def _create(self):
+        """Creates an empty corpus
+        """
+        os.makedirs(self.file_path, exist_ok=True)
+        for name in ("indices.bin", "counts.bin", "labels.bin", "rows.jsonl"):
+            open(self._get_path(name), "wb").close()
+        # Written last so a half created corpus does not count as existing
+        np.zeros(1, dtype=np.int64).tofile(self._get_path("indptr.bin"))
+
+    def _get_num_documents(self):
+        """
+        Returns:
+            int: The number of documents in `indptr.bin`
+        """
+        return max(0, os.path.getsize(self._get_path("indptr.bin")) // 8 - 1)
+
+    def _read_rows(self):
+        """Reads the rows whose line in `rows.jsonl` is complete. Rows whose
+        documents are not all in `indptr.bin` are left out too, since corpora
+        written before the line was written last extended it last instead.
+
+        Returns:
+            (:obj:`list` of :obj:`dict`, int): The path, label and number of
+            documents for each row and the length of those rows in
+            `rows.jsonl`
+        """
+        num_documents = self._get_num_documents()
+        rows = []
+        end = 0
+        total = 0
+        with open(self._get_path("rows.jsonl"), "rb") as rows_file:
+            for line in rows_file:
+                if not line.endswith(b"\n"):
+                    break
+                row = json.loads(line)
+                total += row["documents"]
+                if total > num_documents:
+                    break
+                rows.append(row)
+                end += len(line)
+        return rows, end
+
+    def _get_rows(self):
+        """
+        Returns:
+            :obj:`list` of :obj:`dict`: The path, label and number of documents
+            for each row
+        """
+        return self._read_rows()[0]
+
+    def _repair(self):
+        """Removes any data left by an append that was stopped part way
+        """
+        if self._repaired:
+            return
+        rows, rows_end = self._read_rows()
+        num_documents = sum(row["documents"] for row in rows)
+        end = int(self._load_indptr(num_documents)[num_documents])
+        sizes = {
+            "indptr.bin": (num_documents + 1) * 8,
+            "indices.bin": end * 4,
+            "counts.bin": end * 4,
+            "labels.bin": num_documents,
+            "rows.jsonl": rows_end
+        }
+        for name, size in sizes.items():
+            if os.path.getsize(self._get_path(name)) > size:
+                with open(self._get_path(name), "r+b") as array_file:
+                    array_file.truncate(size)
+        self._repaired = True
+
+    def get_row_paths(self):
+        """Gets the path of the file each row was made from
+
+        Returns:
+            :obj:`list` of :obj:`str`: The paths relative to the data folder
+        """
+        return [row["path"] for row in self._get_rows()]
+
+    def append(self, data):
+        """Adds a row to the end of the corpus. The corpus is created if it
+        does not exist.
+
+        Args:
+            data (:obj:`dict`): A dict with the keys "label", "path" and "text"
+                where "text" is a list of documents in bag of words form.
+        """
+        if not self.exists():
+            self._create()
+        self._repair()
+        documents = data["text"]
+        lengths = np.fromiter((len(document) for document in documents),
+                              dtype=np.int64, count=len(documents))
+        terms = np.array([term for document in documents for term in document],
+                         dtype=np.int32).reshape(-1, 2)
+        with open(self._get_path("indices.bin"), "ab") as indices_file:
+            np.ascontiguousarray(terms[:, 0]).tofile(indices_file)
+        with open(self._get_path("counts.bin"), "ab") as counts_file:
+            np.ascontiguousarray(terms[:, 1]).tofile(counts_file)
+        with open(self._get_path("labels.bin"), "ab") as labels_file:
+            codes = np.full(len(documents), self._get_code(data["label"]),
+                            dtype=np.uint8)
+            codes.tofile(labels_file)
+        with open(self._get_path("indptr.bin"), "r+b") as indptr_file:
+            indptr_file.seek(-8, os.SEEK_END)
+            end = np.frombuffer(indptr_file.read(8), dtype=np.int64)[0]
+            (end + np.cumsum(lengths)).tofile(indptr_file)
+        # Written last and in one piece since the line commits the row
+        with open(self._get_path("rows.jsonl"), "a") as rows_file:
+            row = {"path": data["path"], "label": data["label"],
+                   "documents": len(documents)}
+            rows_file.write(json.dumps(row) + "\n")
+
+    def remove_rows(self, rel_paths):
+        """Removes the rows for the given files by rewriting the corpus.
+
+        Args:
+            rel_paths (:obj:`set` of :obj:`str`): The paths of the files to
+                remove relative to the data folder
+        """
+        if not rel_paths or not self.exists():
+            return
+        rows = self._get_rows()
+        num_documents = sum(row["documents"] for row in rows)
+        indptr = self._load_indptr(num_documents)
+        indices = self._load("indices.bin", np.int32)[:indptr[-1]]
+        counts = self._load("counts.bin", np.int32)[:indptr[-1]]
+        labels = self._load("labels.bin", np.uint8)[:num_documents]
+
+        # Work out which documents to keep
+        keep = np.ones(len(labels), dtype=bool)
+        kept_rows = []
+        start = 0
+        for row in rows:
+            stop = start + row["documents"]
+            if row["path"] in rel_paths:
+                keep[start:stop] = False
+            else:
+                kept_rows.append(row)
+            start = stop
+        lengths = np.diff(indptr)[keep]
+        term_mask = np.repeat(keep, np.diff(indptr))
+
+        # Write the new corpus next to the old one then swap them
+        temp_folder = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(self.file_path)))
+        temp_corpus = BinaryCorpusFile(temp_folder, self._labels)
+        np.concatenate(([0], np.cumsum(lengths))).astype(np.int64).tofile(
+            temp_corpus._get_path("indptr.bin"))
+        indices[term_mask].tofile(temp_corpus._get_path("indices.bin"))
+        counts[term_mask].tofile(temp_corpus._get_path("counts.bin"))
+        labels[keep].tofile(temp_corpus._get_path("labels.bin"))
+        with open(temp_corpus._get_path("rows.jsonl"), "w") as rows_file:
+            for row in kept_rows:
+                rows_file.write(json.dumps(row))
+                rows_file.write("\n")
+        del indptr, indices, counts, labels
+        replace_folder(temp_folder, self.file_path)
+
+    def count(self, label):
+        """Counts the documents with a label
+
+        Args:
+            label (str): The label to count the documents for
+
+        Returns:
+            (int, int): The number of documents with the label and the total
+            number of rows in the corpus
+        """
+        rows = self._get_rows()
+        labels = self._load("labels.bin", np.uint8)[
+            :sum(row["documents"] for row in rows)]
+        num_documents = int(np.count_nonzero(labels == self._get_code(label)))
+        return num_documents, len(rows)
+
+    def iter_documents(self, label):
+        """Iterates over the documents with a label
+
+        Args:
+            label (str): The label of the documents
+
+        Yields:
+            :obj:`list` of :obj:`(int, int)`: A document in bag of words form
+        """
+        indptr = self._load_indptr()
+        indices = self._load("indices.bin", np.int32)
+        counts = self._load("counts.bin", np.int32)
+        labels = self._load("labels.bin", np.uint8)[:len(indptr) - 1]
+        for document in np.flatnonzero(labels == self._get_code(label)):
+            start, stop = indptr[document], indptr[document + 1]
+            yield list(zip(indices[start:stop].tolist(),
+                           counts[start:stop].tolist()))
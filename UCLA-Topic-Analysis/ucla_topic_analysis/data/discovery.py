@@ -0,0 +1,238 @@
+"""Contains a cached listing of the files in the data folder.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ucla_topic_analysis import get_data_folder
+from ucla_topic_analysis.data import get_training_file_path
+
+# The discovery for each data folder, shared by every caller in the process
+_DISCOVERIES = {}
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def parse_path(rel_path):
+    """Gets the ticker and filing date from the path to a filing. Paths are of
+    the form sec_edgar_filings/TICKER/10-K/DATE...
+
+    Args:
+        rel_path (str): The path to the filing relative to the data folder
+
+    Returns:
+        (str, str): The ticker and the filing date. Either is None if the path
+        does not have it.
+    """
+    parts = re.split(r"[\\/]", rel_path)
+    ticker = parts[1] if len(parts) >= 3 else None
+    date = parts[-1][:10] if _DATE.match(parts[-1]) else None
+    return ticker, date
+
+
+class FileDiscovery:
+    """Lists the text files in a folder and keeps the listing in a manifest
+    with the size, modification time, ticker and filing date of each file.
+
+    The folders are listed with `os.scandir` by a pool of threads. When the
+    listing is refreshed only the folders whose modification time changed are
+    listed again, so an unchanged data folder costs one `stat` per folder
+    instead of a full walk. Changing a file in place does not change the
+    modification time of its folder, so the size and modification time of a
+    file can be out of date. The file list itself is always up to date.
+    """
+
+    # The version of the manifest. Manifests with another version are ignored.
+    VERSION = 1
+
+    # The number of threads listing folders at the same time
+    THREADS = 16
+
+    # The number of seconds a listing is used for before checking the folders
+    # again
+    REFRESH_SECONDS = 5
+
+    def __init__(self, folder, manifest_path=None, extension=".txt"):
+        """Loads the manifest
+
+        Args:
+            folder (str): The folder to list
+            manifest_path (str): The path to the manifest file. If this is None
+                (default) the listing is only kept in memory.
+            extension (str): The extension of the files to list. Defaults to
+                ".txt".
+        """
+        self.folder = folder
+        self._manifest_path = manifest_path
+        self._extension = extension
+        self._folders = {}
+        self._files = None
+        self._last_refresh = None
+        if manifest_path is not None and os.path.isfile(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            if (manifest.get("version") == self.VERSION and
+                    manifest.get("folder") == folder and
+                    manifest.get("extension") == extension):
+                self._folders = manifest["folders"]
+
+    def _scan(self, rel_dir, cached):
+        """Lists a folder unless its modification time matches the manifest
+
+        Args:
+            rel_dir (str): The path to the folder relative to `folder`
+            cached (:obj:`dict`): The entry for the folder in the manifest or
+                None if it is not in the manifest
+
+        Returns:
+            (str, :obj:`dict`): The relative path and the entry for the folder,
+            which is None if the folder no longer exists
+        """
+        path = os.path.join(self.folder, rel_dir)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return rel_dir, None
+        if cached is not None and cached["mtime"] == mtime:
+            return rel_dir, cached
+        entry = {"mtime": mtime, "folders": [], "files": {}}
+        try:
+            with os.scandir(path) as entries:
+                for dir_entry in entries:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        entry["folders"].append(dir_entry.name)
+                    elif (dir_entry.name.endswith(self._extension) and
+                          dir_entry.is_file()):
+                        stat = dir_entry.stat()
+                        ticker, date = parse_path(
+                            os.path.join(rel_dir, dir_entry.name))
+                        entry["files"][dir_entry.name] = [
+                            stat.st_size, stat.st_mtime, ticker, date]
+        except FileNotFoundError:
+            return rel_dir, None
+        entry["folders"].sort()
+        return rel_dir, entry
+
+    def refresh(self, force=False):
+        """Brings the listing up to date and saves the manifest if it changed
+
+        Args:
+            force (bool): If True the folders are checked even if the listing
+                was refreshed less than `REFRESH_SECONDS` ago. Defaults to
+                False.
+
+        Returns:
+            bool: True if any folder changed since the last refresh
+        """
+        now = time.monotonic()
+        if (not force and self._last_refresh is not None and
+                now - self._last_refresh < self.REFRESH_SECONDS):
+            return False
+        folders = {}
+        with ThreadPoolExecutor(self.THREADS) as executor:
+            pending = {executor.submit(self._scan, "", self._folders.get(""))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel_dir, entry = future.result()
+                    if entry is None:
+                        continue
+                    folders[rel_dir] = entry
+                    for name in entry["folders"]:
+                        sub_dir = os.path.join(rel_dir, name)
+                        pending.add(executor.submit(
+                            self._scan, sub_dir, self._folders.get(sub_dir)))
+        changed = (folders.keys() != self._folders.keys() or
+                   any(folders[rel_dir] is not self._folders[rel_dir]
+                       for rel_dir in folders))
+        self._folders = folders
+        self._last_refresh = time.monotonic()
+        if changed:
+            self._files = None
+            self.save()
+        return changed
+
+    def get_files(self):
+        """Gets the files in the folder, refreshing the listing if it is out of
+        date
+
+        Returns:
+            :obj:`list` of :obj:`dict`: A dict for each file sorted by path, of
+            the form::
+
+                {
+                    'path': The path to the file relative to the folder,
+                    'size': The size of the file in bytes,
+                    'mtime': The modification time of the file,
+                    'ticker': The ticker of the filing or None,
+                    'date': The filing date or None
+                }
+        """
+        self.refresh()
+        if self._files is None:
+            files = []
+            for rel_dir, entry in self._folders.items():
+                for name, (size, mtime, ticker, date) in entry["files"].items():
+                    files.append({
+                        "path": os.path.join(rel_dir, name),
+                        "size": size,
+                        "mtime": mtime,
+                        "ticker": ticker,
+                        "date": date
+                    })
+            files.sort(key=lambda file: file["path"])
+            self._files = files
+        return self._files
+
+    def get_file_list(self):
+        """Gets the absolute paths to the files in the folder
+
+        Returns:
+            :obj:`list` of :obj:`str`: The paths sorted by their path relative
+            to the folder
+        """
+        return [os.path.join(self.folder, file["path"])
+                for file in self.get_files()]
+
+    def save(self):
+        """Saves the manifest if it has a path. The file is replaced in one
+        step so an interrupted save does not corrupt the manifest.
+        """
+        if self._manifest_path is None:
+            return
+        directory = os.path.dirname(self._manifest_path) or "."
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as temp_file:
+                json.dump({
+                    "version": self.VERSION,
+                    "folder": self.folder,
+                    "extension": self._extension,
+                    "folders": self._folders
+                }, temp_file)
+            os.replace(temp_path, self._manifest_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
+
+def get_discovery(folder=None):
+    """Gets the shared discovery for a folder. Its manifest is kept in the
+    training folder.
+
+    Args:
+        folder (str): The folder to list. Defaults to the data folder.
+
+    Returns:
+        :obj:`FileDiscovery`: The discovery for the folder
+    """
+    folder = folder or get_data_folder()
+    discovery = _DISCOVERIES.get(folder)
+    if discovery is None:
+        discovery = FileDiscovery(
+            folder, get_training_file_path("file-manifest.json"))
+        _DISCOVERIES[folder] = discovery
+    return discovery
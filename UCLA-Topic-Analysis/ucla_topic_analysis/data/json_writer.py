@@ -0,0 +1,175 @@
+"""Contains writers that add records to the end of a JSON array or JSON lines
+file without rewriting the rest of the file.
+"""
+import json
+import os
+
+# The whitespace JSON allows between values
+_WHITESPACE = b" \t\r\n"
+
+
+def _rfind_byte(json_file, end, predicate, block_size=64000):
+    """Finds the last byte before a position that matches a predicate by
+    reading the file backwards in blocks
+
+    Args:
+        json_file (:obj:`file`): A file opened in binary mode
+        end (int): The position to search back from
+        predicate (function): A function that takes a byte and returns whether
+            it matches
+        block_size (int, optional): The number of bytes to read at a time.
+            Defaults to 64000.
+
+    Returns:
+        int: The position of the last matching byte or -1 if there is none
+    """
+    while end > 0:
+        start = max(0, end - block_size)
+        json_file.seek(start)
+        block = json_file.read(end - start)
+        for index in range(len(block) - 1, -1, -1):
+            if predicate(block[index]):
+                return start + index
+        end = start
+    return -1
+
+
+def _rstrip(json_file, end):
+    """Skips back over whitespace
+
+    Args:
+        json_file (:obj:`file`): A file opened in binary mode
+        end (int): The position to search back from
+
+    Returns:
+        int: The position after the last byte before `end` that is not
+        whitespace
+    """
+    return _rfind_byte(json_file, end,
+                       lambda byte: byte not in _WHITESPACE) + 1
+
+
+class JsonLinesWriter:
+    """Writes one JSON record per line. The file is kept open and records are
+    only ever added to the end of it.
+
+    If a run is interrupted while writing a record, the unfinished line is
+    removed the next time the file is opened.
+    """
+
+    def __init__(self, file_path, append=True):
+        """Opens the file
+
+        Args:
+            file_path (str): The path to the file
+            append (bool): If this is True (default) records are added to an
+                existing file. Otherwise any existing file is replaced.
+        """
+        self.file_path = file_path
+        self.count = 0
+        if append and os.path.isfile(file_path):
+            self._recover()
+        self._file = open(file_path, "a" if append else "w", encoding="utf-8",
+                          newline="\n")
+
+    def _recover(self):
+        """Removes an unfinished last line from the file
+        """
+        with open(self.file_path, "r+b") as json_file:
+            end = json_file.seek(0, 2)
+            json_file.seek(max(0, end - 1))
+            if end and json_file.read(1) != b"\n":
+                json_file.truncate(_rfind_byte(
+                    json_file, end, lambda byte: byte == ord("\n")) + 1)
+
+    def write(self, record):
+        """Adds a record to the end of the file
+
+        Args:
+            record: A JSON serialisable record
+        """
+        self._file.write(json.dumps(record) + "\n")
+        self.count += 1
+
+    def close(self):
+        """Closes the file
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class JsonArrayWriter(JsonLinesWriter):
+    """Writes records to a JSON array. Each record is written on its own line
+    after a comma, and the closing bracket is only written by `close`, so
+    adding a record never touches the rest of the file.
+
+    A file that was not closed, for example because the run crashed, is
+    finished when it is opened again. Any unfinished record at the end of it
+    is removed.
+    """
+
+    def __init__(self, file_path, append=True):
+        """Opens the file
+
+        Args:
+            file_path (str): The path to the file
+            append (bool): If this is True (default) records are added to the
+                array in an existing file. Otherwise any existing file is
+                replaced.
+        """
+        # Whether the array has a record in it
+        self._has_records = False
+        super().__init__(file_path, append=append)
+        if self._file.tell() == 0:
+            self._file.write("[")
+
+    def _recover(self):
+        """Reopens the array in the file. The closing bracket of a finished
+        array is removed. For an unfinished array the last line is kept if it
+        is a whole record and removed otherwise.
+        """
+        with open(self.file_path, "r+b") as json_file:
+            end = _rstrip(json_file, json_file.seek(0, 2))
+            json_file.seek(max(0, end - 1))
+            if end and json_file.read(1) == b"]":
+                end = _rstrip(json_file, end - 1)
+            elif end:
+                start = _rfind_byte(json_file, end,
+                                    lambda byte: byte == ord("\n")) + 1
+                json_file.seek(start)
+                line = json_file.read(end - start).rstrip(b",")
+                try:
+                    json.loads(line)
+                    end = start + len(line)
+                except ValueError:
+                    if line.strip() != b"[":
+                        # Drop the unfinished record and the comma before it
+                        end = _rstrip(json_file, start)
+                        json_file.seek(max(0, end - 1))
+                        if json_file.read(1) == b",":
+                            end -= 1
+            json_file.truncate(end)
+            json_file.seek(max(0, end - 1))
+            self._has_records = end > 0 and json_file.read(1) != b"["
+
+    def write(self, record):
+        """Adds a record to the end of the array
+
+        Args:
+            record: A JSON serialisable record
+        """
+        self._file.write((",\n" if self._has_records else "\n") +
+                         json.dumps(record))
+        self._has_records = True
+        self.count += 1
+
+    def close(self):
+        """Closes the array and the file
+        """
+        self._file.write("\n]\n")
+        self._file.close()
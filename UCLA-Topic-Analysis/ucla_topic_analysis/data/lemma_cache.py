@@ -0,0 +1,175 @@
+"""Contains a cache for lemmas that can be shared between processes through a
+file on disk.
+"""
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from multiprocessing.util import Finalize
+
+
+class LemmaCache:
+    """A bounded least recently used cache mapping words to their lemmas.
+
+    If the cache has a file path it is loaded from the file the first time it
+    is used and saved back to the file every `autosave` new lemmas and when the
+    process exits. Saving merges the lemmas already in the file, so worker
+    processes that share a file build up one cache between them.
+    """
+
+    def __init__(self, lemmatise, maxsize=500000, file_path=None,
+                 autosave=10000):
+        """Initialises the cache
+
+        Args:
+            lemmatise (function): The function used to find the lemma of a word
+                that is not in the cache
+            maxsize (int): The maximum number of lemmas to keep. Defaults to
+                500000.
+            file_path (str): The file used to share the cache. If this is None
+                (default) the cache only lives in memory.
+            autosave (int): The number of new lemmas to add before saving the
+                cache to file. Defaults to 10000.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be greater than 0")
+
+        self._lemmatise = lemmatise
+        self._maxsize = maxsize
+        self._file_path = file_path
+        self._autosave = autosave
+        self._lemmas = OrderedDict()
+        self._loaded = file_path is None
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """
+        Returns:
+            int: The number of lemmas in the cache
+        """
+        return len(self._lemmas)
+
+    def __contains__(self, word):
+        """
+        Returns:
+            bool: True if the lemma of the word is in the cache
+        """
+        return word in self._lemmas
+
+    def get(self, word):
+        """Gets the lemma of a word
+
+        Args:
+            word (str): The word to lemmatise
+
+        Returns:
+            str: The lemma of the word
+        """
+        if not self._loaded:
+            self.load()
+        try:
+            lemma = self._lemmas[word]
+        except KeyError:
+            self.misses += 1
+            lemma = self._lemmatise(word)
+            self._add(word, lemma)
+            self._unsaved += 1
+            if self._file_path is not None and self._unsaved >= self._autosave:
+                self.save()
+            return lemma
+        self.hits += 1
+        self._lemmas.move_to_end(word)
+        return lemma
+
+    def _add(self, word, lemma):
+        """Adds a lemma to the cache. The least recently used lemma is dropped
+        if the cache is full.
+
+        Args:
+            word (str): The word
+            lemma (str): The lemma of the word
+        """
+        self._lemmas[word] = lemma
+        if len(self._lemmas) > self._maxsize:
+            self._lemmas.popitem(last=False)
+
+    def _read_file(self):
+        """Reads the lemmas saved in the cache file
+
+        Returns:
+            :obj:`dict`: The saved lemmas or an empty dict if there is no file
+            or it can not be read.
+        """
+        try:
+            with open(self._file_path, "r", encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_file(self):
+        """Adds the lemmas in the cache file that are not already in memory.
+        Lemmas already in memory count as the most recently used.
+        """
+        lemmas = OrderedDict(
+            (word, lemma) for word, lemma in self._read_file().items()
+            if word not in self._lemmas)
+        lemmas.update(self._lemmas)
+        self._lemmas = lemmas
+        while len(self._lemmas) > self._maxsize:
+            self._lemmas.popitem(last=False)
+
+    def load(self):
+        """Loads the lemmas in the cache file.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        self._merge_file()
+
+        # Save any new lemmas when the process exits. This also runs in worker
+        # processes started by multiprocessing.
+        Finalize(self, self._save_on_exit, exitpriority=10)
+
+    def save(self):
+        """Merges the cache with the cache file. The file is replaced in one
+        step so other processes never read a half written file.
+        """
+        if self._file_path is None:
+            raise Exception("Can not save. The cache has no file path.")
+        self.load()
+        self._merge_file()
+        directory = os.path.dirname(self._file_path) or "."
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as temp_file:
+                json.dump(self._lemmas, temp_file)
+            os.replace(temp_path, self._file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+        self._unsaved = 0
+
+    def _save_on_exit(self):
+        """Saves the cache if it has new lemmas. Errors are ignored since the
+        process is exiting and the cache can be rebuilt.
+        """
+        if self._unsaved:
+            try:
+                self.save()
+            except OSError:
+                pass
+
+    def info(self):
+        """Gets statistics for the cache
+
+        Returns:
+            :obj:`dict`: The hits, misses, current size and maximum size
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._lemmas),
+            "maxsize": self._maxsize
+        }
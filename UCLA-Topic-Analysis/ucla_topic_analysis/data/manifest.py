@@ -0,0 +1,153 @@
+"""Contains a manifest for keeping track of the files that have been added to a
+corpus.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from ucla_topic_analysis import get_data_folder
+
+
+class CorpusManifest:
+    """Keeps track of the path, modification time, size and hash of every file
+    that has been added to a corpus. This is used to find the files that are
+    new or have changed since the corpus was last prepared.
+    """
+
+    def __init__(self, file_path):
+        """Loads the manifest
+
+        Args:
+            file_path (str): The path to the manifest file. If the file does not
+                exist the manifest starts empty.
+        """
+        self._file_path = file_path
+        self._files = {}
+        if os.path.isfile(file_path):
+            with open(file_path, "r", encoding="utf-8") as manifest_file:
+                self._files = json.load(manifest_file)
+
+    def __len__(self):
+        """
+        Returns:
+            int: The number of files in the manifest
+        """
+        return len(self._files)
+
+    def __contains__(self, rel_path):
+        """
+        Returns:
+            bool: True if the file is in the manifest
+        """
+        return rel_path in self._files
+
+    @staticmethod
+    def get_rel_path(file_path):
+        """Gets the path of a file relative to the data folder. This is the
+        path that is stored in the corpus.
+
+        Args:
+            file_path (str): The absolute path to the file
+
+        Returns:
+            str: The relative path
+        """
+        return os.path.relpath(file_path, get_data_folder())
+
+    @staticmethod
+    def get_hash(file_path, block_size=1 << 20):
+        """Gets the hash of a file's contents
+
+        Args:
+            file_path (str): The path to the file
+            block_size (int, optional): The number of bytes to read at a time.
+                Defaults to 1MB.
+
+        Returns:
+            str: The SHA-1 hash of the file
+        """
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as data_file:
+            for block in iter(lambda: data_file.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get_changes(self, file_paths):
+        """Compares the files with the manifest. A file whose size and
+        modification time match the manifest is assumed to be unchanged. If only
+        the modification time changed the hash is used to check whether the
+        contents changed.
+
+        Args:
+            file_paths (:obj:`list` of :obj:`str`): The absolute paths to the
+                files that should be in the corpus
+
+        Returns:
+            (:obj:`list` of :obj:`str`, :obj:`set` of :obj:`str`): The absolute
+            paths to the files that are new or changed, and the relative paths
+            of the files in the manifest that changed or no longer exist and
+            need to be removed from the corpus.
+        """
+        changed = []
+        stale = set(self._files)
+        for file_path in file_paths:
+            rel_path = self.get_rel_path(file_path)
+            entry = self._files.get(rel_path)
+            stale.discard(rel_path)
+            if entry is None:
+                changed.append(file_path)
+                continue
+            stat = os.stat(file_path)
+            if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            if (entry["size"] == stat.st_size and
+                    entry["hash"] == self.get_hash(file_path)):
+                entry["mtime"] = stat.st_mtime
+                continue
+            changed.append(file_path)
+            stale.add(rel_path)
+        return changed, stale
+
+    def add(self, file_path, digest=None):
+        """Adds a file to the manifest
+
+        Args:
+            file_path (str): The absolute path to the file
+            digest (str): The SHA-1 hash of the file if it was worked out when
+                the file was read. The file is hashed if this is None
+                (default).
+        """
+        stat = os.stat(file_path)
+        self._files[self.get_rel_path(file_path)] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "hash": digest or self.get_hash(file_path)
+        }
+
+    def remove(self, rel_path):
+        """Removes a file from the manifest
+
+        Args:
+            rel_path (str): The path to the file relative to the data folder
+        """
+        self._files.pop(rel_path, None)
+
+    def clear(self):
+        """Removes every file from the manifest
+        """
+        self._files = {}
+
+    def save(self):
+        """Saves the manifest. The file is replaced in one step so an
+        interrupted save does not corrupt the manifest.
+        """
+        directory = os.path.dirname(self._file_path) or "."
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as temp_file:
+                json.dump(self._files, temp_file)
+            os.replace(temp_path, self._file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
@@ -1,12 +1,18 @@
 """Contains the base class for defining a data pipeline
 """
+import asyncio
 from abc import ABC, abstractmethod
 
+# Marks the end of a stream when running a pipeline in concurrent mode
+_END_OF_STREAM = object()
+
+
 class Pipeline(ABC):
     """A base class for creating custom data pipelines by chaining coroutines
     """
 
-    def __init__(self, pipelines=None, input_stream=None):
+    def __init__(self, pipelines=None, input_stream=None, concurrency=None,
+                 queue_size=None):
         """Initialises the pipeline
 
         Args:
@@ -14,9 +20,25 @@ class Pipeline(ABC):
                 run with the processed data. Defaults to None
             input_stream: An iterable containing data to be processed by the
                 pipeline. Defaults to None
+            concurrency (int): The number of elements the coroutine is allowed
+                to process at the same time when running as a stream. If this
+                is None (default) the stream is processed one element at a
+                time. Otherwise the pipeline runs as its own task and is
+                connected to its consumer by a bounded queue.
+            queue_size (int): The maximum number of processed (or in flight)
+                elements to hold in the queue before the stage stops reading
+                from its input stream. Only used if `concurrency` is set.
+                Defaults to twice the concurrency.
         """
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("concurrency must be greater than 0")
+        if queue_size is not None and queue_size < 1:
+            raise ValueError("queue_size must be greater than 0")
+
         self._pipelines = pipelines if pipelines is not None else []
         self._input_stream = input_stream
+        self._concurrency = concurrency
+        self._queue_size = queue_size or (2*concurrency if concurrency else None)
         self._result = None
 
     @abstractmethod
@@ -27,6 +49,36 @@ class Pipeline(ABC):
             data: The data to be processed by the pipeline
         """
 
+    def setup(self):
+        """Loads any resources the pipeline needs before processing data. This
+        is called once in every worker process when the pipeline is run by an
+        `ExecutorPipeline`. By default there is nothing to load.
+        """
+
+    def process(self, data):
+        """Processes the data synchronously. Pipelines that do CPU bound work
+        implement this so the work can be shipped to a worker process.
+
+        Args:
+            data: The data to be processed by the pipeline
+
+        Raises:
+            NotImplementedError: If the pipeline can not be run synchronously
+        """
+        raise NotImplementedError(
+            "{0} can not be run synchronously".format(type(self).__name__))
+
+    def process_batch(self, batch):
+        """Processes a batch of data synchronously.
+
+        Args:
+            batch (:obj:`list`): The elements to be processed by the pipeline
+
+        Returns:
+            :obj:`list`: The processed elements in the same order
+        """
+        return [self.process(data) for data in batch]
+
     async def run(self, data):
         """Runs the corutine and calls the downstream pipelines after setting
         self._result to the coroutine's return value.
@@ -48,18 +100,100 @@ class Pipeline(ABC):
         """
         if self._input_stream is None:
             raise Exception("No input data stream has been set")
-        try: # try a normal for loop
+        async for result in self._stream(self._input_elements(), self.coroutine):
+            yield result
+
+    async def _input_elements(self):
+        """Iterates over the input stream whether it is a normal or an async
+        iterable.
+
+        Yields:
+            A single element of the input data stream
+        """
+        if hasattr(self._input_stream, "__aiter__"):
+            async for data in self._input_stream:
+                yield data
+        else:
             for data in self._input_stream:
-                self._result = await self.coroutine(data)
-                yield self.result
-        except TypeError as error:
-            # If the input stream is async use an async for loop instead
-            if str(error) == "'async_generator' object is not iterable":
-                async for data in self._input_stream:
-                    self._result = await self.coroutine(data)
-                    yield self.result
-            else:
-                raise error
+                yield data
+
+    def _stream(self, elements, coroutine):
+        """Picks the sequential or concurrent stream depending on how the
+        pipeline was configured.
+
+        Args:
+            elements: An async iterable with the elements to process
+            coroutine: The coroutine function used to process each element
+
+        Returns:
+            An async generator with the processed elements
+        """
+        if self._concurrency is None:
+            return self._sequential_stream(elements, coroutine)
+        return self._concurrent_stream(elements, coroutine)
+
+    async def _sequential_stream(self, elements, coroutine):
+        """Processes the elements one at a time.
+
+        Args:
+            elements: An async iterable with the elements to process
+            coroutine: The coroutine function used to process each element
+
+        Yields:
+            The processed elements in input order
+        """
+        async for data in elements:
+            self._result = await coroutine(data)
+            yield self._result
+
+    async def _concurrent_stream(self, elements, coroutine):
+        """Processes the elements in a separate task. Up to `concurrency`
+        elements are processed at the same time and the stage stops pulling from
+        its input once `queue_size` elements are waiting to be consumed. This
+        lets upstream and downstream stages overlap while keeping memory use
+        bounded.
+
+        Args:
+            elements: An async iterable with the elements to process
+            coroutine: The coroutine function used to process each element
+
+        Yields:
+            The processed elements in input order
+        """
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def process(data):
+            async with semaphore:
+                return await coroutine(data)
+
+        async def feed():
+            try:
+                async for data in elements:
+                    await queue.put(asyncio.ensure_future(process(data)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                # Hand the error to the consumer so it is raised in order
+                failed = asyncio.get_running_loop().create_future()
+                failed.set_exception(error)
+                await queue.put(failed)
+            await queue.put(_END_OF_STREAM)
+
+        feeder = asyncio.ensure_future(feed())
+        try:
+            while True:
+                task = await queue.get()
+                if task is _END_OF_STREAM:
+                    break
+                self._result = await task
+                yield self._result
+        finally:
+            feeder.cancel()
+            while not queue.empty():
+                task = queue.get_nowait()
+                if task is not _END_OF_STREAM:
+                    task.cancel()
 
     @property
     def result(self):
@@ -5,8 +5,7 @@ import os
 from pathlib import Path
 from ucla_topic_analysis.data.coroutines.read import ReadFilePipeline
 from ucla_topic_analysis.data.coroutines.sentence_tokeniser import SentencePipeline
-from ucla_topic_analysis.data.coroutines.words_tokeniser import WordPipeline
-from ucla_topic_analysis.data.coroutines.word_lemmatise import LemmaPipeline
+from ucla_topic_analysis.data.coroutines.preprocess import PreprocessPipeline
 from ucla_topic_analysis import get_file_list
 
 async def tokenise_sentences():
@@ -30,10 +29,8 @@ def tokenise_words():
     Yields:
         str: A single word
     """
-    lemma_pipeline = LemmaPipeline()
-    word_pipeline = WordPipeline([lemma_pipeline])
-    sentence_pipeline = SentencePipeline([word_pipeline])
-    file_pipeline = ReadFilePipeline([sentence_pipeline])
+    lemma_pipeline = PreprocessPipeline()
+    file_pipeline = ReadFilePipeline([lemma_pipeline])
     loop = asyncio.get_event_loop()
     files = get_file_list()
     print(len(files))
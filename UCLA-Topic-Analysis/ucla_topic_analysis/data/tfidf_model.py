@@ -0,0 +1,358 @@
+"""Contains a TF-IDF model that is trained in one streaming pass over a corpus
+of preprocessed sentences.
+"""
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+from heapq import nlargest
+from operator import itemgetter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from ucla_topic_analysis import get_config
+from ucla_topic_analysis.data import replace_folder, restore_folder
+
+
+class Analyzer:
+    """Splits a document that was already tokenised and had its words joined
+    with spaces. This is a class rather than a function so models using it can
+    be pickled.
+    """
+
+    def __init__(self, stop_words=None):
+        """Initialises the analyzer
+
+        Args:
+            stop_words (:obj:`set` of :obj:`str`): Words to leave out. Defaults
+                to None.
+        """
+        self.stop_words = frozenset(stop_words or ())
+
+    def __call__(self, document):
+        """Splits a document into words
+
+        Args:
+            document (str): The words of the document joined with spaces
+
+        Returns:
+            :obj:`list` of :obj:`str`: The lower case words of the document
+        """
+        words = document.lower().split()
+        if self.stop_words:
+            return [word for word in words if word not in self.stop_words]
+        return words
+
+
+class TfidfModel:
+    """A TF-IDF model with the same weights as scikit-learn's `TfidfVectorizer`
+    with its default settings, trained on documents whose words are already
+    joined with spaces. The words are split on spaces, so documents are not
+    tokenised a second time.
+
+    The document frequencies are gathered in one pass over the documents and
+    the documents are never held in memory. With a vocabulary the number of
+    words kept while counting is bounded by `max_terms`: when there are more,
+    only the `max_terms // 2` most frequent words are kept. Words that were
+    dropped and seen again later have their document frequency undercounted.
+    With `hashing` set, words are hashed into `n_features` columns with
+    murmurhash3 so memory does not depend on the vocabulary at all, at the
+    cost of words sharing a column when their hashes collide.
+
+    The vocabulary is a sorted table of UTF-8 words that is searched with
+    `numpy.searchsorted`. `save` writes the table and the idf weights as
+    numpy arrays and `load` memory maps them, so loading is quick and worker
+    processes share the pages of one copy of the model.
+    """
+
+    # The version of the saved model format
+    VERSION = 1
+
+    def __init__(self, hashing=False, n_features=2 ** 20, max_terms=2000000,
+                 batch_size=1000, stop_words=None):
+        """Initialises an untrained model
+
+        Args:
+            hashing (bool): Whether to hash words instead of keeping a
+                vocabulary. Defaults to False.
+            n_features (int): The number of columns when hashing. Defaults to
+                2 ** 20.
+            max_terms (int): The most words to count document frequencies for
+                at a time when keeping a vocabulary. Defaults to 2000000.
+            batch_size (int): The number of documents hashed at a time.
+                Defaults to 1000.
+            stop_words (:obj:`set` of :obj:`str`): Words to leave out. Defaults
+                to None.
+        """
+        self.hashing = hashing
+        self.n_features = n_features
+        self.max_terms = max_terms
+        self.batch_size = batch_size
+        self.analyzer = Analyzer(stop_words)
+        self.n_documents = 0
+        self.terms_ = None
+        self.idf_ = None
+        self._vectorizer = None
+
+    @classmethod
+    def from_config(cls, stop_words=None):
+        """Creates a model with the settings in the TFIDF section of the config
+
+        Args:
+            stop_words (:obj:`set` of :obj:`str`): Words to leave out. Defaults
+                to None.
+
+        Returns:
+            :obj:`TfidfModel`: An untrained model
+        """
+        config = get_config()
+        return cls(
+            hashing=config.getboolean("TFIDF", "hashing", fallback=False),
+            n_features=config.getint("TFIDF", "n_features", fallback=2 ** 20),
+            max_terms=config.getint("TFIDF", "max_terms", fallback=2000000),
+            batch_size=config.getint("TFIDF", "batch_size", fallback=1000),
+            stop_words=stop_words)
+
+    @property
+    def vocabulary_(self):
+        """:obj:`dict`: The column of each word, or None if the model hashes
+        words or has not been trained
+        """
+        if self.terms_ is None:
+            return None
+        return {term.decode("utf-8"): index
+                for index, term in enumerate(self.terms_)}
+
+    @staticmethod
+    def exists(folder):
+        """
+        Args:
+            folder (str): The folder of a saved model
+
+        Returns:
+            bool: True if there is a saved model in the folder
+        """
+        restore_folder(folder)
+        return os.path.isfile(os.path.join(folder, "meta.json"))
+
+    def save(self, folder):
+        """Saves the model to a folder holding `meta.json` with the settings,
+        `idf.npy` with the float32 idf weights and, unless the model hashes
+        words, `terms.npy` with the sorted vocabulary. Any model already in
+        the folder is replaced.
+
+        Args:
+            folder (str): The folder to save the model in
+        """
+        if self.idf_ is None:
+            raise Exception("Can not save. The TF-IDF model has not been "
+                            "trained.")
+        parent = os.path.dirname(os.path.abspath(folder))
+        temp_folder = tempfile.mkdtemp(dir=parent)
+        try:
+            # mkdtemp only lets the owner read the folder
+            os.chmod(temp_folder, 0o755)
+            np.save(os.path.join(temp_folder, "idf.npy"),
+                    np.asarray(self.idf_, dtype=np.float32))
+            if self.terms_ is not None:
+                np.save(os.path.join(temp_folder, "terms.npy"),
+                        np.asarray(self.terms_))
+            with open(os.path.join(temp_folder, "meta.json"), "w",
+                      encoding="utf-8") as meta_file:
+                json.dump({
+                    "version": self.VERSION,
+                    "hashing": self.hashing,
+                    "n_features": self.n_features,
+                    "n_documents": self.n_documents,
+                    "stop_words": sorted(self.analyzer.stop_words)
+                }, meta_file)
+        except Exception:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+            raise
+        replace_folder(temp_folder, folder)
+
+    @classmethod
+    def load(cls, folder, mmap=True):
+        """Loads a saved model
+
+        Args:
+            folder (str): The folder the model was saved in
+            mmap (bool): Whether to memory map the arrays instead of reading
+                them. Defaults to True.
+
+        Returns:
+            :obj:`TfidfModel`: The model
+        """
+        restore_folder(folder)
+        with open(os.path.join(folder, "meta.json"), "r",
+                  encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        if meta["version"] != cls.VERSION:
+            raise ValueError("Unsupported TF-IDF model version {0}".format(
+                meta["version"]))
+        mmap_mode = "r" if mmap else None
+        model = cls(hashing=meta["hashing"], n_features=meta["n_features"],
+                    stop_words=meta["stop_words"])
+        model.n_documents = meta["n_documents"]
+        model.idf_ = np.load(os.path.join(folder, "idf.npy"),
+                             mmap_mode=mmap_mode)
+        if not model.hashing:
+            model.terms_ = np.load(os.path.join(folder, "terms.npy"),
+                                   mmap_mode=mmap_mode)
+        return model
+
+    def __getstate__(self):
+        """Leaves the vectorizer out when pickling. It is made again when it is
+        needed.
+        """
+        state = self.__dict__.copy()
+        state["_vectorizer"] = None
+        return state
+
+    def _get_vectorizer(self):
+        """
+        Returns:
+            :obj:`HashingVectorizer`: A vectorizer that counts the hashed words
+            in documents
+        """
+        if self._vectorizer is None:
+            self._vectorizer = HashingVectorizer(
+                analyzer=self.analyzer, n_features=self.n_features,
+                alternate_sign=False, norm=None)
+        return self._vectorizer
+
+    def _count_terms(self, documents):
+        """Counts the words of the vocabulary in documents
+
+        Args:
+            documents (:obj:`list` of :obj:`str`): The documents
+
+        Returns:
+            :obj:`scipy.sparse.csr_matrix`: The count of each word (columns) in
+            each document (rows)
+        """
+        words = []
+        lengths = []
+        for document in documents:
+            document_words = self.analyzer(document)
+            words.extend(document_words)
+            lengths.append(len(document_words))
+        shape = (len(lengths), len(self.terms_))
+        if not words or not len(self.terms_):
+            return csr_matrix(shape, dtype=np.float64)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        words = [word.encode("utf-8") for word in words]
+        # Words longer than the table's width would be cut short by numpy
+        fits = np.fromiter((len(word) <= self.terms_.itemsize
+                            for word in words), dtype=bool, count=len(words))
+        words = np.array(words, dtype=self.terms_.dtype)
+        columns = np.minimum(np.searchsorted(self.terms_, words),
+                             len(self.terms_) - 1)
+        found = fits & (self.terms_[columns] == words)
+        return csr_matrix((np.ones(np.count_nonzero(found)),
+                           (rows[found], columns[found])), shape=shape)
+
+    def _count_hashed(self, documents):
+        """Counts the documents each hashed column appears in
+
+        Args:
+            documents: An iterable of documents
+
+        Returns:
+            :obj:`numpy.ndarray`: The document frequency of each column
+        """
+        vectorizer = self._get_vectorizer()
+        frequencies = np.zeros(self.n_features, dtype=np.int64)
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                counts = vectorizer.transform(batch)
+                frequencies += np.bincount(counts.indices,
+                                           minlength=self.n_features)
+                self.n_documents += len(batch)
+                batch = []
+        if batch:
+            counts = vectorizer.transform(batch)
+            frequencies += np.bincount(counts.indices,
+                                       minlength=self.n_features)
+            self.n_documents += len(batch)
+        return frequencies
+
+    def _count_words(self, documents):
+        """Counts the documents each word appears in, keeping at most
+        `max_terms` words at a time
+
+        Args:
+            documents: An iterable of documents
+
+        Returns:
+            :obj:`collections.Counter`: The document frequency of each word
+        """
+        frequencies = Counter()
+        analyzer = self.analyzer
+        for document in documents:
+            frequencies.update(set(analyzer(document)))
+            self.n_documents += 1
+            if len(frequencies) > self.max_terms:
+                # Ties are broken by the word so pruning is reproducible
+                frequencies = Counter(dict(nlargest(
+                    self.max_terms // 2, frequencies.items(),
+                    key=itemgetter(1, 0))))
+        return frequencies
+
+    def fit(self, documents):
+        """Trains the model
+
+        Args:
+            documents: An iterable of documents with their words joined by
+                spaces. It is only iterated over once.
+
+        Returns:
+            :obj:`TfidfModel`: The trained model
+        """
+        self.n_documents = 0
+        self._vectorizer = None
+        if self.hashing:
+            frequencies = self._count_hashed(documents)
+        else:
+            counts = self._count_words(documents)
+            # UTF-8 keeps the order of the words so the table stays sorted
+            words = sorted(counts)
+            self.terms_ = np.array([word.encode("utf-8") for word in words],
+                                   dtype=bytes)
+            frequencies = np.fromiter((counts[word] for word in words),
+                                      dtype=np.int64, count=len(words))
+        # The smoothed idf used by TfidfVectorizer
+        self.idf_ = (np.log((1 + self.n_documents) / (1 + frequencies)) +
+                     1).astype(np.float32)
+        # Words that were never seen are ignored, like words that are not in
+        # a vocabulary
+        self.idf_[frequencies == 0] = 0
+        return self
+
+    def transform(self, documents):
+        """Gets the TF-IDF vectors of documents
+
+        Args:
+            documents (:obj:`list` of :obj:`str`): The documents with their
+                words joined by spaces
+
+        Returns:
+            :obj:`scipy.sparse.csr_matrix`: A row with unit length for each
+            document
+        """
+        if self.idf_ is None:
+            raise Exception("The TF-IDF model has not been trained")
+        if self.hashing:
+            matrix = self._get_vectorizer().transform(documents)
+        else:
+            matrix = self._count_terms(documents)
+        matrix = matrix.astype(np.float64)
+        matrix.data *= self.idf_[matrix.indices]
+        matrix.eliminate_zeros()
+        return normalize(matrix, copy=False)
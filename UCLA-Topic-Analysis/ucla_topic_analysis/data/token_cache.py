@@ -0,0 +1,96 @@
+"""Contains a cache for the preprocessed tokens of each document.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+
+
+class TokenCache:
+    """A content addressed cache for preprocessed documents. Documents are
+    stored by a key made from their path, a hash of their text and the version
+    of the preprocessing, so a document is only preprocessed again if it
+    changes or the preprocessing changes.
+
+    Each document is stored in its own file as zlib compressed JSON. Files are
+    written in one step so the cache can be shared by worker processes.
+    """
+
+    def __init__(self, folder, version):
+        """Initialises the cache
+
+        Args:
+            folder (str): The folder to store the cached documents in. It is
+                created if it does not exist.
+            version (str): The version of the preprocessing. Documents cached
+                with a different version are not used.
+        """
+        self._folder = folder
+        self._version = str(version)
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, path, text):
+        """Gets the key for a document
+
+        Args:
+            path (str): The relative path to the document
+            text (str): The text of the document
+
+        Returns:
+            str: The key for the document
+        """
+        digest = hashlib.sha1()
+        for part in (self._version, path.replace("\\", "/"), text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _get_file_path(self, key):
+        """Gets the path to the file for a key. Files are spread over sub
+        folders so no single folder gets too large.
+
+        Args:
+            key (str): The key for the document
+
+        Returns:
+            str: The path to the file
+        """
+        return os.path.join(self._folder, key[:2], key + ".json.z")
+
+    def get(self, key):
+        """Gets the cached tokens for a document
+
+        Args:
+            key (str): The key for the document
+
+        Returns:
+            :obj:`list` of :obj:`list` of :obj:`str`: The tokens in each
+            sentence of the document or None if the document is not cached.
+        """
+        try:
+            with open(self._get_file_path(key), "rb") as cache_file:
+                return json.loads(zlib.decompress(cache_file.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def put(self, key, sentences):
+        """Adds the tokens for a document to the cache
+
+        Args:
+            key (str): The key for the document
+            sentences (:obj:`list` of :obj:`list` of :obj:`str`): The tokens in
+                each sentence of the document
+        """
+        file_path = self._get_file_path(key)
+        directory = os.path.dirname(file_path)
+        os.makedirs(directory, exist_ok=True)
+        data = json.dumps(sentences, separators=(",", ":"))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                temp_file.write(zlib.compress(data.encode("utf-8")))
+            os.replace(temp_path, file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,339 @@
+"""Trains LDA models for several numbers of topics at once and scores each of
+them, to help pick the number of topics.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from gensim.models.coherencemodel import CoherenceModel
+from gensim.models.ldamodel import LdaModel
+from gensim.models.ldamulticore import LdaMulticore
+
+from ucla_topic_analysis import get_config
+from ucla_topic_analysis.analysis.score_writer import CsvScoreWriter
+from ucla_topic_analysis.data import get_training_file_path
+from ucla_topic_analysis.data import replace_folder, restore_folder
+from ucla_topic_analysis.data.corpus_file import BinaryCorpusFile
+
+
+class SweepCorpus:
+    """The documents with one label in a binary corpus. Only the folder and
+    label are pickled, so sending the corpus to another process is cheap, and
+    every process maps the same files so they share one copy of the corpus.
+    """
+
+    def __init__(self, folder, labels, label):
+        """Initialises the corpus
+
+        Args:
+            folder (str): The folder of the binary corpus
+            labels (:obj:`list` of :obj:`str`): The labels of the corpus. See
+                `BinaryCorpusFile`.
+            label (str): The label of the documents to iterate over
+        """
+        self.folder = folder
+        self.labels = labels
+        self.label = label
+
+    def __len__(self):
+        """
+        Returns:
+            int: The number of documents
+        """
+        return BinaryCorpusFile(self.folder, self.labels).count(self.label)[0]
+
+    def __iter__(self):
+        """
+        Yields:
+            :obj:`list` of :obj:`(int, int)`: A document in bag of words form
+        """
+        yield from BinaryCorpusFile(self.folder, self.labels).iter_documents(
+            self.label)
+
+
+def get_binary_corpus(corpus_file, labels, folder, batch_size=10000):
+    """Gets a binary copy of a corpus. A JSON corpus is copied to a binary
+    corpus once and copied again only when it changes.
+
+    Args:
+        corpus_file (:obj:`JsonCorpusFile` or :obj:`BinaryCorpusFile`): The
+            corpus
+        labels (:obj:`list` of :obj:`str`): The labels of the corpus
+        folder (str): The folder for the copy of a JSON corpus
+        batch_size (int): The number of documents to copy at a time. Defaults
+            to 10000.
+
+    Returns:
+        str: The folder of the binary corpus
+    """
+    if isinstance(corpus_file, BinaryCorpusFile):
+        return corpus_file.file_path
+    restore_folder(folder)
+    indptr_path = os.path.join(folder, "indptr.bin")
+    if (os.path.isfile(indptr_path) and os.path.getmtime(indptr_path) >=
+            os.path.getmtime(corpus_file.file_path)):
+        return folder
+
+    print("Copying the corpus to {0}".format(folder))
+    parent = os.path.dirname(os.path.abspath(folder))
+    temp_folder = tempfile.mkdtemp(dir=parent)
+    try:
+        # The corpus is created in a sub folder since it must not exist yet
+        binary = BinaryCorpusFile(os.path.join(temp_folder, "corpus"), labels)
+        for label in labels:
+            batch = []
+            for document in corpus_file.iter_documents(label):
+                batch.append(document)
+                if len(batch) == batch_size:
+                    binary.append({"label": label, "path": label,
+                                   "text": batch})
+                    batch = []
+            if batch or not binary.exists():
+                binary.append({"label": label, "path": label, "text": batch})
+        replace_folder(binary.file_path, folder)
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    return folder
+
+
+def train_model(num_topics, dictionary, corpus, holdout, passes, workers,
+                file_path, random_state=None):
+    """Trains an LDA model and scores it. A model that was already saved, for
+    example by a sweep that stopped before scoring it, is loaded instead of
+    trained again.
+
+    Args:
+        num_topics (int): The number of topics
+        dictionary (:obj:`gensim.corpora.Dictionary`): The dictionary
+        corpus (:obj:`SweepCorpus`): The documents to train on
+        holdout (:obj:`SweepCorpus`): The documents to calculate the
+            perplexity of
+        passes (int): The number of passes over the corpus
+        workers (int): The number of processes to train with
+        file_path (str): The path to save the model to
+        random_state (int): The seed for the model or None for a random one
+
+    Returns:
+        :obj:`dict`: The row for the results table. See `LdaSweep.COLUMNS`.
+    """
+    start_time = time.time()
+    model = None
+    seconds = np.nan
+    if os.path.isfile(file_path):
+        try:
+            model = LdaModel.load(file_path)
+        except Exception as error:
+            # The sweep stopped while saving the model
+            print("Could not load {0}: {1}".format(file_path, error))
+    if model is None:
+        if workers > 1:
+            # LdaMulticore trains in `workers` processes besides its own
+            model = LdaMulticore(corpus, num_topics=num_topics,
+                                 id2word=dictionary, passes=passes,
+                                 workers=workers - 1,
+                                 random_state=random_state)
+        else:
+            model = LdaModel(corpus, num_topics=num_topics, id2word=dictionary,
+                             passes=passes, random_state=random_state)
+        seconds = time.time() - start_time
+        model.save(file_path)
+
+    # u_mass only needs the bag of words corpus
+    coherence = CoherenceModel(model=model, corpus=corpus,
+                               dictionary=dictionary,
+                               coherence="u_mass").get_coherence()
+    log_perplexity = model.log_perplexity(holdout) if len(holdout) else np.nan
+    return {
+        "num_topics": num_topics,
+        "passes": passes,
+        "coherence": coherence,
+        "log_perplexity": log_perplexity,
+        "perplexity": np.exp2(-log_perplexity),
+        "seconds": seconds
+    }
+
+
+class LdaSweep:
+    """Trains and scores an LDA model for each of several numbers of topics.
+
+    The corpus is read from memory mapped binary files, so it is loaded once
+    and shared by every model instead of being parsed for each of them. Up to
+    `cpus` cores are used in total. When there are fewer models than cores the
+    cores are split between them and each model trains with several
+    processes.
+
+    Each model is scored with its u_mass coherence on the training documents
+    and its perplexity on the held out documents. A row is added to the
+    results table as soon as a model is scored, and numbers of topics already
+    in the table are skipped, so a sweep that stopped part way carries on from
+    where it stopped when it is run again.
+
+    Rows and saved models are keyed on a fingerprint of the corpus and the
+    dictionary, so once either changes the models are trained again instead
+    of being taken from an earlier sweep.
+    """
+
+    # The columns of the results table
+    COLUMNS = ["num_topics", "passes", "coherence", "log_perplexity",
+               "perplexity", "seconds", "fingerprint"]
+
+    # The files of the binary corpus that the fingerprint is made from
+    CORPUS_FILES = ["indptr.bin", "indices.bin", "counts.bin", "labels.bin",
+                    "rows.jsonl"]
+
+    def __init__(self, num_topics, dictionary, corpus_folder, labels,
+                 passes=1, cpus=None, random_state=None, results_path=None,
+                 label="training", holdout_label="validation"):
+        """Sets up the sweep
+
+        Args:
+            num_topics (:obj:`list` of :obj:`int`): The numbers of topics to
+                train models for
+            dictionary (:obj:`gensim.corpora.Dictionary`): The dictionary
+            corpus_folder (str): The folder of the binary corpus
+            labels (:obj:`list` of :obj:`str`): The labels of the corpus
+            passes (int): The number of passes over the corpus. Defaults to 1.
+            cpus (int): The most cores to use. Defaults to every core.
+            random_state (int): The seed for the models or None for random
+                ones
+            results_path (str): The path to the results table. Defaults to
+                lda-sweep.csv in the training folder.
+            label (str): The label of the documents to train on. Defaults to
+                "training".
+            holdout_label (str): The label of the documents to calculate the
+                perplexity of. Defaults to "validation".
+        """
+        self.num_topics = list(num_topics)
+        self.dictionary = dictionary
+        self.passes = passes
+        self.cpus = cpus or os.cpu_count()
+        self.random_state = random_state
+        self.results_path = (results_path or
+                             get_training_file_path("lda-sweep.csv"))
+        self._corpus = SweepCorpus(corpus_folder, labels, label)
+        self._holdout = SweepCorpus(corpus_folder, labels, holdout_label)
+        self.fingerprint = self.get_fingerprint()
+
+    def get_fingerprint(self):
+        """Gets a fingerprint of the corpus and the dictionary. It changes if
+        the corpus files, the words in the dictionary or the labels used
+        change.
+
+        Returns:
+            str: The fingerprint
+        """
+        digest = hashlib.sha1()
+        for name in self.CORPUS_FILES:
+            stat = os.stat(os.path.join(self._corpus.folder, name))
+            digest.update("{0}\0{1}\0{2}\0".format(
+                name, stat.st_size, stat.st_mtime).encode("utf-8"))
+        digest.update(json.dumps([
+            self._corpus.label, self._holdout.label,
+            sorted(self.dictionary.token2id.items())
+        ]).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def from_config(cls, dictionary, corpus_folder, labels):
+        """Sets up a sweep with the settings in the SWEEP section of the config
+
+        Args:
+            dictionary (:obj:`gensim.corpora.Dictionary`): The dictionary
+            corpus_folder (str): The folder of the binary corpus
+            labels (:obj:`list` of :obj:`str`): The labels of the corpus
+
+        Returns:
+            :obj:`LdaSweep`: The sweep
+        """
+        config = get_config()
+        num_topics = config.get("SWEEP", "num_topics",
+                                fallback="10, 20, 30, 40, 50")
+        random_state = config.get("SWEEP", "random_state", fallback=None)
+        return cls(
+            [int(value) for value in num_topics.split(",")],
+            dictionary, corpus_folder, labels,
+            passes=config.getint("SWEEP", "passes", fallback=1),
+            cpus=config.getint("SWEEP", "cpus", fallback=None),
+            random_state=None if random_state is None else int(random_state))
+
+    def get_model_path(self, num_topics):
+        """
+        Args:
+            num_topics (int): The number of topics of the model
+
+        Returns:
+            str: The path the model is saved to. It is of the form
+            lda-sweep-num-topics-passes-fingerprint.model next to the results
+            table.
+        """
+        file_name = "lda-sweep-{0}-{1}-{2}.model".format(
+            num_topics, self.passes, self.fingerprint)
+        return os.path.join(os.path.dirname(self.results_path), file_name)
+
+    def get_results(self, every=False):
+        """
+        Args:
+            every (bool): Whether to include the rows for other corpora or
+                dictionaries. Defaults to False.
+
+        Returns:
+            :obj:`pandas.DataFrame`: The results table sorted by the number of
+            topics and passes
+        """
+        if not os.path.isfile(self.results_path):
+            return pd.DataFrame(columns=self.COLUMNS)
+        results = pd.read_csv(self.results_path, dtype={"fingerprint": str})
+        if not every:
+            results = results[results["fingerprint"] == self.fingerprint]
+        return results.sort_values(["num_topics", "passes"],
+                                   ignore_index=True)
+
+    def get_pending(self):
+        """
+        Returns:
+            :obj:`list` of :obj:`int`: The numbers of topics without a row in
+            the results table for the current corpus and dictionary
+        """
+        results = self.get_results()
+        done = set(results["num_topics"][results["passes"] == self.passes])
+        return [num_topics for num_topics in self.num_topics
+                if num_topics not in done]
+
+    def run(self):
+        """Trains and scores the models that are not in the results table
+
+        Returns:
+            :obj:`pandas.DataFrame`: The results table. See `get_results`.
+        """
+        pending = self.get_pending()
+        if not pending:
+            return self.get_results()
+        num_models = min(len(pending), self.cpus)
+        workers = max(1, self.cpus // num_models)
+        print("Training {0} models, {1} at a time with {2} processes each"
+              .format(len(pending), num_models, workers))
+        writer = CsvScoreWriter(self.results_path, append=True)
+        try:
+            with ProcessPoolExecutor(num_models) as executor:
+                futures = [
+                    executor.submit(train_model, num_topics, self.dictionary,
+                                    self._corpus, self._holdout, self.passes,
+                                    workers, self.get_model_path(num_topics),
+                                    self.random_state)
+                    for num_topics in pending
+                ]
+                for future in as_completed(futures):
+                    row = future.result()
+                    row["fingerprint"] = self.fingerprint
+                    writer.write(pd.DataFrame([row], columns=self.COLUMNS))
+                    print("{num_topics} topics: coherence {coherence:.4f}, "
+                          "perplexity {perplexity:.2f}".format(**row))
+        finally:
+            writer.close()
+        return self.get_results()